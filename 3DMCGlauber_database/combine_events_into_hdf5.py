@@ -9,15 +9,18 @@ from os import path
 from glob import glob
 
 import numpy as np
+from glauber_ragged_database import RaggedStringWriter, event_id_of
 
 def print_help():
-    print("{0} results_folder".format(sys.argv[0]))
+    print("{0} results_folder [ragged]".format(sys.argv[0]))
 
 try:
     results_folder = str(sys.argv[1])
 except IndexError:
     print_help()
     exit(1)
+# one dataset per event, or all the strings in one dataset with an index
+ragged_layout = (len(sys.argv) > 2 and sys.argv[2] == "ragged")
 
 results_name = results_folder.split("/")[-1]
 if results_name == "":
@@ -28,7 +31,8 @@ hf = h5py.File("{0}.h5".format(results_name), "w")
 
 # save events summary
 event_summary = np.loadtxt(path.join(results_path, "events_summary.dat"))
-dset          = hf.create_dataset("events_summary.dat", data = event_summary,
+if not ragged_layout:
+    dset      = hf.create_dataset("events_summary.dat", data = event_summary,
                                   compression="gzip", compression_opts=9)
 # save input file
 inputfile = np.genfromtxt(path.join(results_path, "input"), dtype='str')
@@ -37,14 +41,22 @@ for para_name, para_val in inputfile:
 
 event_list = glob(path.join(results_path, "string*"))
 nev = len(event_list)
+if ragged_layout:
+    event_list = sorted(event_list, key=event_id_of)
+    writer = RaggedStringWriter(hf)
 for ievent, event_path in enumerate(event_list):
     print("processing {0:d}/{1:d} {2} ... ".format(ievent+1, nev,
                                                    results_path))
     file_name = event_path.split("/")[-1]
     dtemp     = np.loadtxt(event_path)
-    dset      = hf.create_dataset("{0}".format(file_name), data = dtemp,
-                                  compression="gzip", compression_opts=9)
     f = open(event_path)
     header = f.readline().strip('\n')
+    if ragged_layout:
+        writer.append_event(event_id_of(file_name), dtemp, header)
+        continue
+    dset      = hf.create_dataset("{0}".format(file_name), data = dtemp,
+                                  compression="gzip", compression_opts=9)
     dset.attrs.create("header", np.string_(header))
+if ragged_layout:
+    writer.close(event_summary)
 hf.close()
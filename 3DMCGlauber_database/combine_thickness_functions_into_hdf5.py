@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+     This script packs the nuclear thickness functions of the
+     3DMCGlauber_consttau mode (pairs of nuclear_thickness_TA_*.dat and
+     nuclear_thickness_TB_*.dat) into one hdf5 database,
+
+         event-{i}/TA, event-{i}/TB    the text files, stored as bytes
+         event-{i} attributes          TA_file, TB_file, label
+         index                         the TA file names, sorted
+
+     The events are numbered in the sorted order of the TA file names, so
+     the event ids do not depend on the order of the directory listing.
+     fecth_a_thickness_function_pair reads the database.
+
+     Usage: combine_thickness_functions_into_hdf5.py folder database.h5
+"""
+
+from os import path
+from glob import glob
+import sys
+import h5py
+import numpy as np
+
+
+def thickness_function_pairs(folder):
+    """This function returns the sorted list of (TA, TB) file names in the
+       folder
+    """
+    pair_list = []
+    for ta_path in sorted(glob(path.join(folder,
+                                         "nuclear_thickness_TA_*.dat"))):
+        ta_file = ta_path.split("/")[-1]
+        tb_file = ta_file.replace("nuclear_thickness_TA_",
+                                  "nuclear_thickness_TB_", 1)
+        if not path.isfile(path.join(folder, tb_file)):
+            print("\U000026A0  {} has no {}, skipped".format(ta_file, tb_file))
+            continue
+        pair_list.append((ta_file, tb_file))
+    return pair_list
+
+
+def pack_thickness_functions(folder, database_file):
+    """This function stores all the TA/TB pairs of the folder in the
+       database
+    """
+    pair_list = thickness_function_pairs(folder)
+    with h5py.File(database_file, "w") as h5_f:
+        for iev, (ta_file, tb_file) in enumerate(pair_list):
+            gtemp = h5_f.create_group("event-{}".format(iev))
+            for dataset_name, file_name in [("TA", ta_file),
+                                            ("TB", tb_file)]:
+                with open(path.join(folder, file_name), "rb") as f:
+                    gtemp.create_dataset(
+                        dataset_name,
+                        data=np.frombuffer(f.read(), dtype=np.uint8),
+                        compression="gzip", compression_opts=9)
+            gtemp.attrs.create("TA_file", np.bytes_(ta_file))
+            gtemp.attrs.create("TB_file", np.bytes_(tb_file))
+            gtemp.attrs.create("label", np.bytes_(
+                ta_file[len("nuclear_thickness_TA_"):-len(".dat")]))
+        h5_f.create_dataset("index", data=np.array(
+            [ta_file for ta_file, _ in pair_list], dtype=h5py.string_dtype()))
+        h5_f.attrs.create("n_events", len(pair_list))
+    print("packed {} TA/TB pairs from {} into {}".format(
+        len(pair_list), folder, database_file))
+
+
+if __name__ == "__main__":
+    try:
+        FOLDER = str(sys.argv[1])
+        DATABASE_FILE = str(sys.argv[2])
+    except IndexError:
+        print("{0} folder database.h5".format(sys.argv[0]))
+        exit(1)
+    pack_thickness_functions(FOLDER, DATABASE_FILE)
@@ -4,6 +4,7 @@
      It outputs the input file for MUSIC fluid dynamic simulation.
 """
 
+from os import path
 from sys import argv, exit
 import numpy as np
 import h5py
@@ -11,18 +12,78 @@ import h5py
 def print_help():
     print("{0} database_filename event_id".format(argv[0]))
 
+def read_ragged_event(hf, event_idx):
+    """This function returns the strings and the header of an event in a
+       database with the ragged layout (see glauber_ragged_database.py)
+    """
+    event_ids = hf["event_ids"]
+    irow = event_idx
+    if irow >= len(event_ids) or event_ids[irow] != event_idx:
+        # the ids are sorted, but some events may be missing
+        irow = int(np.searchsorted(event_ids[()], event_idx))
+        if irow >= len(event_ids) or event_ids[irow] != event_idx:
+            raise KeyError("no event {} in the database".format(event_idx))
+    start, end = hf["event_offsets"][irow:irow + 2]
+    header = hf["event_headers"][irow]
+    if isinstance(header, bytes):
+        header = header.decode('UTF-8')
+    return hf["strings"][start:end], header
+
+
 def fecth_an_3DMCGlauber_event(database_path, event_idx):
     print(("fectching an 3DMCGlauber event with "
            + "event id: {} from {}".format(event_idx, database_path))
     )
     hf          = h5py.File(database_path, "r")
     file_name   = "strings_event_{0:d}.dat".format(event_idx)
-    temp_data   = hf.get(file_name)
-    data_header = temp_data.attrs["header"].decode('UTF-8').replace('#','')
+    if "event_offsets" in hf:
+        temp_data, data_header = read_ragged_event(hf, event_idx)
+        data_header = data_header.replace('#','')
+    else:
+        temp_data   = hf.get(file_name)
+        data_header = temp_data.attrs["header"].decode('UTF-8').replace('#','')
     temp_data   = np.array(temp_data).reshape(-1, 21)
+    hf.close()
     np.savetxt(file_name, temp_data, fmt='%.6e', header=data_header)
     return(file_name)
 
+# open thickness function databases, kept open between the events of a job
+thickness_function_databases = {}
+
+
+def fecth_a_thickness_function_pair(database_path, event_idx,
+                                    output_folder=".", keep_open=True):
+    """This function writes the TA and TB files of an event in a database
+       made by combine_thickness_functions_into_hdf5.py into
+       output_folder/initial_TA.dat and initial_TB.dat. It returns the name
+       of the original TA file. With keep_open = False (e.g. a file with a
+       single cached event), the database is closed afterwards.
+    """
+    print(("fectching a pair of nuclear thickness functions with "
+           + "event id: {} from {}".format(event_idx, database_path))
+    )
+    if database_path in thickness_function_databases:
+        hf = thickness_function_databases[database_path]
+    else:
+        hf = h5py.File(database_path, "r")
+        if keep_open:
+            thickness_function_databases[database_path] = hf
+    try:
+        event_group = hf["event-{0:d}".format(event_idx)]
+        for dataset_name in ("TA", "TB"):
+            with open(path.join(output_folder,
+                                "initial_{}.dat".format(dataset_name)),
+                      "wb") as f:
+                f.write(event_group[dataset_name][()].tobytes())
+        ta_file = event_group.attrs["TA_file"]
+    finally:
+        if database_path not in thickness_function_databases:
+            hf.close()
+    if isinstance(ta_file, bytes):
+        ta_file = ta_file.decode('UTF-8')
+    return ta_file
+
+
 if __name__ == "__main__":
     try:
         database_filename = str(argv[1])
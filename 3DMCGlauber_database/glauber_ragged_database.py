@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+     This module writes 3D MC-Glauber databases in the ragged layout. The
+     strings of all the events are concatenated into one dataset, so the
+     root group has a few objects instead of one dataset per event,
+
+         strings           (N_strings_total, 21) strings of all events
+         event_offsets     (N_events + 1,) first row of each event
+         event_ids         (N_events,) event id N of strings_event_N.dat
+         event_headers     (N_events,) header line of each event
+         event_summary     (N_events, n) rows of events_summary.dat
+         events_summary.dat                as in the old layout
+
+     fecth_an_3DMCGlauber_event reads both layouts.
+
+     Usage: glauber_ragged_database.py convert old_database.h5 new_database.h5
+"""
+
+import sys
+import h5py
+import numpy as np
+
+# number of columns of a string
+n_string_columns = 21
+
+# rows per chunk of the strings dataset
+strings_per_h5_chunk = 4096
+
+
+class RaggedStringWriter:
+    """This class appends events to a ragged 3D MC-Glauber database"""
+
+    def __init__(self, hf):
+        self.hf = hf
+        self.strings = hf.create_dataset(
+            "strings", shape=(0, n_string_columns),
+            maxshape=(None, n_string_columns), dtype="f8",
+            chunks=(strings_per_h5_chunk, n_string_columns),
+            compression="gzip", compression_opts=9, shuffle=True)
+        self.offsets = [0]
+        self.event_ids = []
+        self.headers = []
+        self.buffer = []
+        self.n_buffered = 0
+        hf.attrs.create("layout", np.bytes_("ragged"))
+
+    def append_event(self, event_id, data, header):
+        """Appends the strings of one event"""
+        data = np.asarray(data, dtype="f8").reshape(-1, n_string_columns)
+        self.buffer.append(data)
+        self.n_buffered += len(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.event_ids.append(int(event_id))
+        self.headers.append(header)
+        if self.n_buffered >= strings_per_h5_chunk*16:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered strings into the database"""
+        if not self.buffer:
+            return
+        n_rows = self.strings.shape[0]
+        self.strings.resize(n_rows + self.n_buffered, axis=0)
+        self.strings[n_rows:] = np.concatenate(self.buffer)
+        self.buffer = []
+        self.n_buffered = 0
+
+    def close(self, events_summary=None):
+        """Writes the event index and the summary columns"""
+        self.flush()
+        self.hf.create_dataset("event_offsets",
+                               data=np.array(self.offsets, dtype=np.int64))
+        self.hf.create_dataset("event_ids",
+                               data=np.array(self.event_ids, dtype=np.int64))
+        self.hf.create_dataset("event_headers", data=np.array(
+            self.headers, dtype=h5py.string_dtype()))
+        if events_summary is None:
+            return
+        events_summary = np.atleast_2d(events_summary)
+        self.hf.create_dataset("events_summary.dat", data=events_summary,
+                               compression="gzip", compression_opts=9)
+        # the summary has one line per generated event, in order
+        if len(events_summary) > max(self.event_ids, default=-1):
+            self.hf.create_dataset(
+                "event_summary", data=events_summary[self.event_ids],
+                compression="gzip", compression_opts=9)
+
+
+def event_id_of(dataset_name):
+    """This function returns N of strings_event_N.dat"""
+    return int(dataset_name.split("_")[-1].split(".")[0])
+
+
+def convert_to_ragged_layout(old_database, new_database):
+    """This function converts a database with one dataset per event into
+       the ragged layout. The events are sorted by their id.
+    """
+    with h5py.File(old_database, "r") as h5_in, \
+            h5py.File(new_database, "w") as h5_out:
+        for key_name, value in h5_in.attrs.items():
+            h5_out.attrs.create(key_name, value)
+        event_list = sorted([name for name in h5_in.keys()
+                             if name.startswith("strings_event_")],
+                            key=event_id_of)
+        writer = RaggedStringWriter(h5_out)
+        for ievent, event_name in enumerate(event_list):
+            if ievent % 1000 == 0:
+                print("converting {0:d}/{1:d} ... ".format(
+                    ievent + 1, len(event_list)), flush=True)
+            dset = h5_in[event_name]
+            header = dset.attrs.get("header", b"")
+            if isinstance(header, bytes):
+                header = header.decode('UTF-8')
+            writer.append_event(event_id_of(event_name), dset[()], header)
+        events_summary = None
+        if "events_summary.dat" in h5_in:
+            events_summary = h5_in["events_summary.dat"][()]
+        writer.close(events_summary)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        convert_to_ragged_layout(sys.argv[2], sys.argv[3])
+    else:
+        print("{0} convert old_database.h5 new_database.h5".format(
+            sys.argv[0]))
+        exit(1)
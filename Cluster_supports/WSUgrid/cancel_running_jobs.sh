@@ -14,7 +14,7 @@ jobFolder=${jobFolder%"/"}
 
 echo "cancelling jobs in " ${jobFolder}
 
-for ijob in `ls --color=none ${jobFolder} | grep "event" `;
+for ijob in `cd ${jobFolder}; ls --color=none -d *event* design_point_*/*event* design_group_*/*event* 2> /dev/null`;
 do
     eventsPath=${jobFolder}/${ijob}
     scancel `cat ${eventsPath}/job_id`
@@ -22,12 +22,14 @@ echo ${workFolder} >> current_sims_list.txt
 
 Numjobs=0
 cd ${workFolder}
-for ijob in `ls --color=none | grep "event"`;
+# the jobs of a design matrix are in design_point_*/ or design_group_*/
+for ijob in `ls --color=none -d *event* design_point_*/*event* design_group_*/*event* 2> /dev/null`;
 do
     echo "submit job in " ${workFolder}/${ijob}
-    cd ${ijob}
-    sbatch -q ${queue} submit_job.pbs | awk {'print $4'} > job_id
-    cd ..
+    (
+        cd ${ijob}
+        sbatch -q ${queue} submit_job.pbs | awk {'print $4'} > job_id
+    )
     ((Numjobs++))
 done
 
@@ -1,120 +1,55 @@
 #!/usr/bin/env python
 """
      This script combines pre-generated IP-Glasma events into a hdf5 database.
+
+     In the default "single" mode, rank 0 writes the database and the other
+     ranks read and compress the events. Each worker asks rank 0 for the
+     next event when it is done with the previous one and sends back the
+     compressed chunks, which rank 0 stores with write_direct_chunk.
+     The events that a worker can not read are reported to rank 0 and
+     skipped (the script then exits with 1), and an error on rank 0 aborts
+     all the ranks.
+     Without mpi4py, a pool of local processes does the same.
+     The "rank_files" mode writes one file per rank and merges them with
+     h5copy afterwards. The factors after the mode add block-averaged grids
+     (see ipglasma_ingestion.py) in the "single" mode.
 """
 
 import sys
-from os import path, system
+import traceback
+from os import path, system, cpu_count
 from glob import glob
 import h5py
-from mpi4py import MPI
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
 
 import numpy as np
+from ipglasma_ingestion import (ingest_ipglasma_event, ingest_ipglasma_results,
+                                ipglasma_event_ids, prepare_ipglasma_event,
+                                write_ipglasma_event)
+
+# message tags between rank 0 and the workers
+TAG_READY = 1
+TAG_EVENT = 2
+TAG_ERROR = 3
 
 def print_help():
     """This function prints out help message"""
-    print("{0} results_folder".format(sys.argv[0]))
+    print("{0} results_folder [single|rank_files] [factor ...]".format(
+        sys.argv[0]))
 
 def collect_one_IPGlasma_event(results_path, event_path, hf):
     """This function collects one IPGlasma event"""
     event_id = event_path.split("/")[-1].split("Parameters")[-1].split(".")[0]
-    gtemp = hf.create_group("event-{0}".format(event_id))
-
-    file_name = "usedParameters{0}.dat".format(event_id)
-    parafile = open(path.join(results_path, file_name))
-    for iline, rawline in enumerate(parafile.readlines()):
-        paraline = rawline.strip('\n')
-        gtemp.attrs.create("{0}".format(iline), np.string_(paraline))
-
-    file_name = "NcollList{0}.dat".format(event_id)
-    filepath = path.join(results_path, file_name)
-    if path.isfile(filepath):
-        dtemp = np.loadtxt(filepath)
-        dtemp = np.nan_to_num(dtemp).reshape(-1, 2)
-        dset = gtemp.create_dataset("{0}".format(file_name), data=dtemp,
-                                    compression="gzip", compression_opts=9)
-    file_name = "NpartList{0}.dat".format(event_id)
-    filepath = path.join(results_path, file_name)
-    if path.isfile(filepath):
-        dtemp = np.loadtxt(path.join(results_path, file_name))
-        dtemp = np.nan_to_num(dtemp).reshape(-1, 4)
-        dset = gtemp.create_dataset("{0}".format(file_name), data=dtemp,
-                                    compression="gzip", compression_opts=9)
-
-    file_name_pattern = "NpartdNdy-t"
-    filelist = glob(path.join(results_path, "{0}*-{1}.dat".format(
-        file_name_pattern, event_id)))
-    for filepath in filelist:
-        filename = filepath.split("/")[-1]
-        dtemp = np.genfromtxt(filepath, dtype='str')
-        data = np.zeros(len(dtemp))
-        for idx in range(len(dtemp)):
-            if dtemp[idx] != 'N/A':
-                data[idx] = float(dtemp[idx])
-            else:
-                data[idx] = 0.0
-        dset = gtemp.create_dataset("{0}".format(filename), data=data,
-                                    compression="gzip", compression_opts=9)
-
-    file_name_pattern = "epsilon-u-Hydro-t"
-    filelist = glob(path.join(results_path, "{0}*-{1}.dat".format(
-                                            file_name_pattern, event_id)))
-    for ifile, filepath in enumerate(filelist):
-        filename = filepath.split("/")[-1]
-        dtemp    = np.loadtxt(filepath)
-        dtemp    = np.nan_to_num(dtemp)
-        x_size   = abs(dtemp[0, 1])*2.
-        y_size   = abs(dtemp[0, 2])*2.
-        data_cut = dtemp[:, 3:]
-        dset     = gtemp.create_dataset("{0}".format(filename),
-                                        data=data_cut,
-                                        compression="gzip", compression_opts=9)
-        f = open(filepath)
-        header = f.readline().strip('\n')
-        dset.attrs.create("header", np.string_(header))
-        tmp = header.split()
-        dx = float(tmp[12])
-        dy = float(tmp[14])
-        nx = int(tmp[6])
-        ny = int(tmp[8])
-        dset.attrs.create("x_size", x_size)
-        dset.attrs.create("y_size", y_size)
-        dset.attrs.create("dx", dx)
-        dset.attrs.create("dy", dy)
-        dset.attrs.create("nx", nx)
-        dset.attrs.create("ny", ny)
-    
-    file_name_pattern = "Tmunu-t"
-    filelist = glob(path.join(results_path, "{0}*-{1}.dat".format(
-                                                file_name_pattern, event_id)))
-    for ifile, filepath in enumerate(filelist):
-        filename = filepath.split("/")[-1]
-        dtemp    = np.loadtxt(filepath)
-        dtemp    = np.nan_to_num(dtemp)
-        x_size   = abs(dtemp[0, 1])*2.
-        y_size   = abs(dtemp[0, 2])*2.
-        data_cut = dtemp[:, 2:]
-        dset     = gtemp.create_dataset("{0}".format(filename),
-                                        data=data_cut,
-                                        compression="gzip", compression_opts=9)
-        f = open(filepath)
-        header = f.readline().strip('\n')
-        dset.attrs.create("header", np.string_(header))
-        tmp = header.split()
-        dx = float(tmp[12])
-        dy = float(tmp[14])
-        nx = int(tmp[6])
-        ny = int(tmp[8])
-        dset.attrs.create("x_size", x_size)
-        dset.attrs.create("y_size", y_size)
-        dset.attrs.create("dx", dx)
-        dset.attrs.create("dy", dy)
-        dset.attrs.create("nx", nx)
-        dset.attrs.create("ny", ny)
+    ingest_ipglasma_event(results_path, event_id, hf)
 
 
 def collect_IPGlasma_events(results_folder):
-    """This function collects IPGlasma events in results_folder"""
+    """This function collects IPGlasma events in results_folder into one
+       file per rank and merges them with h5copy
+    """
     mpi_comm = MPI.COMM_WORLD
     mpi_rank = mpi_comm.Get_rank()
     mpi_size = mpi_comm.Get_size()
@@ -122,9 +57,7 @@ def collect_IPGlasma_events(results_folder):
     if mpi_rank == 0:
         print("MPI using {} threads ...".format(mpi_size))
 
-    results_name = results_folder.split("/")[-1]
-    if results_name == "":
-        results_name = results_folder.split("/")[-2]
+    results_name = results_name_of(results_folder)
     results_path = path.abspath(path.join(".", results_folder))
     event_list = glob(path.join(results_path, "usedParameters*.dat"))
     nev = len(event_list)
@@ -161,10 +94,109 @@ def collect_IPGlasma_events(results_folder):
             system('rm -fr {0}'.format(filename))
 
 
+def results_name_of(results_folder):
+    """This function returns the name of the database for results_folder"""
+    results_name = results_folder.split("/")[-1]
+    if results_name == "":
+        results_name = results_folder.split("/")[-2]
+    return results_name
+
+
+def collect_IPGlasma_events_single_file(results_folder, levels=()):
+    """This function collects IPGlasma events in results_folder into one
+       hdf5 file, written by rank 0 only. The grids are also stored
+       block-averaged by each factor in levels. It returns the list of the
+       events that the workers could not read, which are skipped.
+    """
+    results_name = results_name_of(results_folder)
+    results_path = path.abspath(path.join(".", results_folder))
+    h5filename = "{0}.h5".format(results_name)
+    if MPI is None:
+        print("no mpi4py, collect {0} to {1} with {2} processes ...".format(
+            results_folder, h5filename, cpu_count()))
+        ingest_ipglasma_results(results_path, h5filename,
+                                n_workers=cpu_count(), levels=levels)
+        return []
+
+    mpi_comm = MPI.COMM_WORLD
+    mpi_rank = mpi_comm.Get_rank()
+    mpi_size = mpi_comm.Get_size()
+    if mpi_size == 1:
+        ingest_ipglasma_results(results_path, h5filename, levels=levels)
+        return []
+
+    failed_list = []
+    if mpi_rank == 0:
+        event_list = ipglasma_event_ids(results_path)
+        nev = len(event_list)
+        print("MPI using {0} threads: collect {1} to {2} ... ".format(
+            mpi_size, results_folder, h5filename))
+        status = MPI.Status()
+        next_event = 0
+        n_active = mpi_size - 1
+        n_written = 0
+        try:
+            with h5py.File(h5filename, "a") as hf:
+                while n_active > 0:
+                    message = mpi_comm.recv(source=MPI.ANY_SOURCE,
+                                            tag=MPI.ANY_TAG, status=status)
+                    if status.Get_tag() == TAG_EVENT:
+                        write_ipglasma_event(hf, *message)
+                        n_written += 1
+                        print("written event {0} ({1:d}/{2:d}) ... ".format(
+                            message[0], n_written, nev), flush=True)
+                    elif status.Get_tag() == TAG_ERROR:
+                        failed_list.append(message[0])
+                        print("failed to read event {0}: {1}".format(
+                            *message), flush=True)
+                    # the next event goes to the rank that is done
+                    if next_event < nev:
+                        mpi_comm.send(event_list[next_event],
+                                      dest=status.Get_source())
+                        next_event += 1
+                    else:
+                        mpi_comm.send(None, dest=status.Get_source())
+                        n_active -= 1
+        except Exception:
+            # the workers wait for rank 0, so the whole job has to stop
+            traceback.print_exc()
+            sys.stdout.flush()
+            mpi_comm.Abort(1)
+        if failed_list:
+            print("{0:d} events skipped: {1}".format(
+                len(failed_list), " ".join(failed_list)), flush=True)
+    else:
+        mpi_comm.send(None, dest=0, tag=TAG_READY)
+        while True:
+            event_id = mpi_comm.recv(source=0)
+            if event_id is None:
+                break
+            # rank 0 waits for an answer for every event it hands out
+            try:
+                message = prepare_ipglasma_event(results_path, event_id,
+                                                 levels)
+                tag = TAG_EVENT
+            except Exception as err:
+                message = (event_id, "{0}: {1}".format(type(err).__name__,
+                                                       err))
+                tag = TAG_ERROR
+            mpi_comm.send(message, dest=0, tag=tag)
+    return failed_list
+
+
 if __name__ == "__main__":
     try:
         RESULTS_FOLDER = str(sys.argv[1])
-        collect_IPGlasma_events(RESULTS_FOLDER)
     except IndexError:
         print_help()
         exit(1)
+    MODE = sys.argv[2] if len(sys.argv) > 2 else "single"
+    LEVELS = [int(factor) for factor in sys.argv[3:]]
+    if MODE == "single":
+        if collect_IPGlasma_events_single_file(RESULTS_FOLDER, LEVELS):
+            exit(1)
+    elif MODE == "rank_files":
+        collect_IPGlasma_events(RESULTS_FOLDER)
+    else:
+        print_help()
+        exit(1)
@@ -9,10 +9,32 @@ import numpy as np
 import h5py
 
 def print_help():
-    print("{0} database_filename event_id output_type".format(argv[0]))
+    print("{0} database_filename event_id output_type [grid_spacing]".format(
+        argv[0]))
 
 
-def fecth_an_IPGlasma_event_Tmunu(database_path, time_stamp, event_idx):
+def select_grid_level(event_group, file_name, grid_spacing=None):
+    """This function returns the dataset of the coarsest stored level
+       (event-{id}/level-{factor}) whose dx is not larger than grid_spacing
+       (fm), or the full grid
+    """
+    temp_data = event_group.get(file_name)
+    if grid_spacing is None or temp_data is None:
+        return temp_data
+    for level_name in event_group.keys():
+        if not level_name.startswith("level-"):
+            continue
+        level_data = event_group[level_name].get(file_name)
+        if level_data is None:
+            continue
+        if (level_data.attrs["dx"] <= grid_spacing*(1. + 1e-6)
+                and level_data.attrs["dx"] > temp_data.attrs["dx"]):
+            temp_data = level_data
+    return temp_data
+
+
+def fecth_an_IPGlasma_event_Tmunu(database_path, time_stamp, event_idx,
+                                  grid_spacing=None):
     print(("fectching an IP-Glasma event Tmunu with "
            + "event id: {} at tau = {} fm from {}".format(event_idx,
                                                           time_stamp,
@@ -23,7 +45,7 @@ def fecth_an_IPGlasma_event_Tmunu(database_path, time_stamp, event_idx):
     file_name   = "Tmunu-t{0:s}-{1:d}.dat".format(time_stamp, event_idx)
     try:
         event_group = hf.get(event_name)
-        temp_data   = event_group.get(file_name)
+        temp_data   = select_grid_level(event_group, file_name, grid_spacing)
     except AttributeError:
         print("Can not load {}".format(event_name))
         return("Failed")
@@ -48,7 +70,8 @@ def fecth_an_IPGlasma_event_Tmunu(database_path, time_stamp, event_idx):
     return(file_name)
 
 
-def fecth_an_IPGlasma_event(database_path, time_stamp, event_idx):
+def fecth_an_IPGlasma_event(database_path, time_stamp, event_idx,
+                            grid_spacing=None):
     print(("fectching an IP-Glasma event with "
            + "event id: {} at tau = {} fm from {}".format(event_idx,
                                                           time_stamp,
@@ -60,7 +83,7 @@ def fecth_an_IPGlasma_event(database_path, time_stamp, event_idx):
                                                             event_idx)
     try:
         event_group = hf.get(event_name)
-        temp_data   = event_group.get(file_name)
+        temp_data   = select_grid_level(event_group, file_name, grid_spacing)
     except AttributeError:
         print("Can not load {}".format(event_name))
         return("Failed")
@@ -95,9 +118,14 @@ if __name__ == "__main__":
         print_help()
         exit(1)
 
+    grid_spacing = None
+    if len(argv) > 4:
+        grid_spacing = float(argv[4])
+
     time_stamp_str = "0.4"
     if type_flag == 0:
-        fecth_an_IPGlasma_event(database_filename, time_stamp_str, event_id)
+        fecth_an_IPGlasma_event(database_filename, time_stamp_str, event_id,
+                                grid_spacing)
     elif type_flag == 1:
         fecth_an_IPGlasma_event_Tmunu(database_filename, time_stamp_str,
-                                      event_id)
+                                      event_id, grid_spacing)
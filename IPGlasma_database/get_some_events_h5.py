@@ -2,66 +2,170 @@
 """
      This script fetch some pre-generated IP-Glasma events from a big
      hdf5 database and save them to a smaller hdf5 file
+
+     The events are drawn without replacement, optionally stratified in
+     bins of Npart or Ncoll, and renumbered from 0. All the datasets of an
+     event (including the coarse levels) are copied chunk by chunk with
+     their attributes, without decompressing and compressing them again.
+     A pool of reader processes reads the chunks and this process writes
+     the new file.
 """
 
-import sys
+import argparse
+import re
 import h5py
-from os import path
-from glob import glob
+from multiprocessing import Pool
 
 import numpy as np
 import random
+from ipglasma_ingestion import write_ipglasma_event
 
-
-def print_help():
-    print("{0} datafile output_filename nev".format(sys.argv[0]))
+# the estimators of an event that can be used to stratify the subset
+stratify_estimators = {
+    "Npart": "NpartList{}.dat",
+    "Ncoll": "NcollList{}.dat",
+}
 
 
-def fetch_IPGlasma_events(datafile, outputfile, nev):
-    print("fetching {0} events randomly from {1} to {2}.h5 ...".format(
-        nev, datafile, outputfile))
-    in_data = h5py.File(datafile, "r")
-    out_data = h5py.File("{}.h5".format(outputfile), "w")
-    event_list = list(in_data.keys())
-
-    if nev > len(event_list):
-        print("Error: The original database only has {} events.\n".format(
-            len(event_list)))
-        print("Error: But {} is requested.\n".format(nev))
+def event_estimator(in_data, event_name, estimator):
+    """This function returns the estimator of an event in the database"""
+    event_id = event_name.split('-')[1]
+    dataset_name = stratify_estimators[estimator].format(event_id)
+    if dataset_name not in in_data[event_name]:
+        print("Error: {} has no {}".format(event_name, dataset_name))
         exit(1)
+    return in_data[event_name][dataset_name].shape[0]
+
+
+def select_events(event_list, nev, estimator_list=None, n_bins=1):
+    """This function draws nev events without replacement. With the
+       estimators, the events are sorted into n_bins bins with the same
+       number of events and each bin gives the same share of the subset.
+    """
+    if estimator_list is None or n_bins <= 1:
+        return random.sample(event_list, nev)
+    sorted_events = [event_list[i] for i in np.argsort(estimator_list,
+                                                       kind="stable")]
+    bin_list = [[sorted_events[i] for i in bin_i]
+                for bin_i in np.array_split(np.arange(len(sorted_events)),
+                                            n_bins)]
+    n_select = [0]*len(bin_list)
+    n_left = nev
+    while n_left > 0:
+        open_bins = [ibin for ibin, bin_i in enumerate(bin_list)
+                     if n_select[ibin] < len(bin_i)]
+        random.shuffle(open_bins)
+        for ibin in open_bins[:n_left]:
+            n_select[ibin] += 1
+        n_left = nev - sum(n_select)
+    selected_event_list = []
+    for bin_i, n_i in zip(bin_list, n_select):
+        selected_event_list += random.sample(bin_i, n_i)
+    return selected_event_list
+
+
+def rename_dataset(dataset_name, event_id, new_event_id):
+    """This function replaces the event id at the end of a dataset name"""
+    return re.sub(r"(\D){}\.dat$".format(re.escape(event_id)),
+                  r"\g<1>{}.dat".format(new_event_id), dataset_name)
 
-    selected_event_list = random.choices(event_list, k=nev)
-    for iev, event_i in enumerate(selected_event_list):
-        original_event_id = event_i.split('-')[1]
-        in_group = in_data.get(event_i)
-        infile_name = "epsilon-u-Hydro-t0.4-{}.dat".format(original_event_id)
-        temp_data = in_group.get(infile_name)
 
-        out_group = out_data.create_group("event-{0}".format(iev))
-        outfile_name = "epsilon-u-Hydro-t0.4-{}.dat".format(iev)
-        dset = out_group.create_dataset("{0}".format(outfile_name),
-                                        data = temp_data,
-                                        compression="gzip", compression_opts=9)
-        data_header = temp_data.attrs["header"].decode('UTF-8').replace('#','')
-        dset.attrs.create("header", np.string_(data_header))
-        dset.attrs.create("x_size", temp_data.attrs['x_size'])
-        dset.attrs.create("y_size", temp_data.attrs['y_size'])
-        dset.attrs.create("dx", temp_data.attrs['dx'])
-        dset.attrs.create("dy", temp_data.attrs['dy'])
-        dset.attrs.create("nx", temp_data.attrs['nx'])
-        dset.attrs.create("ny", temp_data.attrs['ny'])
+def read_event_chunks(datafile, event_name, new_event_id):
+    """This function reads the raw chunks of all the datasets of an event.
+       It returns the arguments of write_ipglasma_event.
+    """
+    event_id = event_name.split('-')[1]
+    dataset_list = []
+    with h5py.File(datafile, "r") as in_data:
+        in_group = in_data[event_name]
+        group_attrs = list(in_group.attrs.items())
 
-    in_data.close()
-    out_data.close()
+        def read_dataset(name, dset):
+            if not isinstance(dset, h5py.Dataset):
+                return
+            dataset = {
+                'name': rename_dataset(name, event_id, new_event_id),
+                'attrs': list(dset.attrs.items()),
+            }
+            if dset.chunks is None:
+                dataset['data'] = dset[()]
+                dataset['filters'] = {}
+            else:
+                dataset['filters'] = {
+                    'compression': dset.compression,
+                    'compression_opts': dset.compression_opts,
+                    'shuffle': dset.shuffle,
+                    'fletcher32': dset.fletcher32,
+                }
+                dataset.update({'shape': dset.shape,
+                                'dtype': dset.dtype.str,
+                                'chunks': dset.chunks,
+                                'compressed': []})
+                for ichunk in range(dset.id.get_num_chunks()):
+                    offset = dset.id.get_chunk_info(ichunk).chunk_offset
+                    filter_mask, chunk_bytes = dset.id.read_direct_chunk(
+                        offset)
+                    dataset['compressed'].append(
+                        (offset, chunk_bytes, filter_mask))
+            dataset_list.append(dataset)
 
+        in_group.visititems(read_dataset)
+    return (new_event_id, group_attrs, dataset_list)
+
+
+def _read_event_chunks_star(args):
+    return read_event_chunks(*args)
+
+
+def fetch_IPGlasma_events(datafile, outputfile, nev, stratify=None,
+                          n_bins=10, n_readers=1):
+    print("fetching {0} events randomly from {1} to {2}.h5 ...".format(
+        nev, datafile, outputfile))
+    with h5py.File(datafile, "r") as in_data:
+        event_list = [event_name for event_name in in_data.keys()
+                      if event_name.startswith("event-")]
+        if nev > len(event_list):
+            print("Error: The original database only has {} events.\n".format(
+                len(event_list)))
+            print("Error: But {} is requested.\n".format(nev))
+            exit(1)
+        estimator_list = None
+        if stratify is not None:
+            estimator_list = [event_estimator(in_data, event_i, stratify)
+                              for event_i in event_list]
+
+    selected_event_list = select_events(event_list, nev, estimator_list,
+                                        n_bins)
+    job_list = [(datafile, event_i, iev)
+                for iev, event_i in enumerate(selected_event_list)]
+    with h5py.File("{}.h5".format(outputfile), "w") as out_data:
+        if n_readers > 1:
+            with Pool(processes=n_readers) as pool:
+                for event in pool.imap(_read_event_chunks_star, job_list):
+                    write_ipglasma_event(out_data, *event)
+        else:
+            for job_i in job_list:
+                write_ipglasma_event(out_data, *read_event_chunks(*job_i))
 
 
 if __name__ == "__main__":
-    try:
-        datafile = str(sys.argv[1])
-        outputfile = str(sys.argv[2])
-        nev = int(sys.argv[3])
-        fetch_IPGlasma_events(datafile, outputfile, nev)
-    except IndexError:
-        print_help()
-        exit(1)
+    parser = argparse.ArgumentParser(
+        description='Copy a random subset of an IP-Glasma database')
+    parser.add_argument('datafile', help='the IP-Glasma database')
+    parser.add_argument('output_filename', help='output file name without .h5')
+    parser.add_argument('nev', type=int, help='number of events')
+    parser.add_argument('--stratify', choices=list(stratify_estimators),
+                        default=None,
+                        help='draw the same number of events in each bin '
+                             'of this estimator')
+    parser.add_argument('--n_bins', type=int, default=10,
+                        help='number of estimator bins for --stratify')
+    parser.add_argument('--n_readers', type=int, default=1,
+                        help='number of processes reading the events')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed of the event selection')
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    fetch_IPGlasma_events(args.datafile, args.output_filename, args.nev,
+                          args.stratify, args.n_bins, args.n_readers)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+     This module reads the IPGlasma outputs of one event once and appends
+     them into an hdf5 database with the layout of
+     combine_events_into_hdf5.py, which fecth_an_IPGlasma_event reads.
+     The N/A entries are set to 0 and the header lines (including the Q_s
+     line without "#") are recognized while the file is parsed, so the
+     outputs do not have to be rewritten with sed beforehand.
+
+     The grids can also be stored block-averaged by 2, 4, ... in
+     event-{id}/level-{factor}, for hydro runs on coarser grids.
+
+     Usage: ipglasma_ingestion.py results_folder database.h5 [event_id ...]
+            ipglasma_ingestion.py coarsen database.h5 factor [factor ...]
+"""
+
+from os import path
+from glob import glob
+from multiprocessing import Pool
+import io
+import re
+import sys
+import zlib
+import h5py
+import numpy as np
+
+# "key= value" pairs in the header of the epsilon-u-Hydro and Tmunu files
+grid_header_pattern = re.compile(r"(\w+)=\s*(\S+)")
+
+# position of the grid values in the header tokens of older outputs
+grid_header_tokens = {'nx': 6, 'ny': 8, 'dx': 12, 'dy': 14}
+
+# number of values in a chunk of the pre-compressed datasets
+values_per_chunk = 65536
+
+# first column of the coordinates in the grid files
+grid_file_patterns = [("epsilon-u-Hydro-t", 3), ("Tmunu-t", 2)]
+
+# the coarse grids of an event are stored in event-{id}/level-{factor}
+coarse_level_name = "level-{0:d}"
+
+
+def is_data_line(line):
+    """This function returns whether the line is a row of numbers"""
+    tokens = line.split()
+    if not tokens or tokens[0].startswith(b"#"):
+        return False
+    if tokens[0] == b"N/A":
+        return True
+    try:
+        float(tokens[0])
+    except ValueError:
+        return False
+    return True
+
+
+def read_ipglasma_output(filepath):
+    """This function reads one IPGlasma output file. It returns the list of
+       header lines and the data as a 2D array with the N/A entries set
+       to 0.
+    """
+    with open(filepath, "rb") as f:
+        text = f.read()
+
+    # the header lines are at the top of the file
+    header_lines = []
+    body_start = 0
+    while body_start < len(text):
+        line_end = text.find(b"\n", body_start)
+        if line_end < 0:
+            line_end = len(text)
+        line = text[body_start:line_end]
+        if is_data_line(line):
+            break
+        if line.strip() != b"":
+            header_lines.append(line.decode("UTF-8").rstrip("\r"))
+        body_start = line_end + 1
+
+    body = text[body_start:].replace(b"N/A", b"0.0")
+    data = np.loadtxt(io.BytesIO(body), comments="#", ndmin=2)
+    data = np.nan_to_num(data)
+    return header_lines, data
+
+
+def grid_header_values(header):
+    """This function returns nx, ny, dx, and dy from the header of an
+       epsilon-u-Hydro or Tmunu file
+    """
+    values = dict(grid_header_pattern.findall(header))
+    grid = {}
+    if all(key_name in values for key_name in ("xmax", "ymax", "dx", "dy")):
+        grid['nx'] = int(float(values['xmax']))
+        grid['ny'] = int(float(values['ymax']))
+        grid['dx'] = float(values['dx'])
+        grid['dy'] = float(values['dy'])
+    else:
+        tokens = header.split()
+        for key_name, itoken in grid_header_tokens.items():
+            grid[key_name] = float(tokens[itoken])
+        grid['nx'] = int(grid['nx'])
+        grid['ny'] = int(grid['ny'])
+    return grid
+
+
+def block_average(field, factor):
+    """This function averages a (n1, n2, n_columns) field over blocks of
+       factor x factor cells. The edges are padded with zeros, so the sum
+       over the grid is kept.
+    """
+    n1 = -(-field.shape[0]//factor)*factor
+    n2 = -(-field.shape[1]//factor)*factor
+    padded = np.zeros((n1, n2) + field.shape[2:])
+    padded[:field.shape[0], :field.shape[1]] = field
+    return padded.reshape(n1//factor, factor, n2//factor, factor,
+                          -1).mean(axis=(1, 3))
+
+
+def coarse_grid_header(header, grid):
+    """This function returns the header with the grid of the coarse level"""
+    for key_name, value in [("xmax", grid['nx']), ("ymax", grid['ny']),
+                            ("dx", grid['dx']), ("dy", grid['dy'])]:
+        header = re.sub(r"\b{}=\s*\S+".format(key_name),
+                        "{}= {}".format(key_name, value), header)
+    return header
+
+
+def coarsen_grid_dataset(name, data, attrs, factor):
+    """This function returns the dataset of an epsilon-u-Hydro or Tmunu
+       grid, block-averaged over factor x factor cells. The energy density
+       and the T^{mu nu} components are plain averages, so the total energy
+       is conserved. The flow velocity and the shear stress of the
+       epsilon-u-Hydro files are averaged with the energy density as
+       weight, and u^tau is normalized again.
+    """
+    attrs = dict(attrs)
+    nx, ny = int(attrs['nx']), int(attrs['ny'])
+    if name.startswith("epsilon-u-Hydro"):
+        # x is the outer loop, columns e, u^mu, pi^{mu nu}
+        field = block_average(data.reshape(nx, ny, -1), factor)
+        weighted = block_average((data[:, 0:1]*data).reshape(nx, ny, -1),
+                                 factor)
+        energy = field[:, :, 0]
+        positive = energy > 0.
+        field[positive, 1:] = (weighted[positive, 1:]
+                               / energy[positive][:, np.newaxis])
+        field[~positive, 1:] = 0.
+        field[:, :, 1] = np.sqrt(1. + np.sum(field[:, :, 2:5]**2, axis=2))
+        coarse_data = field.reshape(-1, data.shape[1])
+    else:
+        # y is the outer loop, columns T^{mu nu}
+        field = block_average(data.reshape(ny, nx, -1), factor)
+        coarse_data = field.reshape(-1, data.shape[1])
+    grid = {'nx': -(-nx//factor), 'ny': -(-ny//factor),
+            'dx': attrs['dx']*factor, 'dy': attrs['dy']*factor}
+    header = attrs['header']
+    if isinstance(header, bytes):
+        header = header.decode('UTF-8')
+    # the coarse cells are centered on the blocks
+    coarse_attrs = [
+        ("header", np.bytes_(coarse_grid_header(header, grid))),
+        ("x_size", attrs['x_size'] - (factor - 1)*attrs['dx']),
+        ("y_size", attrs['y_size'] - (factor - 1)*attrs['dy']),
+    ]
+    coarse_attrs += [(key_name, grid[key_name])
+                     for key_name in ("dx", "dy", "nx", "ny")]
+    coarse_attrs.append(("level", factor))
+    return {'name': "{}/{}".format(coarse_level_name.format(factor), name),
+            'data': coarse_data, 'attrs': coarse_attrs}
+
+
+def ipglasma_event_ids(results_path):
+    """This function returns the event ids of the IPGlasma events in the
+       results folder
+    """
+    event_list = glob(path.join(results_path, "usedParameters*.dat"))
+    return [event_path.split("/")[-1].split("Parameters")[-1].split(".")[0]
+            for event_path in event_list]
+
+
+def parse_ipglasma_event(results_path, event_id, levels=()):
+    """This function reads the outputs of one IPGlasma event. It returns the
+       attributes of the event group and a list of the datasets, each a
+       dictionary with the name, data, and attributes. The grids are also
+       block-averaged by each factor in levels.
+    """
+    group_attrs = []
+    dataset_list = []
+    file_name = "usedParameters{0}.dat".format(event_id)
+    filepath = path.join(results_path, file_name)
+    if path.isfile(filepath):
+        with open(filepath, "r") as parafile:
+            for iline, rawline in enumerate(parafile.readlines()):
+                group_attrs.append(("{0}".format(iline),
+                                    np.bytes_(rawline.strip('\n'))))
+
+    for file_name, n_columns in [("NcollList{0}.dat".format(event_id), 2),
+                                 ("NpartList{0}.dat".format(event_id), 4)]:
+        filepath = path.join(results_path, file_name)
+        if path.isfile(filepath):
+            _, data = read_ipglasma_output(filepath)
+            dataset_list.append({'name': file_name,
+                                 'data': data.reshape(-1, n_columns),
+                                 'attrs': []})
+
+    for filepath in glob(path.join(results_path,
+                                   "NpartdNdy-t*-{0}.dat".format(event_id))):
+        _, data = read_ipglasma_output(filepath)
+        dataset_list.append({'name': filepath.split("/")[-1],
+                             'data': data.flatten(), 'attrs': []})
+
+    for file_name_pattern, first_column in grid_file_patterns:
+        for filepath in glob(path.join(results_path, "{0}*-{1}.dat".format(
+                file_name_pattern, event_id))):
+            header_lines, data = read_ipglasma_output(filepath)
+            header = header_lines[0] if header_lines else ""
+            grid = grid_header_values(header)
+            attrs = [("header", np.bytes_(header))]
+            if first_column == 3:
+                # the first row has the (x, y) of the lower left corner
+                attrs += [("x_size", abs(data[0, 1])*2.),
+                          ("y_size", abs(data[0, 2])*2.)]
+            else:
+                attrs += [("x_size", grid['nx']*grid['dx']),
+                          ("y_size", grid['ny']*grid['dy'])]
+            attrs += [(key_name, grid[key_name])
+                      for key_name in ("dx", "dy", "nx", "ny")]
+            dataset_list.append({'name': filepath.split("/")[-1],
+                                 'data': data[:, first_column:],
+                                 'attrs': attrs})
+            for factor in levels:
+                dataset_list.append(coarsen_grid_dataset(
+                    filepath.split("/")[-1], data[:, first_column:], attrs,
+                    factor))
+    return group_attrs, dataset_list
+
+
+def chunk_shape(shape):
+    """This function returns the chunk shape of a pre-compressed dataset,
+       whole rows with about values_per_chunk values
+    """
+    if len(shape) == 1:
+        return (max(1, min(shape[0], values_per_chunk)),)
+    n_rows = max(1, min(shape[0], values_per_chunk//max(1, shape[1])))
+    return (n_rows,) + tuple(shape[1:])
+
+
+def compress_dataset(dataset):
+    """This function replaces the data of a dataset by its chunks
+       compressed with zlib (the hdf5 gzip filter), so that the writer only
+       has to store the bytes with write_direct_chunk
+    """
+    data = np.ascontiguousarray(dataset.pop('data'))
+    chunks = chunk_shape(data.shape)
+    compressed_list = []
+    for row_start in range(0, max(1, data.shape[0]), chunks[0]):
+        chunk = np.zeros(chunks, dtype=data.dtype)
+        rows = data[row_start:row_start + chunks[0]]
+        chunk[:len(rows)] = rows
+        offset = (row_start,) + (0,)*(len(chunks) - 1)
+        compressed_list.append((offset,
+                                zlib.compress(chunk.tobytes(), 9)))
+    dataset.update({'shape': data.shape, 'dtype': data.dtype.str,
+                    'chunks': chunks, 'compressed': compressed_list})
+    return dataset
+
+
+def prepare_ipglasma_event(results_path, event_id, levels=()):
+    """This function reads and compresses one IPGlasma event for
+       write_ipglasma_event
+    """
+    group_attrs, dataset_list = parse_ipglasma_event(results_path, event_id,
+                                                     levels)
+    return (event_id, group_attrs,
+            [compress_dataset(dataset) for dataset in dataset_list])
+
+
+def write_ipglasma_event(hf, event_id, group_attrs, dataset_list):
+    """This function stores one parsed IPGlasma event in the open hdf5 file
+       hf. An existing group of the event is replaced. The pre-compressed
+       chunks of a dataset are (offset, bytes) or (offset, bytes,
+       filter_mask), and its 'filters' (gzip 9 by default) must match them.
+    """
+    group_name = "event-{0}".format(event_id)
+    if group_name in hf:
+        del hf[group_name]
+    gtemp = hf.create_group(group_name)
+    for key_name, value in group_attrs:
+        gtemp.attrs.create(key_name, value)
+    for dataset in dataset_list:
+        filters = dataset.get('filters', {'compression': "gzip",
+                                          'compression_opts': 9})
+        if 'compressed' in dataset:
+            dset = gtemp.create_dataset(dataset['name'],
+                                        shape=dataset['shape'],
+                                        dtype=np.dtype(dataset['dtype']),
+                                        chunks=dataset['chunks'], **filters)
+            if dset.size > 0:
+                for chunk in dataset['compressed']:
+                    dset.id.write_direct_chunk(*chunk)
+        else:
+            dset = gtemp.create_dataset(dataset['name'],
+                                        data=dataset['data'], **filters)
+        for key_name, value in dataset['attrs']:
+            dset.attrs.create(key_name, value)
+
+
+def ingest_ipglasma_event(results_path, event_id, hf, levels=()):
+    """This function stores the outputs of one IPGlasma event in the open
+       hdf5 file hf. An existing group of the event is replaced.
+    """
+    write_ipglasma_event(hf, event_id,
+                         *parse_ipglasma_event(results_path, event_id,
+                                               levels))
+
+
+def _prepare_ipglasma_event_star(args):
+    return prepare_ipglasma_event(*args)
+
+
+def ingest_ipglasma_results(results_path, database_file, event_list=None,
+                            n_workers=1, levels=()):
+    """This function appends the IPGlasma events in the results folder to
+       the hdf5 database. With n_workers > 1, a pool of processes reads and
+       compresses the events, which are handed out one at a time, and this
+       process writes them into the database as they come in.
+    """
+    if event_list is None:
+        event_list = ipglasma_event_ids(results_path)
+    nev = len(event_list)
+    with h5py.File(database_file, "a") as hf:
+        if n_workers <= 1:
+            for ievent, event_id in enumerate(event_list):
+                print("ingesting IPGlasma event {0} ({1:d}/{2:d}) ... ".format(
+                    event_id, ievent + 1, nev), flush=True)
+                ingest_ipglasma_event(results_path, event_id, hf, levels)
+            return
+        with Pool(processes=n_workers) as pool:
+            for ievent, event in enumerate(pool.imap_unordered(
+                    _prepare_ipglasma_event_star,
+                    [(results_path, event_id, levels)
+                     for event_id in event_list])):
+                print("ingesting IPGlasma event {0} ({1:d}/{2:d}) ... ".format(
+                    event[0], ievent + 1, nev), flush=True)
+                write_ipglasma_event(hf, *event)
+
+
+def coarsen_database(database_file, levels):
+    """This function adds the coarse levels to all the events of an
+       existing IPGlasma database
+    """
+    with h5py.File(database_file, "a") as hf:
+        event_list = list(hf.keys())
+        for ievent, event_name in enumerate(event_list):
+            print("coarsening {0} ({1:d}/{2:d}) ... ".format(
+                event_name, ievent + 1, len(event_list)), flush=True)
+            gtemp = hf[event_name]
+            for name in list(gtemp.keys()):
+                if not name.startswith(tuple(
+                        pattern for pattern, _ in grid_file_patterns)):
+                    continue
+                dset = gtemp[name]
+                data = dset[()]
+                for factor in levels:
+                    coarse = coarsen_grid_dataset(name, data,
+                                                  dset.attrs.items(), factor)
+                    if coarse['name'] in gtemp:
+                        del gtemp[coarse['name']]
+                    coarse_dset = gtemp.create_dataset(
+                        coarse['name'], data=coarse['data'],
+                        compression="gzip", compression_opts=9)
+                    for key_name, value in coarse['attrs']:
+                        coarse_dset.attrs.create(key_name, value)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "coarsen":
+        coarsen_database(sys.argv[2], [int(x) for x in sys.argv[3:]])
+        exit(0)
+    try:
+        RESULTS_FOLDER = str(sys.argv[1])
+        DATABASE_FILE = str(sys.argv[2])
+    except IndexError:
+        print("{0} results_folder database.h5 [event_id ...]\n"
+              "{0} coarsen database.h5 factor [factor ...]".format(
+                  sys.argv[0]))
+        exit(1)
+    EVENT_LIST = sys.argv[3:] if len(sys.argv) > 3 else None
+    ingest_ipglasma_results(RESULTS_FOLDER, DATABASE_FILE, EVENT_LIST)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+    This module detects the CPU topology of the node (NUMA nodes, physical
+    cores, and hardware threads) and assigns explicit core sets to the
+    MUSIC OpenMP team and to every UrQMD worker, so that they do not
+    migrate across sockets.
+"""
+
+from os import path
+from glob import glob
+import os
+
+sys_cpu_path = "/sys/devices/system/cpu"
+sys_node_path = "/sys/devices/system/node"
+
+known_placement_policies = ["none", "compact", "spread"]
+
+
+def parse_cpu_list(cpu_list_str):
+    """This function converts a kernel cpu list string (e.g. "0-3,8")
+       to a list of integers
+    """
+    cpu_list = []
+    for item in cpu_list_str.strip().split(","):
+        if item == "":
+            continue
+        if "-" in item:
+            cpu_min, cpu_max = item.split("-")
+            cpu_list += list(range(int(cpu_min), int(cpu_max) + 1))
+        else:
+            cpu_list.append(int(item))
+    return cpu_list
+
+
+def _read_int(filename, default):
+    try:
+        with open(filename, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def allowed_cpus():
+    """This function returns the cpus this process is allowed to run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def detect_cpu_topology():
+    """This function returns the topology of the allowed cpus as a list of
+       NUMA nodes. Each node is a list of physical cores, and each core is
+       the list of its hardware threads.
+    """
+    cpus = set(allowed_cpus())
+    node_cpus = []
+    for node_path in sorted(glob(path.join(sys_node_path, "node[0-9]*")),
+                            key=lambda x: int(x.split("node")[-1])):
+        try:
+            with open(path.join(node_path, "cpulist"), "r") as f:
+                node_i = [cpu for cpu in parse_cpu_list(f.read())
+                          if cpu in cpus]
+        except OSError:
+            continue
+        if node_i:
+            node_cpus.append(node_i)
+    if not node_cpus:
+        node_cpus = [sorted(cpus)]
+
+    topology = []
+    for node_i in node_cpus:
+        cores = {}
+        for cpu in node_i:
+            topo_path = path.join(sys_cpu_path, "cpu{}".format(cpu),
+                                  "topology")
+            key = (_read_int(path.join(topo_path, "physical_package_id"), 0),
+                   _read_int(path.join(topo_path, "core_id"), cpu))
+            cores.setdefault(key, []).append(cpu)
+        topology.append([sorted(cores[key]) for key in sorted(cores)])
+    return topology
+
+
+def plan_placement(n_music_threads, n_urqmd, topology=None, policy="compact",
+                   disjoint=False):
+    """This function assigns cores to the MUSIC OpenMP team and to the
+       UrQMD workers
+
+       compact: the MUSIC team fills the physical cores of the first NUMA
+                node before moving to the next one
+       spread: the MUSIC team is distributed evenly over the NUMA nodes
+       The UrQMD workers get one physical core each, alternating between
+       the NUMA nodes to balance the memory bandwidth. The hydro and the
+       afterburner share cores unless disjoint is True, which is needed
+       when the afterburner of one event overlaps with the next hydro.
+
+       It returns a dictionary with the cpu list for 'hydro' and a list of
+       cpu lists for 'urqmd'.
+    """
+    if topology is None:
+        topology = detect_cpu_topology()
+
+    if policy == "spread":
+        music_cores = []
+        for core_idx in range(max([len(node_i) for node_i in topology])):
+            for node_i in topology:
+                if core_idx < len(node_i):
+                    music_cores.append(node_i[core_idx])
+    else:
+        music_cores = [core for node_i in topology for core in node_i]
+    n_music_threads = max(1, n_music_threads)
+    hydro_cpus = sorted([core[0] for core in music_cores[:n_music_threads]])
+    if len(hydro_cpus) < n_music_threads:
+        # more threads than physical cores, use the hardware threads as well
+        hydro_cpus = sorted(
+            [cpu for core in music_cores for cpu in core][:n_music_threads])
+
+    # interleave the NUMA nodes for the UrQMD workers
+    urqmd_cores = []
+    for core_idx in range(max([len(node_i) for node_i in topology])):
+        for node_i in topology:
+            if core_idx < len(node_i):
+                urqmd_cores.append(node_i[core_idx])
+    if disjoint:
+        free_cores = [core for core in urqmd_cores
+                      if not set(core) & set(hydro_cpus)]
+        if free_cores:
+            urqmd_cores = free_cores
+    urqmd_cpus = [
+        urqmd_cores[iev % len(urqmd_cores)] for iev in range(n_urqmd)
+    ]
+    return {'hydro': hydro_cpus, 'urqmd': urqmd_cpus}
+
+
+def openmp_environment(cpu_list):
+    """This function returns the OpenMP settings binding one thread to each
+       cpu in cpu_list
+    """
+    return {
+        'OMP_PLACES': ",".join(["{{{}}}".format(cpu) for cpu in cpu_list]),
+        'OMP_PROC_BIND': "close",
+    }
+
+
+def format_placement(plan, topology):
+    """This function returns a summary of the placement for the logs"""
+    cpu_node = {}
+    for inode, node_i in enumerate(topology):
+        for core in node_i:
+            for cpu in core:
+                cpu_node[cpu] = inode
+    lines = ["CPU topology: {} NUMA node(s), {} physical core(s)".format(
+        len(topology), sum([len(node_i) for node_i in topology]))]
+    lines.append("MUSIC team -> cpus {} (NUMA {})".format(
+        plan['hydro'],
+        sorted(set([cpu_node.get(cpu, 0) for cpu in plan['hydro']]))))
+    for iev, cpus in enumerate(plan['urqmd']):
+        lines.append("UrQMDev_{} -> cpus {} (NUMA {})".format(
+            iev, cpus, sorted(set([cpu_node.get(cpu, 0) for cpu in cpus]))))
+    return lines
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+    This script provides light-weight stand-ins for the stage executables
+    (3dMCGlauber, IPGlasma, KoMPoST, MUSIC, iSS, iSS + UrQMD, and the hadronic
+    afterburner toolkit). They produce output files with the names, layout,
+    and typical sizes of the real codes after a configurable latency, so
+    that the orchestration in hydro_plus_UrQMD_driver.py can be exercised
+    without the compiled packages.
+
+    Usage: fake_stage_engines.py stage [arguments] [--latency sec]
+                                       [--size_scale factor]
+"""
+
+from os import path, makedirs
+import argparse
+import shutil
+import time
+import numpy as np
+from particle_list_reader import particle_dtype, write_particle_list
+
+# typical output sizes of the real codes
+ipglasma_grid_size = 720        # IPGlasma lattice size
+kompost_grid_size = 512         # KoMPoST lattice size
+n_surface_cells = 40000         # number of freeze-out surface cells
+n_surface_columns = 34          # number of floats per surface cell
+n_strings_per_event = 400       # number of strings in a 3D MC-Glauber event
+n_samples_per_oversample = 10   # number of iSS samples per UrQMD run
+n_particles_per_sample = 4000   # number of hadrons per UrQMD event
+n_hydro_evo_lines = 200         # number of lines in hydro evolution files
+
+# particle species in the analysis outputs of hadronic_afterburner_toolkit
+spvn_particle_list = [9999, 211, -211, 321, -321, 2212, -2212, 3122, -3122,
+                      3312, -3312, 3334, -3334, 333]
+
+
+def scaled(number, size_scale):
+    """Returns the number of entries after the size rescaling"""
+    return max(1, int(number*size_scale))
+
+
+def fake_3dMCGlauber(args, size_scale):
+    """Writes strings_event_{i}.dat for i < nev in the current folder"""
+    nev = int(args[0]) if args else 1
+    seed = int(args[2]) if len(args) > 2 else 0
+    rng = np.random.default_rng(seed)
+    for iev in range(nev):
+        n_strings = scaled(n_strings_per_event, size_scale)
+        data = rng.random((n_strings, 21))
+        np.savetxt("strings_event_{}.dat".format(iev), data, fmt="%.6e",
+                   header="b = {0:.4f} fm, Npart = {1:d}".format(
+                       rng.random()*10., n_strings))
+
+
+def fake_ipglasma(args, size_scale, tau_list=("0.1", "0.4")):
+    """Writes the IPGlasma outputs into ipglasma/ipglasma_results"""
+    event_id = args[0] if args else "0"
+    results_folder = path.join("ipglasma", "ipglasma_results")
+    makedirs(results_folder, exist_ok=True)
+    rng = np.random.default_rng()
+    ngrid = scaled(ipglasma_grid_size, np.sqrt(size_scale))
+    dx = 0.04
+    x_size = ngrid*dx
+    header = ("# tau_in_fm 0.4 etamax= 1 xmax= {0} ymax= {0} deta= 0 "
+              + "dx= {1} dy= {1}").format(ngrid, dx)
+    ix, iy = np.meshgrid(np.arange(ngrid), np.arange(ngrid), indexing="ij")
+    for tau in tau_list:
+        data = np.zeros([ngrid*ngrid, 18])
+        data[:, 1] = -x_size/2. + ix.flatten()*dx
+        data[:, 2] = -x_size/2. + iy.flatten()*dx
+        data[:, 3] = rng.random(ngrid*ngrid)
+        data[:, 4] = 1.
+        np.savetxt(path.join(results_folder,
+                             "epsilon-u-Hydro-t{0}-{1}.dat".format(
+                                 tau, event_id)),
+                   data, fmt=("%i" + "  %.6e"*17), header=header[2:])
+        data = np.zeros([ngrid*ngrid, 12])
+        data[:, 0] = ix.flatten()
+        data[:, 1] = iy.flatten()
+        data[:, 2] = rng.random(ngrid*ngrid)
+        np.savetxt(path.join(results_folder,
+                             "Tmunu-t{0}-{1}.dat".format(tau, event_id)),
+                   data, fmt=("%i  %i" + "  %.6e"*10), header=header[2:])
+    npart = scaled(300, size_scale)
+    np.savetxt(path.join(results_folder, "NpartList{}.dat".format(event_id)),
+               rng.random((npart, 4)), fmt="%.6e")
+    np.savetxt(path.join(results_folder, "NcollList{}.dat".format(event_id)),
+               rng.random((npart, 2)), fmt="%.6e")
+    np.savetxt(path.join(results_folder,
+                         "NgluonEstimators{}.dat".format(event_id)),
+               rng.random((1, 3)), fmt="%.6e", header="Ng")
+    with open(path.join(results_folder,
+                        "usedParameters{}.dat".format(event_id)), "w") as f:
+        f.write("size {}\n".format(ngrid))
+    for log_i in ("run.log", "run.err"):
+        open(path.join(results_folder, log_i), "w").close()
+
+
+def fake_kompost(args, size_scale):
+    """Writes the KoMPoST output into kompost/kompost_results"""
+    results_folder = path.join("kompost", "kompost_results")
+    makedirs(results_folder, exist_ok=True)
+    ngrid = scaled(kompost_grid_size, np.sqrt(size_scale))
+    data = np.random.default_rng().random((ngrid*ngrid, 19))
+    np.savetxt(path.join(results_folder, ("ekt_tIn01_tOut08"
+                         + ".music_init_flowNonLinear_pimunuTransverse.txt")),
+               data, fmt="%.6e")
+
+
+def fake_hydro(args, size_scale):
+    """Writes the MUSIC outputs into MUSIC/hydro_results"""
+    results_folder = path.join("MUSIC", "hydro_results")
+    if path.exists(results_folder):
+        shutil.rmtree(results_folder)
+    makedirs(results_folder)
+    rng = np.random.default_rng()
+    surface = rng.random(
+        (scaled(n_surface_cells, size_scale), n_surface_columns),
+        dtype=np.float32)
+    surface.tofile(path.join(results_folder, "surface_eps_0.1800.dat"))
+    music_input = path.join("MUSIC", "music_input_mode_2")
+    if path.isfile(music_input):
+        shutil.copy(music_input, path.join(results_folder, "music_input"))
+    else:
+        open(path.join(results_folder, "music_input"), "w").close()
+    for file_name in ("eccentricities_evo_ed_tau_0.4.dat",
+                      "momentum_anisotropy_tau_0.4.dat",
+                      "meanpT_estimators_tau_0.4.dat"):
+        np.savetxt(path.join(results_folder, file_name),
+                   rng.random((n_hydro_evo_lines, 10)), fmt="%.6e",
+                   header="tau  quantities")
+    with open(path.join(results_folder, "run.log"), "w") as f:
+        f.write("[Info] MUSIC fake engine\n")
+        f.write("[Info] Hydrodynamic evolution Finished.\n")
+
+
+def fake_iss(args, size_scale):
+    """Writes the sampled hadrons to OSCAR.DAT in the current (iSS) folder"""
+    n_samples = n_samples_per_oversample
+    if path.isfile("iSS_parameters.dat"):
+        with open("iSS_parameters.dat", "r") as f:
+            for line in f:
+                key_value = line.split("=")
+                if key_value[0].strip() == "number_of_repeated_sampling":
+                    n_samples = int(key_value[1])
+    rng = np.random.default_rng()
+    n_particles = scaled(n_particles_per_sample, size_scale)
+    with open("OSCAR.DAT", "w") as f:
+        f.write("OSC1997A\nfinal_id_p_x\n")
+        f.write("     iSS  1.0   (197,    79)+(197,    79)  eqsp  "
+                + "0.1000E+03         1\n")
+        for iev in range(n_samples):
+            f.write("{0:10d}  {1:10d}  0.000  0.000\n".format(
+                iev + 1, n_particles))
+            pid = rng.choice(spvn_particle_list[1:], n_particles)
+            data = rng.random((n_particles, 9))
+            for ipart in range(n_particles):
+                f.write("{0:10d}  {1:10d}  ".format(ipart + 1, pid[ipart])
+                        + "  ".join(["{:.6e}".format(x)
+                                     for x in data[ipart]]) + "\n")
+
+
+def write_binary_particle_list(filename, n_events, n_particles, rng):
+    """Writes particle samples in the zipped binary particle list layout"""
+
+    def sample_events():
+        for _ in range(n_events):
+            particles = np.zeros(n_particles, dtype=particle_dtype)
+            particles["pid"] = rng.choice(spvn_particle_list[1:], n_particles)
+            particles["mass"] = rng.random(n_particles)
+            particles["x"] = rng.random((n_particles, 4))
+            particles["p"][:, 1:] = rng.normal(0., 1., (n_particles, 3))
+            particles["p"][:, 0] = np.sqrt(
+                particles["mass"]**2
+                + np.sum(particles["p"][:, 1:]**2, axis=1))
+            yield particles
+
+    write_particle_list(filename, sample_events())
+
+
+def fake_afterburner(args, size_scale):
+    """Writes UrQMDev_i/UrQMD_results/particle_list.gz"""
+    sub_event_id = args[0] if args else "0"
+    sub_event_folder = "UrQMDev_{}".format(sub_event_id)
+    results_folder = path.join(sub_event_folder, "UrQMD_results")
+    if path.exists(results_folder):
+        shutil.rmtree(results_folder)
+    makedirs(results_folder)
+    write_binary_particle_list(path.join(results_folder, "particle_list.gz"),
+                               n_samples_per_oversample,
+                               scaled(n_particles_per_sample, size_scale),
+                               np.random.default_rng())
+    shutil.rmtree(path.join(sub_event_folder, "hydro_event"),
+                  ignore_errors=True)
+
+
+def fake_concatenate(args, size_scale):
+    """Appends the second zipped particle list to the first one"""
+    with open(args[0], "ab") as f_out, open(args[1], "rb") as f_in:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def fake_analysis(args, size_scale):
+    """Writes the spvn outputs into hadronic_afterburner_toolkit/results"""
+    results_folder = path.join("hadronic_afterburner_toolkit", "results")
+    makedirs(results_folder, exist_ok=True)
+    rng = np.random.default_rng()
+    file_list = ["particle_9999_dNdeta_pT_0.2_3.dat",
+                 "particle_9999_vndata_eta_-0.5_0.5.dat",
+                 "particle_9999_vndata_diff_eta_0.5_2.dat",
+                 "particle_9999_vndata_eta_-2_2.dat"]
+    for pid in spvn_particle_list[1:]:
+        file_list.append("particle_{}_vndata_diff_y_-0.5_0.5.dat".format(pid))
+        file_list.append("particle_{}_vndata_y_-0.5_0.5.dat".format(pid))
+    for file_name in file_list:
+        np.savetxt(path.join(results_folder, file_name),
+                   rng.random((41, 19)), fmt="%.6e", header="pT  quantities")
+
+
+fake_engine_list = {
+    '3dMCGlauber': fake_3dMCGlauber,
+    'ipglasma': fake_ipglasma,
+    'kompost': fake_kompost,
+    'hydro': fake_hydro,
+    'sampler': fake_iss,
+    'afterburner': fake_afterburner,
+    'concatenate': fake_concatenate,
+    'analysis': fake_analysis,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="stand-in executables for the iEBE-MUSIC stages")
+    parser.add_argument("stage", choices=list(fake_engine_list.keys()))
+    parser.add_argument("arguments", nargs="*")
+    parser.add_argument("--latency", type=float, default=0.,
+                        help="seconds to wait before writing the outputs")
+    parser.add_argument("--size_scale", type=float, default=1.,
+                        help="rescaling factor for the output sizes")
+    args = parser.parse_intermixed_args()
+    time.sleep(args.latency)
+    fake_engine_list[args.stage](args.arguments, args.size_scale)
@@ -1,39 +1,332 @@
 #!/usr/bin/env python3
 """This is a drive script to run hydro + hadronic cascade simulation"""
 
-from multiprocessing import Pool
-from subprocess import call
-from os import path, mkdir, remove, makedirs
+from multiprocessing import Pool, get_context
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from os import path, mkdir, remove, makedirs, chdir, symlink, listdir
 from glob import glob
+import argparse
 import sys
+import threading
 import time
 import shutil
 import re
 import h5py
 import numpy as np
 from fetch_IPGlasma_event_from_hdf5_database import fecth_an_IPGlasma_event, fecth_an_IPGlasma_event_Tmunu
-from fetch_3DMCGlauber_event_from_hdf5_database import fecth_an_3DMCGlauber_event
+from fetch_3DMCGlauber_event_from_hdf5_database import fecth_an_3DMCGlauber_event, fecth_a_thickness_function_pair
+from ipglasma_ingestion import ingest_ipglasma_event, read_ipglasma_output
+from process_manager import run_process
+import cpu_placement
+import stage_scaling
+import hydro_surface_archive
+import spvn_analysis
+import particle_list_reader
+import initial_condition_filter
+import startup_throttle
+import ic_cache
+import result_cache
+
+
+known_initial_types = [
+    "IPGlasma", "IPGlasma+KoMPoST", "3DMCGlauber_dynamical",
+    "3DMCGlauber_consttau"
+]
+
+# commands to launch the stage executables, the stage specific arguments
+# are appended at run time
+stage_executable_registry = {
+    '3dMCGlauber': ["./3dMCGlb.e"],
+    'ipglasma': ["bash", "./run_ipglasma.sh"],
+    'kompost': ["bash", "./run_kompost.sh"],
+    'hydro': ["bash", "./run_hydro.sh"],
+    'sampler': ["./iSS.e"],
+    'afterburner': ["bash", "./run_afterburner.sh"],
+    'concatenate': ["./hadronic_afterburner_toolkit/concatenate_binary_files.e"],
+    'analysis': ["bash", "./run_analysis_spvn.sh"],
+    'spvn': [sys.executable, "./spvn_analysis.py"],
+}
+
+# stages implemented in Python, they are kept with the fake engines
+python_stage_list = ['spvn']
+
+# wall time spent inside the stage executables, as (stage, seconds)
+stage_executable_timing = []
+
+# process settings for the stage executables: timeout (seconds), n_threads
+# (OMP_NUM_THREADS), cpu_list (cores to pin the process to), env (extra
+# environment variables), worker_cpu_lists (cores for each UrQMD worker),
+# n_workers (number of concurrent UrQMD workers), calibration_file
+# (file to record the wall time of successful runs), throttle (a
+# StartupThrottle shared by the jobs to stagger the start-up), and
+# startup_ready (a file pattern that shows the start-up is over)
+stage_process_settings = {}
+
+# stages that wait for a start-up slot when the throttle is on, "database"
+# stands for the initial condition database fetches
+default_throttled_stages = ['ipglasma']
+
+# files that a stage writes once it has read its tables, the start-up slot
+# is given back when they appear
+startup_ready_files = {
+    'ipglasma': "ipglasma/NcollList*.dat",
+}
+
+
+class StageEngines:
+    """This class holds the commands, the process settings (see
+       stage_process_settings) and the wall time of the stage executables
+       of one pipeline. A new instance starts from copies of the module
+       defaults, so the pipelines that run one after the other in a
+       process do not see each other's engines or settings.
+    """
+
+    def __init__(self, registry=None, settings=None, timing=None):
+        if registry is None:
+            registry = {stage_name: list(command) for stage_name, command
+                        in stage_executable_registry.items()}
+        if settings is None:
+            settings = {stage_name: dict(settings_i) for stage_name, settings_i
+                        in stage_process_settings.items()}
+        if timing is None:
+            timing = []
+        self.registry = registry
+        self.settings = settings
+        self.timing = timing
+
+    def register(self, stage_name, command):
+        """Replaces the command used to launch a stage executable"""
+        if stage_name not in self.registry:
+            raise KeyError("Unknown stage executable: {}".format(stage_name))
+        self.registry[stage_name] = list(command)
+
+    def use_fake(self, engine_script="fake_stage_engines.py", latency=None,
+                 size_scale=1.0):
+        """Registers the light-weight stand-in executables in
+           fake_stage_engines.py for all stages. latency is a dictionary
+           with the sleep time in seconds for each stage.
+        """
+        if latency is None:
+            latency = {}
+        engine_script = path.abspath(engine_script)
+        for stage_name in self.registry:
+            if stage_name in python_stage_list:
+                continue
+            self.register(stage_name, [
+                sys.executable, engine_script, stage_name,
+                "--latency", str(latency.get(stage_name, 0.)),
+                "--size_scale", str(size_scale)
+            ])
+
+    def configure(self, stage_name, **settings):
+        """Sets the process settings used to launch the executable of the
+           given stage
+        """
+        if stage_name not in self.registry:
+            raise KeyError("Unknown stage executable: {}".format(stage_name))
+        self.settings.setdefault(stage_name, {}).update(settings)
+
+    def run(self, stage_name, *args, cwd=None, cpu_list=None):
+        """Runs the registered executable for the given stage and returns
+           True if it finishes successfully. cpu_list overrides the cores
+           in the settings.
+        """
+        command = (self.registry[stage_name]
+                   + [str(arg_i) for arg_i in args])
+        settings = self.settings.get(stage_name, {})
+        if cpu_list is None:
+            cpu_list = settings.get('cpu_list')
+        startup_slot = nullcontext()
+        if settings.get('throttle') is not None:
+            ready = None
+            if settings.get('startup_ready') is not None:
+                ready = partial(glob, path.join(cwd or ".",
+                                                settings['startup_ready']))
+            startup_slot = settings['throttle'].slot(ready=ready)
+        with startup_slot:
+            result = run_process(command, cwd=cwd,
+                                 timeout=settings.get('timeout'),
+                                 n_threads=settings.get('n_threads'),
+                                 cpu_list=cpu_list,
+                                 env=settings.get('env'),
+                                 prefix="[{}] ".format(stage_name))
+        self.timing.append((stage_name, result.elapsed))
+        if result.success and settings.get('calibration_file') is not None:
+            stage_scaling.record_stage_timing(settings['calibration_file'],
+                                              stage_name,
+                                              settings.get('n_threads', 1),
+                                              result.elapsed)
+        if result.timed_out:
+            print("\U000026D4  {} exceeded the time limit of {} s".format(
+                stage_name, settings.get('timeout')),
+                  flush=True)
+        elif not result.success:
+            print("\U000026D4  {} failed with return code {}".format(
+                stage_name, result.returncode),
+                  flush=True)
+        return result.success
+
+
+# the engines of the functions below when they are not given any, they
+# change the module defaults in place
+default_stage_engines = StageEngines(stage_executable_registry,
+                                     stage_process_settings,
+                                     stage_executable_timing)
+
+
+def register_stage_executable(stage_name, command, engines=None):
+    """This function replaces the command used to launch a stage executable"""
+    if engines is None:
+        engines = default_stage_engines
+    engines.register(stage_name, command)
+
+
+def use_fake_stage_engines(engine_script="fake_stage_engines.py",
+                           latency=None, size_scale=1.0, engines=None):
+    """This function registers the light-weight stand-in executables in
+       fake_stage_engines.py for all stages. latency is a dictionary with
+       the sleep time in seconds for each stage.
+    """
+    if engines is None:
+        engines = default_stage_engines
+    engines.use_fake(engine_script, latency, size_scale)
+
+
+def configure_stage_process(stage_name, engines=None, **settings):
+    """This function sets the process settings (see
+       stage_process_settings) used to launch the executable of the given
+       stage
+    """
+    if engines is None:
+        engines = default_stage_engines
+    engines.configure(stage_name, **settings)
+
+
+def run_stage_executable(stage_name, *args, cwd=None, cpu_list=None,
+                         engines=None):
+    """This function runs the registered executable for the given stage
+       and returns True if it finishes successfully. cpu_list overrides
+       the cores set in stage_process_settings.
+    """
+    if engines is None:
+        engines = default_stage_engines
+    return engines.run(stage_name, *args, cwd=cwd, cpu_list=cpu_list)
+
+
+def link_file(source, link_name):
+    """This function (re)creates the symbolic link link_name -> source"""
+    if path.islink(link_name) or path.isfile(link_name):
+        remove(link_name)
+    symlink(path.abspath(source), link_name)
+
+
+# per-job pool of the self-generated 3D MC-Glauber events
+glauber_pool_file = "3dMCGlauber/glauber_event_pool.h5"
 
+# per-job database of the self-generated IPGlasma events, with the layout
+# of IPGlasma_database/combine_events_into_hdf5.py
+ipglasma_database_file = "ipglasma_events.h5"
 
-def print_usage():
-    """This function prints out help messages"""
-    print("\U0001F3B6  " + "Usage: {} ".format(sys.argv[0])
-          + "initial_condition_database "
-          + "initial_condition_type n_hydro_events hydro_event_id n_UrQMD "
-          + "n_threads save_hydro_flag save_urqmd_flag seed_add tau0")
+
+def fecth_an_3DMCGlauber_smooth_event(database_path, iev, keep_open=True):
+    """This function copies the TA and TB files of an initial condition to
+       MUSIC/initial and returns the name of the TA file. database_path is
+       an hdf5 database made by combine_thickness_functions_into_hdf5.py,
+       or a folder with the text files, which are taken in sorted order.
+       The hdf5 database is kept open for the next events with keep_open.
+    """
+    if path.isfile(database_path):
+        return fecth_a_thickness_function_pair(database_path, iev,
+                                               "MUSIC/initial", keep_open)
+    filelist = sorted(
+        glob(path.join(database_path, 'nuclear_thickness_TA_*.dat')))
+    file_name = filelist[iev].split("/")[-1]
+    shutil.copy(filelist[iev], "MUSIC/initial/initial_TA.dat")
+    shutil.copy(path.join(database_path, re.sub("TA", "TB", file_name)),
+                "MUSIC/initial/initial_TB.dat")
+    return file_name
+
+
+def fill_glauber_event_pool(n_events, seed, pool_file=glauber_pool_file,
+                            engines=None):
+    """This function runs 3dMCGlb.e once for n_events events and appends
+       them to the event pool, with the layout of the 3DMCGlauber hdf5
+       databases. It returns True if it succeeds.
+    """
+    print("\U0001F3B2  Generate {} 3D MC-Glauber events ...".format(n_events),
+          flush=True)
+    if not run_stage_executable('3dMCGlauber', n_events, "input", seed,
+                                cwd="3dMCGlauber", engines=engines):
+        return False
+    with h5py.File(pool_file, "a") as h5_f:
+        n_pool = int(h5_f.attrs.get("n_events", 0))
+        for iev in range(n_events):
+            file_name = path.join("3dMCGlauber",
+                                  "strings_event_{}.dat".format(iev))
+            if not path.isfile(file_name):
+                continue
+            header_text = ""
+            with open(file_name, "r") as f:
+                for line in f:
+                    if not line.startswith("#"):
+                        break
+                    header_text += line
+            h5data = h5_f.create_dataset(
+                "strings_event_{}.dat".format(n_pool),
+                data=np.loadtxt(file_name, ndmin=2), compression="gzip",
+                compression_opts=9)
+            h5data.attrs.create("header", np.bytes_(header_text))
+            remove(file_name)
+            n_pool += 1
+        h5_f.attrs["n_events"] = n_pool
+    return True
+
+
+def pop_glauber_event(output_file, pool_file=glauber_pool_file):
+    """This function writes the next unused event in the pool into
+       output_file. It returns False if the pool is empty.
+    """
+    if not path.isfile(pool_file):
+        return False
+    with h5py.File(pool_file, "a") as h5_f:
+        next_event = int(h5_f.attrs.get("next_event", 0))
+        if next_event >= int(h5_f.attrs.get("n_events", 0)):
+            return False
+        h5data = h5_f["strings_event_{}.dat".format(next_event)]
+        header_text = h5data.attrs["header"].decode('UTF-8')
+        np.savetxt(output_file, h5data[()], fmt="%.6e",
+                   header=header_text.replace("# ", "").replace(
+                       "#", "").rstrip("\n"))
+        h5_f.attrs["next_event"] = next_event + 1
+    return True
 
 
-def fecth_an_3DMCGlauber_smooth_event(database_path, iev):
-    """This function returns the filename of an initial condition in the
-       database_path folder
+def glauber_pool_seed(seed_add, iev, ic_seed=None):
+    """This function returns the seed of the 3D MC-Glauber batch that is
+       generated when event iev finds the event pool empty. The seeds of
+       the batches differ because they are generated at different iev.
     """
-    filelist = glob(path.join(database_path, 'nuclear_thickness_TA_*.dat'))
-    return (filelist[iev])
+    if ic_seed is not None:
+        return ic_seed + seed_add + iev
+    ran = np.random.default_rng().integers(1e8)
+    return seed_add + iev*ran
 
 
 def get_initial_condition(database, initial_type, iev, seed_add,
-                          final_results_folder, time_stamp_str="0.4"):
-    """This funciton get initial conditions"""
+                          final_results_folder, time_stamp_str="0.4",
+                          glauber_batch_size=1, ic_seed=None, engines=None,
+                          keep_database_open=True):
+    """This funciton get initial conditions. It returns None if the
+       initial condition could not be generated. The self-generated 3D
+       MC-Glauber events are taken from the event pool of the job, which
+       is filled with glauber_batch_size events at a time. With ic_seed,
+       the seed of the pool only depends on ic_seed and the event id, so
+       the jobs of all the design points of a campaign generate the same
+       events. keep_database_open = False closes a thickness function
+       database after the event is read (e.g. a cached event).
+    """
     if "IPGlasma" in initial_type:
         ipglasma_local_folder = "ipglasma/ipglasma_results"
         file_name = ("epsilon-u-Hydro-t{0:s}-{1}.dat".format(
@@ -47,7 +340,8 @@ def get_initial_condition(database, initial_type, iev, seed_add,
                                  ipglasma_folder_name)
 
             if not path.exists(path.join(res_path, file_name)):
-                run_ipglasma(iev)
+                if not run_ipglasma(iev, engines):
+                    return None
                 collect_ipglasma_event(final_results_folder, iev)
             else:
                 print("IPGlasma event exists ...")
@@ -57,8 +351,9 @@ def get_initial_condition(database, initial_type, iev, seed_add,
                 file_temp = fecth_an_IPGlasma_event_Tmunu(
                                             database, time_stamp_str, iev)
             else:
+                # a coarse level of the database can serve coarse hydro grids
                 file_temp = fecth_an_IPGlasma_event(database, time_stamp_str,
-                                                    iev)
+                                                    iev, music_grid_spacing())
             makedirs(ipglasma_local_folder, exist_ok=True)
             shutil.move(file_temp,
                         path.join(ipglasma_local_folder, file_name))
@@ -69,13 +364,15 @@ def get_initial_condition(database, initial_type, iev, seed_add,
     elif initial_type == "3DMCGlauber_dynamical":
         if database == "self":
             file_name = "strings_event_{}.dat".format(iev)
-            ran = np.random.default_rng().integers(1e8)
+            glauber_seed = glauber_pool_seed(seed_add, iev, ic_seed)
             if not path.exists(file_name):
-                call("(cd 3dMCGlauber; ./3dMCGlb.e 1 input {};)".format(
-                                                        seed_add + iev*ran),
-                     shell=True)
-                call("mv 3dMCGlauber/strings_event_0.dat {}".format(file_name),
-                     shell=True)
+                if not pop_glauber_event(file_name):
+                    if not fill_glauber_event_pool(glauber_batch_size,
+                                                   glauber_seed,
+                                                   engines=engines):
+                        return None
+                    if not pop_glauber_event(file_name):
+                        return None
             else:
                 print("3D MC-Glauber event exists ...")
                 print("No need to rerun ...")
@@ -87,7 +384,8 @@ def get_initial_condition(database, initial_type, iev, seed_add,
             file_name = fecth_an_3DMCGlauber_event(database, iev)
             return file_name
     elif initial_type == "3DMCGlauber_consttau":
-        file_name = fecth_an_3DMCGlauber_smooth_event(database, iev)
+        file_name = fecth_an_3DMCGlauber_smooth_event(database, iev,
+                                                      keep_database_open)
         return file_name
     else:
         print("\U0001F6AB  "
@@ -96,10 +394,29 @@ def get_initial_condition(database, initial_type, iev, seed_add,
         exit(1)
 
 
-def run_ipglasma(iev):
+def music_grid_spacing(music_input="MUSIC/music_input_mode_2"):
+    """This function returns the transverse grid spacing of MUSIC in fm, or
+       None if it is not set in the MUSIC input file
+    """
+    if not path.isfile(music_input):
+        return None
+    music_parameters = {}
+    with open(music_input, "r") as f:
+        for line in f:
+            tokens = line.split()
+            if len(tokens) > 1:
+                music_parameters[tokens[0]] = tokens[1]
+    try:
+        return (float(music_parameters['X_grid_size_in_fm'])
+                / (int(music_parameters['Grid_size_in_x']) - 1))
+    except (KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+def run_ipglasma(iev, engines=None):
     """This functions run IPGlasma"""
     print("\U0001F3B6  Run IPGlasma ... ")
-    call("bash ./run_ipglasma.sh {}".format(iev), shell=True)
+    return run_stage_executable('ipglasma', iev, engines=engines)
 
 
 def collect_ipglasma_event(final_results_folder, event_id):
@@ -118,22 +435,13 @@ def connect_ipglasma_event(final_results_folder, initial_type, event_id,
     res_path = path.join(path.abspath(final_results_folder),
                          ipglasma_folder_name)
     if initial_type == "IPGlasma":
-        hydro_initial_file = "MUSIC/initial/epsilon-u-Hydro.dat"
-        if path.islink(hydro_initial_file):
-            remove(hydro_initial_file)
-        call("ln -s {0:s} {1:s}".format(path.join(res_path, filename),
-                                        hydro_initial_file),
-             shell=True)
+        link_file(path.join(res_path, filename),
+                  "MUSIC/initial/epsilon-u-Hydro.dat")
     elif initial_type == "IPGlasma+KoMPoST":
-        kompost_initial_file = "kompost/Tmunu.dat"
-        if path.islink(kompost_initial_file):
-            remove(kompost_initial_file)
-        call("ln -s {0:s} {1:s}".format(path.join(res_path, filename),
-                                        kompost_initial_file),
-             shell=True)
+        link_file(path.join(res_path, filename), "kompost/Tmunu.dat")
 
 
-def run_hydro_event(final_results_folder, event_id):
+def run_hydro_event(final_results_folder, event_id, engines=None):
     """This functions run hydro"""
     logo = "\U0001F3B6"
     hydro_folder_name = "hydro_results_{}".format(event_id)
@@ -166,13 +474,21 @@ def run_hydro_event(final_results_folder, event_id):
     if not hydro_success:
         curr_time = time.asctime()
         print("{}  [{}] Playing MUSIC ... ".format(logo, curr_time), flush=True)
-        call("bash ./run_hydro.sh", shell=True)
+        if not run_stage_executable('hydro', engines=engines):
+            # keep the outputs of the failed run for inspection
+            if path.exists("MUSIC/hydro_results"):
+                shutil.move("MUSIC/hydro_results", results_folder)
+            return (hydro_success, hydro_folder_name)
 
         # check hydro finishes properly
-        ftmp = open("MUSIC/hydro_results/run.log", 'r', encoding="utf-8")
-        hydro_status = ftmp.readlines()[-1].split()[3]
-        if hydro_status == "Finished.":
-            hydro_success = True
+        try:
+            ftmp = open("MUSIC/hydro_results/run.log", 'r', encoding="utf-8")
+            hydro_status = ftmp.readlines()[-1].split()[3]
+            ftmp.close()
+            if hydro_status == "Finished.":
+                hydro_success = True
+        except (FileNotFoundError, IndexError):
+            hydro_success = False
 
         # collect hydro results
         shutil.move("MUSIC/hydro_results", results_folder)
@@ -180,7 +496,7 @@ def run_hydro_event(final_results_folder, event_id):
     return (hydro_success, hydro_folder_name)
 
 
-def run_kompost(final_results_folder, event_id):
+def run_kompost(final_results_folder, event_id, engines=None):
     """This functions run KoMPoST simulation"""
     logo = "\U0001F3B6"
     kompost_folder_name = "kompost_results_{}".format(event_id)
@@ -203,9 +519,7 @@ def run_kompost(final_results_folder, event_id):
     if not kompost_success:
         curr_time = time.asctime()
         print("\U0001F3B6  [{}] Run KoMPoST ... ".format(curr_time), flush=True)
-        call("bash ./run_kompost.sh", shell=True)
-
-        kompost_success = True
+        kompost_success = run_stage_executable('kompost', engines=engines)
         if kompost_success:
             # collect results
             shutil.move("kompost/kompost_results", results_folder)
@@ -223,25 +537,167 @@ def prepare_surface_files_for_urqmd(final_results_folder, hydro_folder_name,
         if path.exists(hydro_surface_folder):
             shutil.rmtree(hydro_surface_folder)
         mkdir(hydro_surface_folder)
-        call("ln -s {0:s} {1:s}".format(
-            path.abspath(surface_file[0]),
-            path.join(hydro_surface_folder, "surface.dat")),
-             shell=True)
+        link_file(surface_file[0],
+                  path.join(hydro_surface_folder, "surface.dat"))
         shutil.copy(
             path.join(final_results_folder, hydro_folder_name, "music_input"),
             hydro_surface_folder)
 
 
-def run_urqmd_event(event_id):
-    """This function runs hadornic afterburner"""
-    call("bash ./run_afterburner.sh {0:d}".format(event_id), shell=True)
+def read_oscar_event_header(f):
+    """This function returns the header line of the next event in the
+       OSCAR file, or an empty string at the end of the file
+    """
+    line = f.readline()
+    while line != "" and line.strip() == "":
+        line = f.readline()
+    return line
+
+
+def split_oscar_events(oscar_file, output_file_list):
+    """This function distributes the sampled events in the OSCAR file from
+       iSS into consecutive blocks of (almost) equal size, one for each
+       output file. It returns the number of events in each output file.
+       The file is read twice, first to count the events and then to
+       stream every event straight into its output file.
+    """
+    n_events_total = 0
+    with open(oscar_file, "r") as f:
+        for _ in range(3):
+            f.readline()
+        event_line = read_oscar_event_header(f)
+        while event_line != "":
+            for _ in range(int(event_line.split()[1])):
+                f.readline()
+            n_events_total += 1
+            event_line = read_oscar_event_header(f)
+
+    n_files = len(output_file_list)
+    n_events_list = [
+        n_events_total//n_files + int(ifile < n_events_total % n_files)
+        for ifile in range(n_files)
+    ]
+    with open(oscar_file, "r") as f:
+        header = [f.readline() for _ in range(3)]
+        for output_file, n_events in zip(output_file_list, n_events_list):
+            with open(output_file, "w") as f_out:
+                f_out.writelines(header)
+                for iev in range(n_events):
+                    # renumber the events from 1 in every output file
+                    event_header = read_oscar_event_header(f).split()
+                    event_header[0] = str(iev + 1)
+                    f_out.write("  ".join(event_header) + "\n")
+                    for _ in range(int(event_header[1])):
+                        f_out.write(f.readline())
+    return n_events_list
+
+
+def run_shared_sampling(final_results_folder, hydro_folder_name, n_urqmd,
+                        engines=None):
+    """This function runs iSS once for all the oversampled UrQMD events and
+       hands every UrQMD event its share of the samples
+    """
+    logo = "\U0001F3B2"
+    iss_folder = "iSS"
+    iss_results_folder = path.join(iss_folder, "results")
+    if path.exists(iss_results_folder):
+        shutil.rmtree(iss_results_folder)
+    mkdir(iss_results_folder)
+    surface_file = glob(
+        path.join(final_results_folder, hydro_folder_name, "surface*.dat"))
+    link_file(path.abspath(surface_file[0]),
+              path.join(iss_results_folder, "surface.dat"))
+    shutil.copy(
+        path.join(final_results_folder, hydro_folder_name, "music_input"),
+        iss_results_folder)
+
+    curr_time = time.asctime()
+    print("{}  [{}] Sampling {} oversampled events with iSS ... ".format(
+        logo, curr_time, n_urqmd),
+          flush=True)
+    oscar_file = path.join(iss_folder, "OSCAR.DAT")
+    if path.isfile(oscar_file):
+        remove(oscar_file)
+    if (not run_stage_executable('sampler', cwd=iss_folder, engines=engines)
+            or not path.isfile(oscar_file)):
+        print("\U000026D4  iSS sampling failed.", flush=True)
+        return False
+
+    output_file_list = []
+    for iev in range(n_urqmd):
+        hydro_surface_folder = "UrQMDev_{0:d}/hydro_event".format(iev)
+        if path.exists(hydro_surface_folder):
+            shutil.rmtree(hydro_surface_folder)
+        mkdir(hydro_surface_folder)
+        output_file_list.append(path.join(hydro_surface_folder, "OSCAR.DAT"))
+    n_events_list = split_oscar_events(oscar_file, output_file_list)
+    remove(oscar_file)
+    shutil.rmtree(iss_results_folder)
+    print("{}  Distributed {} samples to {} UrQMD events.".format(
+        logo, sum(n_events_list), n_urqmd),
+          flush=True)
+    return min(n_events_list) > 0
+
+
+def run_urqmd_event(event_id, cpu_list=None, incremental_analysis=False,
+                    engines=None):
+    """This function runs hadornic afterburner. With incremental_analysis,
+       the particle list of this oversampled event is analyzed right after
+       UrQMD finishes.
+    """
+    if engines is None:
+        engines = default_stage_engines
+    status = engines.run('afterburner', event_id, cpu_list=cpu_list)
+    timing = engines.timing[-1]
+    if status and incremental_analysis:
+        accumulate_urqmd_event_analysis(event_id, cpu_list, engines)
+    return (status, timing)
+
+
+def _run_urqmd_event_star(args):
+    return (args[0], run_urqmd_event(*args))
 
 
-def run_urqmd_shell(n_urqmd, final_results_folder, event_id):
-    """This function runs urqmd events in parallel"""
+def oversample_analysis_state(iev):
+    """This function returns the analysis state of one oversampled event"""
+    return "UrQMDev_{}/UrQMD_results/spvn_state.npz".format(iev)
+
+
+def analysis_state_name(event_id):
+    """This function returns the name of the merged analysis state"""
+    return "spvn_state_{}.npz".format(event_id)
+
+
+def accumulate_urqmd_event_analysis(iev, cpu_list=None, engines=None):
+    """This function accumulates the spvn analysis of one oversampled
+       UrQMD event into its analysis state
+    """
+    return run_stage_executable(
+        'spvn', "accumulate",
+        "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev),
+        oversample_analysis_state(iev),
+        "hadronic_afterburner_toolkit/parameters.dat", cpu_list=cpu_list,
+        engines=engines)
+
+
+def run_urqmd_shell(n_urqmd, final_results_folder, event_id,
+                    incremental_analysis=False, particle_list_format="gz",
+                    engines=None):
+    """This function runs urqmd events in parallel
+
+       incremental_analysis: analyze every oversampled event as soon as it
+                             finishes and merge the analysis states into
+                             spvn_state_{event_id}.npz, which holds the
+                             partial results if the job is killed
+       particle_list_format: "gz" concatenates the zipped binary particle
+                             lists, "h5" writes the oversampled events into
+                             an indexed hdf5 container as they finish
+    """
     logo = "\U0001F5FF"
-    urqmd_results_name = "particle_list_{}.gz".format(event_id)
+    urqmd_results_name = particle_list_name(event_id, particle_list_format)
     results_folder = path.join(final_results_folder, urqmd_results_name)
+    state_file = path.join(final_results_folder,
+                           analysis_state_name(event_id))
     urqmd_success = False
 
     if path.exists(results_folder):
@@ -252,26 +708,110 @@ def run_urqmd_shell(n_urqmd, final_results_folder, event_id):
     if not urqmd_success:
         curr_time = time.asctime()
         print("{}  [{}] Running UrQMD ... ".format(logo, curr_time), flush=True)
-        with Pool(processes=n_urqmd) as pool1:
-            pool1.map(run_urqmd_event, range(n_urqmd))
-
-        for iev in range(1, n_urqmd):
-            call("./hadronic_afterburner_toolkit/concatenate_binary_files.e "
-                 + "UrQMDev_0/UrQMD_results/particle_list.gz "
-                 + "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev),
-                 shell=True)
+        for stale_file in [state_file, results_folder + ".appended"]:
+            if path.exists(stale_file):
+                remove(stale_file)
+        indexed_file = results_folder + ".part"
+        indexed_list = None
+        if particle_list_format == "h5":
+            indexed_list = particle_list_reader.IndexedParticleList(
+                indexed_file, "w")
+        if engines is None:
+            engines = default_stage_engines
+        settings = engines.settings.get('afterburner', {})
+        worker_cpu_lists = settings.get('worker_cpu_lists', [None]*n_urqmd)
+        n_workers = min(n_urqmd, settings.get('n_workers', n_urqmd))
+        status_list = [None]*n_urqmd
+        merged_analysis = None
+        merged_list = []
+        # the overlap mode runs the afterburner in a background thread, a
+        # worker forked there could inherit the locks held by the other
+        # threads, so the workers are forked from a fresh server process
+        worker_pool = Pool
+        if threading.current_thread() is not threading.main_thread():
+            worker_pool = get_context("forkserver").Pool
+        with worker_pool(processes=n_workers) as pool1:
+            for iev, status_i in pool1.imap_unordered(
+                    _run_urqmd_event_star,
+                    [(iev, worker_cpu_lists[iev], incremental_analysis,
+                      engines) for iev in range(n_urqmd)]):
+                status_list[iev] = status_i
+                urqmd_file_i = (
+                    "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev))
+                if (indexed_list is not None and status_i[0]
+                        and path.isfile(urqmd_file_i)):
+                    indexed_list.append_events(
+                        particle_list_reader.iterate_events(urqmd_file_i))
+                if not (status_i[0] and incremental_analysis
+                        and path.isfile(oversample_analysis_state(iev))):
+                    continue
+                analysis_i = spvn_analysis.SpvnAnalysis.load_state(
+                    oversample_analysis_state(iev))
+                if merged_analysis is None:
+                    merged_analysis = analysis_i
+                else:
+                    merged_analysis.merge(analysis_i)
+                merged_analysis.save_state(state_file)
+                merged_list.append(iev)
+        if indexed_list is not None:
+            indexed_list.close()
+        # the oversampled events run concurrently, count the slowest one
+        engines.timing.append(
+            max([timing_i for _, timing_i in status_list],
+                key=lambda x: x[1]))
+
+        # only merge the oversampled events that finished properly
+        good_list = [
+            iev for iev, (status, _) in enumerate(status_list)
+            if status and path.isfile(
+                "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev))
+        ]
+        if len(good_list) < n_urqmd:
+            print("{} {} of {} UrQMD runs failed ... ".format(
+                logo, n_urqmd - len(good_list), n_urqmd),
+                  flush=True)
+        if sorted(merged_list) != good_list and path.exists(state_file):
+            # the analysis state does not match the merged particle list
+            remove(state_file)
+        if not good_list:
+            return (urqmd_success, results_folder)
+
+        if indexed_list is not None:
+            # the events are already in the indexed container
+            merged_file = indexed_file
+            good_list = [None]
+        else:
+            merged_file = "UrQMDev_{}/UrQMD_results/particle_list.gz".format(
+                good_list[0])
+        for iev in good_list[1:]:
+            if not engines.run(
+                    'concatenate', merged_file,
+                    "UrQMDev_{}/UrQMD_results/particle_list.gz".format(iev)):
+                return (urqmd_success, results_folder)
+        for iev in range(n_urqmd):
             # remove UrQMD zipped results
             UrQMDev_folder = "UrQMDev_{}/UrQMD_results".format(iev)
-            shutil.rmtree(UrQMDev_folder)
+            if iev != good_list[0]:
+                shutil.rmtree(UrQMDev_folder, ignore_errors=True)
+            elif path.exists(oversample_analysis_state(iev)):
+                remove(oversample_analysis_state(iev))
         urqmd_success = True
-        shutil.move("UrQMDev_0/UrQMD_results/particle_list.gz", results_folder)
+        shutil.move(merged_file, results_folder)
 
     return (urqmd_success, results_folder)
 
 
 def run_spvn_analysis(urqmd_file_path, n_threads, final_results_folder,
-                      event_id):
-    """This function runs analysis"""
+                      event_id, analysis_backend="toolkit", engines=None):
+    """This function runs analysis and returns True if it succeeds
+
+       analysis_backend: "toolkit" runs hadronic_afterburner_tools.e,
+                         "numpy" runs the vectorized spvn_analysis.py, or
+                         only writes the results from the merged analysis
+                         state spvn_state_{event_id}.npz if it exists
+    """
+    state_file = path.join(final_results_folder,
+                           analysis_state_name(event_id))
     final_results_folder = path.join(final_results_folder,
                                      "spvn_results_{0:s}".format(event_id))
     if path.exists(final_results_folder):
@@ -280,23 +820,37 @@ def run_spvn_analysis(urqmd_file_path, n_threads, final_results_folder,
     if path.exists(spvn_folder):
         shutil.rmtree(spvn_folder)
     mkdir(spvn_folder)
-    call("ln -s {0:s} {1:s}".format(path.abspath(urqmd_file_path),
-                                    path.join(spvn_folder,
-                                              "particle_list.dat")),
-         shell=True)
+    if (analysis_backend != "numpy" and
+            particle_list_reader.is_indexed_particle_list(urqmd_file_path)):
+        # the toolkit only reads the zipped binary format
+        particle_list_reader.write_particle_list(
+            path.join(spvn_folder, "particle_list.dat"),
+            particle_list_reader.iterate_events(urqmd_file_path))
+    else:
+        link_file(urqmd_file_path, path.join(spvn_folder, "particle_list.dat"))
     # finally collect results
     curr_time = time.asctime()
     print("\U0001F3CD  [{}] Running spvn analysis ... ".format(curr_time),
           flush=True)
 
-    call("bash ./run_analysis_spvn.sh", shell=True)
+    if analysis_backend == "numpy" and path.isfile(state_file):
+        analysis_success = run_stage_executable('spvn', "merge", spvn_folder,
+                                                state_file, engines=engines)
+    elif analysis_backend == "numpy":
+        analysis_success = run_stage_executable(
+            'spvn', path.join(spvn_folder, "particle_list.dat"), spvn_folder,
+            "hadronic_afterburner_toolkit/parameters.dat", n_threads,
+            engines=engines)
+    else:
+        analysis_success = run_stage_executable('analysis', engines=engines)
 
     curr_time = time.asctime()
     print("\U0001F3CD  [{}] Finished spvn analysis ... ".format(curr_time),
           flush=True)
 
-    call("rm {}/particle_list.dat".format(spvn_folder), shell=True)
+    remove(path.join(spvn_folder, "particle_list.dat"))
     shutil.move(spvn_folder, final_results_folder)
+    return analysis_success
 
 
 def check_an_event_is_good(event_folder):
@@ -387,16 +941,28 @@ def zip_hydro_results_into_hdf5(final_results_folder, event_id):
         shutil.rmtree(hydro_h5_folder, ignore_errors=True)
 
 
-def zip_spvn_results_into_hdf5(final_results_folder, event_id, para_dict):
-    """This function combines all the spvn results into hdf5"""
+def zip_spvn_results_into_hdf5(final_results_folder, event_id, para_dict,
+                               initial_results_folder=None,
+                               initial_event_id=None):
+    """This function combines all the spvn results into hdf5. The initial
+       condition and pre-equilibrium outputs are taken from the event
+       initial_event_id in initial_results_folder (by default the event
+       itself). They are copied when the folder is shared between the
+       events of several design points.
+    """
     results_name = "spvn_results_{}".format(event_id)
     time_stamp = para_dict['time_stamp_str']
+    if initial_results_folder is None:
+        initial_results_folder = final_results_folder
+    if initial_event_id is None:
+        initial_event_id = event_id
     initial_state_filelist = [
-        'epsilon-u-Hydro-t0.1-{}.dat'.format(event_id),
-        'epsilon-u-Hydro-t{0}-{1}.dat'.format(time_stamp, event_id),
-        'NcollList{}.dat'.format(event_id), 'NpartList{}.dat'.format(event_id),
-        'NpartdNdy-t0.6-{}.dat'.format(event_id),
-        'NgluonEstimators{}.dat'.format(event_id)
+        'epsilon-u-Hydro-t0.1-{}.dat'.format(initial_event_id),
+        'epsilon-u-Hydro-t{0}-{1}.dat'.format(time_stamp, initial_event_id),
+        'NcollList{}.dat'.format(initial_event_id),
+        'NpartList{}.dat'.format(initial_event_id),
+        'NpartdNdy-t0.6-{}.dat'.format(initial_event_id),
+        'NgluonEstimators{}.dat'.format(initial_event_id)
     ]
     pre_equilibrium_filelist = [
         'ekt_tIn01_tOut08.music_init_flowNonLinear_pimunuTransverse.txt'
@@ -412,41 +978,53 @@ def zip_spvn_results_into_hdf5(final_results_folder, event_id, para_dict):
               flush=True)
 
         if para_dict['initial_condition'] == "self":
+            transfer_file = shutil.move
+            if initial_results_folder != final_results_folder:
+                transfer_file = shutil.copy
             # save initial conditions
             if ("IPGlasma" in para_dict['initial_type']
                     and para_dict['save_ipglasma']):
                 initial_folder = path.join(
-                    final_results_folder,
-                    "ipglasma_results_{}".format(event_id))
+                    initial_results_folder,
+                    "ipglasma_results_{}".format(initial_event_id))
                 for inifilename in initial_state_filelist:
                     inifile = path.join(initial_folder, inifilename)
                     if path.isfile(inifile):
-                        shutil.move(inifile, spvnfolder)
+                        transfer_file(inifile, spvnfolder)
 
             # save pre-equilibrium results
             if (para_dict['initial_type'] == "IPGlasma+KoMPoST"
                     and para_dict['save_kompost']):
-                preeq_folder = path.join(final_results_folder,
-                                         "kompost_results_{}".format(event_id))
+                preeq_folder = path.join(
+                    initial_results_folder,
+                    "kompost_results_{}".format(initial_event_id))
                 for prefilename in pre_equilibrium_filelist:
                     prefile = path.join(preeq_folder, prefilename)
                     if path.isfile(prefile):
-                        shutil.move(prefile, spvnfolder)
+                        transfer_file(prefile, spvnfolder)
 
         hf = h5py.File("{0}.h5".format(results_name), "w")
         gtemp = hf.create_group("{0}".format(results_name))
         file_list = glob(path.join(spvnfolder, "*"))
         for file_path in file_list:
             file_name = file_path.split("/")[-1]
-            dtemp = np.loadtxt(file_path)
+            if file_name in initial_state_filelist:
+                # the IPGlasma outputs can have N/A entries and a Q_s line
+                header_lines, dtemp = read_ipglasma_output(file_path)
+                dtemp = np.squeeze(dtemp)
+                header_text = ""
+                if header_lines:
+                    header_text = "#" + header_lines[0].lstrip("#") + "\n"
+            else:
+                dtemp = np.loadtxt(file_path)
+                # save header
+                ftemp = open(file_path, "r")
+                header_text = str(ftemp.readline())
+                ftemp.close()
             h5data = gtemp.create_dataset("{0}".format(file_name),
                                           data=dtemp,
                                           compression="gzip",
                                           compression_opts=9)
-            # save header
-            ftemp = open(file_path, "r")
-            header_text = str(ftemp.readline())
-            ftemp.close()
             if header_text.startswith("#"):
                 h5data.attrs.create("header", np.string_(header_text))
         hf.close()
@@ -484,176 +1062,1239 @@ def remove_unwanted_outputs(final_results_folder,
         shutil.rmtree(hydrofolder, ignore_errors=True)
 
     if not save_urqmd:
-        urqmd_results_name = "particle_list_{}.gz".format(event_id)
-        remove(path.join(final_results_folder, urqmd_results_name))
+        for urqmd_results_name in glob(
+                path.join(final_results_folder,
+                          "particle_list_{}.*".format(event_id))):
+            remove(urqmd_results_name)
+        state_file = path.join(final_results_folder,
+                               analysis_state_name(event_id))
+        if path.isfile(state_file):
+            remove(state_file)
+
+
+class PipelineEvent:
+    """This class holds the bookkeeping of one hydro event in the pipeline.
+       The events of the design points that share an initial condition
+       have the event id {event_id}_dp{design_point}.
+    """
+
+    def __init__(self, iev, para_dict, event_id=None, design_point=None):
+        self.iev = iev
+        self.event_id = str(iev)
+        if event_id is not None:
+            self.event_id = event_id
+        elif para_dict['initial_condition'] != "self":
+            initial_database_name = (
+                para_dict['initial_condition'].split("/")[-1].split(".h5")[0])
+            self.event_id = initial_database_name + "_" + self.event_id
+        self.design_point = design_point
+        if design_point is not None:
+            self.event_id += "_dp{}".format(design_point)
+        self.final_results_folder = "EVENT_RESULTS_{}".format(self.event_id)
+        self.initial_file = None
+        self.hydro_folder_name = None
+        self.urqmd_file_path = None
+        self.hydro_cache_key = None
+        self.afterburner_cache_inputs = None
+        self.stage_timing = {}
+        self.shared_event = None
+        self.status = False
+
+
+def open_result_cache(para_dict):
+    """This function returns the result cache of the job, or None"""
+    if para_dict.get('result_cache') is None:
+        return None
+    return result_cache.ResultCache(para_dict['result_cache'])
+
+
+def hydro_cache_inputs(engines=None):
+    """This function returns the effective inputs of the hydro run in the
+       event folder: the MUSIC parameters, the initial condition files in
+       MUSIC/initial, the EOS and table files that MUSIC reads, and the
+       MUSIC executable
+    """
+    if engines is None:
+        engines = default_stage_engines
+    inputs = {
+        'command': [arg.split("/")[-1]
+                    for arg in engines.registry['hydro']],
+        'music_input': result_cache.parameter_digest(
+            "MUSIC/music_input_mode_2"),
+        'initial': {},
+    }
+    for file_name in sorted(listdir("MUSIC/initial")):
+        file_path = path.join("MUSIC/initial", file_name)
+        if path.isfile(file_path):
+            inputs['initial'][file_name] = result_cache.file_digest(file_path)
+    for folder_name in ("EOS", "tables"):
+        folder_path = path.join("MUSIC", folder_name)
+        if path.isdir(folder_path):
+            inputs[folder_name] = result_cache.folder_digest(folder_path)
+    if path.isfile("MUSIC/MUSIChydro"):
+        inputs['executable'] = result_cache.file_digest("MUSIC/MUSIChydro")
+    return inputs
+
+
+def afterburner_cache_inputs(para_dict, event, engines=None):
+    """This function returns the effective inputs of the particle list of
+       the event: the hydro key (or the surface), the iSS and UrQMD inputs
+       and the random seed. It returns None if the seed is taken from the
+       clock, because the particle list can not be reproduced.
+    """
+    if engines is None:
+        engines = default_stage_engines
+    iss_parameters = "UrQMDev_0/iSS/iSS_parameters.dat"
+    if para_dict.get('shared_sampling', False):
+        iss_parameters = "iSS/iSS_parameters.dat"
+    seed = dict(result_cache.read_parameter_file(iss_parameters)).get(
+        'randomSeed', "-1")
+    if int(float(seed)) < 0:
+        return None
+    upstream = event.hydro_cache_key
+    if upstream is None:
+        hydro_folder = path.join(event.final_results_folder,
+                                 event.hydro_folder_name)
+        upstream = {
+            file_path.split("/")[-1]: result_cache.file_digest(file_path)
+            for file_path in sorted(glob(path.join(hydro_folder,
+                                                   "surface*.dat")))
+        }
+    inputs = {
+        'command': [arg.split("/")[-1]
+                    for arg in engines.registry['afterburner']],
+        'upstream': upstream,
+        'iss_parameters': result_cache.parameter_digest(iss_parameters),
+        'seed': seed,
+        'n_urqmd': para_dict['n_urqmd'],
+        'shared_sampling': para_dict.get('shared_sampling', False),
+        'particle_list_format': para_dict.get('particle_list_format', "gz"),
+        'files': {},
+    }
+    for file_path in ["run_afterburner.sh", "UrQMDev_0/urqmd/uqmd.burner",
+                      "UrQMDev_0/urqmd/runqmd.sh",
+                      "UrQMDev_0/urqmd/runqmd_nocoll.sh",
+                      "UrQMDev_0/iSS/iSS.e", "UrQMDev_0/urqmd/urqmd.e"]:
+        if path.isfile(file_path):
+            inputs['files'][file_path] = result_cache.file_digest(file_path)
+    return inputs
+
+
+def install_design_point(design_point_folder, n_urqmd):
+    """This function copies the parameter files of a design point, a folder
+       with the layout of model_parameters, into the event folder. The
+       files that the design point does not have are kept.
+    """
+    music_input = path.join(design_point_folder, "MUSIC/music_input_mode_2")
+    if path.isfile(music_input):
+        shutil.copy(music_input, "MUSIC/music_input_mode_2")
+    iss_parameters = path.join(design_point_folder, "iSS/iSS_parameters.dat")
+    if path.isfile(iss_parameters):
+        for iss_folder in glob("UrQMDev_*/iSS"):
+            shutil.copy(iss_parameters, iss_folder)
+        if path.isdir("iSS"):
+            # the shared iSS run samples the events of all the UrQMD runs
+            with open(iss_parameters, "r") as f:
+                parameter_lines = f.readlines()
+            with open("iSS/iSS_parameters.dat", "w") as f:
+                for line in parameter_lines:
+                    key_value = line.split("=")
+                    if key_value[0].strip() == 'number_of_repeated_sampling':
+                        line = "number_of_repeated_sampling = {}\n".format(
+                            int(key_value[1])*n_urqmd)
+                    f.write(line)
+    analysis_parameters = path.join(
+        design_point_folder, "hadronic_afterburner_toolkit/parameters.dat")
+    if path.isfile(analysis_parameters):
+        for parameter_file in glob(
+                "hadronic_afterburner_toolkit/parameters.dat") + glob(
+                    "UrQMDev_*/hadronic_afterburner_toolkit/parameters.dat"):
+            shutil.copy(analysis_parameters, parameter_file)
+
+
+def particle_list_name(event_id, particle_list_format="gz"):
+    """This function returns the name of the merged particle list"""
+    return "particle_list_{}.{}".format(event_id, particle_list_format)
+
+
+class Stage:
+    """Base class of a stage in the hydro + hadronic cascade pipeline
+
+       Each stage works in the current event folder and returns True
+       if the event can proceed to the next stage. The stages in the
+       "afterburner" phase only use the UrQMDev_* and analysis folders, so
+       they can overlap with the "hydro" phase of the next event. With
+       several design points, the shared stages run once per initial
+       condition and the others once per design point.
+    """
+    name = "stage"
+    phase = "hydro"
+    shared = False
 
+    def __init__(self, para_dict, engines=None):
+        self.para_dict = para_dict
+        self.engines = engines
 
-def main(para_dict_):
-    """This is the main function"""
-    initial_condition = para_dict_['initial_condition']
-    initial_type = para_dict_['initial_type']
-    num_threads = para_dict_['num_threads']
-    n_urqmd = para_dict_['n_urqmd']
-    curr_time = time.asctime()
-    print("\U0001F3CE  [{}] Number of threads: {}".format(
-        curr_time, num_threads),
-          flush=True)
+    def enabled(self, event):
+        """Returns whether this stage runs for the given event"""
+        return True
 
-    idx0 = para_dict_['hydro_id0']
-    nev = para_dict_['n_hydro']
-    for iev in range(idx0, idx0 + nev):
-        curr_time = time.asctime()
+    def run(self, event):
+        """Runs the stage for the given event"""
+        raise NotImplementedError
 
-        event_id = str(iev)
-        if para_dict_['initial_condition'] != "self":
-            initial_database_name = (
-                    initial_condition.split("/")[-1].split(".h5")[0])
-            event_id = initial_database_name + "_" + event_id
-
-        final_results_folder = "EVENT_RESULTS_{}".format(event_id)
-        if path.exists(final_results_folder):
-            print("{} exists ...".format(final_results_folder), flush=True)
-            results_file = path.join(final_results_folder,
-                                     "spvn_results_{}.h5".format(event_id))
-            status = False
-            if path.exists(results_file):
-                status = True
-                spvnfolder = path.join(final_results_folder,
-                                       "spvn_results_{}".format(event_id))
-                if path.exists(spvnfolder):
-                    status = check_an_event_is_good(spvnfolder)
-            if status:
-                print(
-                    "{} finished properly. No need to rerun.".format(event_id),
-                    flush=True)
-                continue
-            print("Rerun {} ...".format(final_results_folder), flush=True)
+
+class InitialConditionStage(Stage):
+    """Generates or fetches the initial condition. With the centrality
+       pre-selection, the initial conditions outside the estimator window
+       are re-sampled (self-generated events) or discarded before hydro.
+    """
+    name = "initial_condition"
+    shared = True
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        self.ic_filter = None
+        if para_dict.get('ic_preselection') is not None:
+            estimator, window_min, window_max = para_dict['ic_preselection']
+            initial_type = para_dict['initial_type']
+            initial_condition_filter.check_estimator(initial_type, estimator)
+            if ("IPGlasma" in initial_type
+                    and para_dict['initial_condition'] != "self"):
+                raise ValueError(
+                    "the pre-selection of pre-generated IPGlasma events "
+                    "is not supported")
+            self.ic_filter = initial_condition_filter.InitialConditionFilter(
+                estimator, window_min, window_max)
+        self.database_slot = nullcontext
+        if (para_dict.get('startup_throttle') is not None
+                and 'database' in para_dict.get('throttled_stages',
+                                                default_throttled_stages)):
+            self.database_slot = startup_throttle.StartupThrottle(
+                *para_dict['startup_throttle']).slot
+        self.ic_cache = None
+        if (para_dict.get('ic_cache') is not None
+                and para_dict['initial_condition'] != "self"):
+            cache_folder, size_gb = para_dict['ic_cache']
+            self.ic_cache = ic_cache.InitialConditionCache(cache_folder,
+                                                           float(size_gb))
+
+    def cached_database(self, event):
+        """Returns the node-local copy of the event if it is in the cache
+           already, or None
+        """
+        if self.ic_cache is None:
+            return None
+        try:
+            return self.ic_cache.cached_event(
+                self.para_dict['initial_condition'], event.iev)
+        except OSError:
+            return None
+
+    def database(self, event):
+        """Returns the database to fetch the event from, the node-local
+           copy of the event when the cache is on
+        """
+        database = self.para_dict['initial_condition']
+        if self.ic_cache is None or not h5py.is_hdf5(database):
+            return database
+        try:
+            return self.ic_cache.event_database(database, event.iev)
+        except (KeyError, OSError) as err:
+            print("\U000026A0  cache failed ({}), reading {}".format(
+                err, database), flush=True)
+            return database
+
+    def run(self, event):
+        initial_condition = self.para_dict['initial_condition']
+        initial_type = self.para_dict['initial_type']
+        n_attempts = 1
+        if self.ic_filter is not None and initial_condition == "self":
+            n_attempts = max(1, self.para_dict.get('ic_preselection_attempts',
+                                                   1))
+        seed_add = self.para_dict['seed_add']
+        for iattempt in range(n_attempts):
+            curr_time = time.asctime()
+            print("[{}] Generate initial condition ... ".format(curr_time),
+                  flush=True)
+            if iattempt > 0:
+                # the 3D MC-Glauber seed of event 0 does not depend on iev
+                seed_add = (self.para_dict['seed_add']
+                            + self.retry_seed(event, iattempt))
+            database = initial_condition
+            startup_slot = nullcontext()
+            if initial_condition != "self":
+                # a cache hit is read from the local disk, only the reads
+                # of the shared database take a slot
+                database = self.cached_database(event)
+                if database is None:
+                    startup_slot = self.database_slot()
+            with startup_slot:
+                if database is None:
+                    database = self.database(event)
+                event.initial_file = get_initial_condition(
+                    database, initial_type, event.iev, seed_add,
+                    event.final_results_folder,
+                    self.para_dict['time_stamp_str'],
+                    self.glauber_batch_size(), self.para_dict.get('ic_seed'),
+                    self.engines,
+                    keep_database_open=(database == initial_condition))
+            if event.initial_file is None:
+                print("\U000026D4  initial condition {} failed, "
+                      "skipped.".format(event.event_id),
+                      flush=True)
+                return False
+            if self.ic_filter is None or self.preselect(event, iattempt):
+                break
+            if iattempt < n_attempts - 1:
+                self.discard_initial_condition(event, iattempt + 1)
         else:
-            mkdir(final_results_folder)
-        print("[{}] Generate initial condition ... ".format(curr_time),
-              flush=True)
+            print("\U000026D4  no initial condition with {} after {} "
+                  "attempts, {} skipped.".format(self.ic_filter, n_attempts,
+                                                 event.event_id),
+                  flush=True)
+            return False
 
-        ifile = get_initial_condition(initial_condition, initial_type,
-                                      iev,
-                                      para_dict_['seed_add'],
-                                      final_results_folder,
-                                      para_dict_['time_stamp_str'])
-
-        if initial_type == "3DMCGlauber_consttau":
-            filename = ifile.split("/")[-1]
-            filepath = initial_condition
-            shutil.copy(path.join(filepath, filename),
-                        "MUSIC/initial/initial_TA.dat")
-            shutil.copy(path.join(filepath, re.sub("TA", "TB", filename)),
-                        "MUSIC/initial/initial_TB.dat")
-
-        if initial_type == "IPGlasma+KoMPoST":
-            kompost_success, kompost_folder_name = run_kompost(
-                final_results_folder, event_id)
-            hydro_initial_file = "MUSIC/initial/epsilon-u-Hydro.dat"
-            if path.islink(hydro_initial_file):
-                remove(hydro_initial_file)
-            call("ln -s {0:s} {1:s}".format(
-                path.join(path.abspath(final_results_folder),
-                          kompost_folder_name,
-                          ("ekt_tIn01_tOut08"
-                           + ".music_init_flowNonLinear_pimunuTransverse.txt")),
-                hydro_initial_file),
-                 shell=True)
-
-        # first run hydro
-        hydro_success, hydro_folder_name = run_hydro_event(
-            final_results_folder, event_id)
+        if ("IPGlasma" in initial_type and initial_condition == "self"
+                and self.para_dict['save_ipglasma']):
+            self.ingest_ipglasma_event(event)
+        return True
+
+    def glauber_batch_size(self):
+        """Returns the number of 3D MC-Glauber events generated in one
+           run, by default the number of hydro events of the job
+        """
+        batch_size = self.para_dict.get('glauber_batch_size', 0)
+        if batch_size > 0:
+            return batch_size
+        return max(1, self.para_dict['n_hydro'])
+
+    def ingest_ipglasma_event(self, event):
+        """Appends the IPGlasma outputs of the event to the per-job
+           IPGlasma database
+        """
+        with h5py.File(ipglasma_database_file, "a") as h5_f:
+            ingest_ipglasma_event(
+                path.join(event.final_results_folder,
+                          "ipglasma_results_{}".format(event.iev)),
+                event.iev, h5_f)
+
+    def estimators(self, event):
+        """Returns the centrality estimators of the initial condition"""
+        if self.para_dict['initial_type'] == "3DMCGlauber_dynamical":
+            return initial_condition_filter.glauber_estimators(
+                event.initial_file)
+        return initial_condition_filter.ipglasma_estimators(
+            path.join(event.final_results_folder,
+                      "ipglasma_results_{}".format(event.iev)), event.iev)
+
+    def preselect(self, event, iattempt):
+        """Returns whether the initial condition is in the window"""
+        estimators = self.estimators(event)
+        value = self.ic_filter.value(estimators)
+        accepted = self.ic_filter.accept(estimators)
+        print("\U0001F3AF  attempt {}: {} = {}, {}".format(
+            iattempt + 1, self.ic_filter.estimator, value,
+            "accepted" if accepted else "rejected"),
+              flush=True)
+        return accepted
+
+    def retry_seed(self, event, iattempt):
+        """Returns the random seed of the pre-selection attempt iattempt.
+           With ic_seed, it only depends on ic_seed, the event and the
+           attempt, so that all the design points of a campaign select the
+           same initial conditions.
+        """
+        ic_seed = self.para_dict.get('ic_seed')
+        if ic_seed is None:
+            return int(np.random.default_rng().integers(1, 1e8))
+        return int(np.random.default_rng(
+            [abs(ic_seed), event.iev, iattempt]).integers(1, 1e8))
+
+    def discard_initial_condition(self, event, iattempt):
+        """Removes the rejected initial condition, so that a new one is
+           sampled with the random seed of the next attempt iattempt
+        """
+        if self.para_dict['initial_type'] == "3DMCGlauber_dynamical":
+            remove(event.initial_file)
+            return
+        shutil.rmtree(path.join(event.final_results_folder,
+                                "ipglasma_results_{}".format(event.iev)),
+                      ignore_errors=True)
+        initial_condition_filter.reseed_input_file(
+            "ipglasma/input", self.retry_seed(event, iattempt))
+
+
+class PreEquilibriumStage(Stage):
+    """Runs the KoMPoST pre-equilibrium evolution"""
+    name = "pre_equilibrium"
+    shared = True
+
+    def enabled(self, event):
+        return self.para_dict['initial_type'] == "IPGlasma+KoMPoST"
+
+    def run(self, event):
+        kompost_success, kompost_folder_name = run_kompost(
+            event.final_results_folder, event.event_id, self.engines)
+        if not kompost_success:
+            print("\U000026D4  {} did not finsh properly, skipped.".format(
+                kompost_folder_name),
+                  flush=True)
+            return False
+        link_file(
+            path.join(event.final_results_folder, kompost_folder_name,
+                      ("ekt_tIn01_tOut08"
+                       + ".music_init_flowNonLinear_pimunuTransverse.txt")),
+            "MUSIC/initial/epsilon-u-Hydro.dat")
+        return True
+
+
+class HydroStage(Stage):
+    """Runs MUSIC and packs the hydro evolution results. With the result
+       cache, the MUSIC outputs of an earlier run with the same inputs are
+       reused.
+    """
+    name = "hydro"
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        self.result_cache = open_result_cache(para_dict)
+
+    def run(self, event):
+        inputs = None
+        if self.result_cache is not None:
+            inputs = hydro_cache_inputs(self.engines)
+            event.hydro_cache_key = result_cache.input_key(inputs)
+            results_folder = path.join(
+                event.final_results_folder,
+                "hydro_results_{}".format(event.event_id))
+            if (not path.exists(results_folder)
+                    and self.result_cache.fetch(
+                        'hydro', event.hydro_cache_key, results_folder)):
+                inputs = None
+        hydro_success, event.hydro_folder_name = run_hydro_event(
+            event.final_results_folder, event.event_id, self.engines)
 
         if not hydro_success:
             # if hydro didn't finish properly, just skip this event
             print("\U000026D4  {} did not finsh properly, skipped.".format(
-                hydro_folder_name),
+                event.hydro_folder_name),
                   flush=True)
-            continue
+            return False
 
-        if (initial_type == "3DMCGlauber_dynamical"
-                and initial_condition == "self"):
-            # save the initial condition
-            shutil.move(
+        if inputs is not None:
+            self.result_cache.store(
+                'hydro', event.hydro_cache_key,
+                path.join(event.final_results_folder,
+                          event.hydro_folder_name), inputs)
+
+        if (self.para_dict['initial_type'] == "3DMCGlauber_dynamical"
+                and self.para_dict['initial_condition'] == "self"):
+            # save the initial condition, the other design points still
+            # need it
+            save_file = shutil.move
+            if self.para_dict.get('design_points'):
+                save_file = shutil.copy
+            save_file(
                 "MUSIC/initial/strings.dat",
-                path.join(final_results_folder, hydro_folder_name,
-                          "strings_{}.dat".format(event_id)))
+                path.join(event.final_results_folder, event.hydro_folder_name,
+                          "strings_{}.dat".format(event.event_id)))
 
-        zip_hydro_results_into_hdf5(final_results_folder, event_id)
-        
-        # if hydro finishes properly, we continue to do hadronic transport
-        prepare_surface_files_for_urqmd(final_results_folder, hydro_folder_name,
-                                        n_urqmd)
+        zip_hydro_results_into_hdf5(event.final_results_folder,
+                                    event.event_id)
+        return True
+
+
+class ArchivedHydroStage(Stage):
+    """Fetches the hydro surface of the event from a surface archive"""
+    name = "hydro"
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        self.archive_path = para_dict['hydro_archive']
+        self.event_dict = hydro_surface_archive.list_archived_surfaces(
+            self.archive_path)
+
+    def run(self, event):
+        if event.event_id not in self.event_dict:
+            print("\U000026D4  No archived surface for {}, skipped.".format(
+                event.event_id),
+                  flush=True)
+            return False
+        event.hydro_folder_name = "hydro_results_{}".format(event.event_id)
+        print("\U0001F4E6  Reuse the hydro surface of {} from {} ...".format(
+            event.event_id, self.archive_path),
+              flush=True)
+        hydro_surface_archive.fetch_archived_surface(
+            self.archive_path, self.event_dict[event.event_id],
+            path.join(event.final_results_folder, event.hydro_folder_name))
+        return True
 
-        # then run UrQMD events in parallel
-        urqmd_success, urqmd_file_path = run_urqmd_shell(
-            n_urqmd, final_results_folder, event_id)
+
+class SamplerStage(Stage):
+    """Distributes the hydro surface to the particle samplers, or samples
+       all the oversampled events at once in the shared sampling mode. With
+       the result cache, the particle list of an earlier run with the same
+       inputs is fetched and the sampling is skipped.
+    """
+    name = "sampler"
+    phase = "afterburner"
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        self.result_cache = open_result_cache(para_dict)
+
+    def run(self, event):
+        if self.result_cache is not None:
+            event.afterburner_cache_inputs = afterburner_cache_inputs(
+                self.para_dict, event, self.engines)
+            if event.afterburner_cache_inputs is not None:
+                particle_list = path.join(
+                    event.final_results_folder,
+                    particle_list_name(
+                        event.event_id,
+                        self.para_dict.get('particle_list_format', "gz")))
+                if (path.exists(particle_list)
+                        or self.result_cache.fetch(
+                            'afterburner',
+                            result_cache.input_key(
+                                event.afterburner_cache_inputs),
+                            particle_list)):
+                    return True
+        if self.para_dict.get('shared_sampling', False):
+            return run_shared_sampling(event.final_results_folder,
+                                       event.hydro_folder_name,
+                                       self.para_dict['n_urqmd'],
+                                       self.engines)
+        prepare_surface_files_for_urqmd(event.final_results_folder,
+                                        event.hydro_folder_name,
+                                        self.para_dict['n_urqmd'])
+        return True
+
+
+class AfterburnerStage(Stage):
+    """Runs the oversampled iSS + UrQMD events in parallel"""
+    name = "afterburner"
+    phase = "afterburner"
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        self.result_cache = open_result_cache(para_dict)
+
+    def run(self, event):
+        urqmd_success, event.urqmd_file_path = run_urqmd_shell(
+            self.para_dict['n_urqmd'], event.final_results_folder,
+            event.event_id,
+            self.para_dict.get('analysis_backend') == "numpy",
+            self.para_dict.get('particle_list_format', "gz"), self.engines)
         if not urqmd_success:
             print("\U000026D4  {} did not finsh properly, skipped.".format(
-                urqmd_file_path),
+                event.urqmd_file_path),
                   flush=True)
-            continue
+        elif (self.result_cache is not None
+                and event.afterburner_cache_inputs is not None
+                and not path.isfile(event.urqmd_file_path + ".appended")):
+            # a list with the appended earlier events is not cached
+            self.result_cache.store(
+                'afterburner',
+                result_cache.input_key(event.afterburner_cache_inputs),
+                event.urqmd_file_path, event.afterburner_cache_inputs)
+        return urqmd_success
+
+
+class ParticleListMergeStage(Stage):
+    """Appends the new oversampled events to the particle list of an
+       earlier run of the same hydro event. The merged particle list and
+       analysis state are written next to the new ones, and they replace
+       them after the marker file {particle list}.appended is written, so
+       a rerun does not append the earlier events twice.
+    """
+    name = "merge"
+    phase = "afterburner"
 
-        # finally collect results
-        run_spvn_analysis(urqmd_file_path, num_threads, final_results_folder,
-                          event_id)
+    def enabled(self, event):
+        return self.para_dict.get('append_results') is not None
 
-        # zip results into a hdf5 database
-        status = zip_spvn_results_into_hdf5(final_results_folder, event_id,
-                                       para_dict_)
+    def run(self, event):
+        marker_file = event.urqmd_file_path + ".appended"
+        if path.isfile(marker_file):
+            print("\U0001F517  {} already has the earlier events.".format(
+                event.urqmd_file_path),
+                  flush=True)
+            self.commit_merge(event)
+            return True
+        # the earlier particle list can be in either format
+        existing_list = glob(
+            path.join(self.para_dict['append_results'], "**",
+                      "particle_list_{}.[gh][z5]".format(event.event_id)),
+            recursive=True)
+        if not existing_list:
+            return True
+        print("\U0001F517  Append the new UrQMD events to {} ...".format(
+            existing_list[0]),
+              flush=True)
+        merged_file = event.urqmd_file_path + ".merged"
+        existing_indexed = particle_list_reader.is_indexed_particle_list(
+            existing_list[0])
+        if particle_list_reader.is_indexed_particle_list(
+                event.urqmd_file_path):
+            if existing_indexed:
+                shutil.copy(existing_list[0], merged_file)
+            else:
+                particle_list_reader.convert_to_indexed(
+                    existing_list[0], merged_file)
+            particle_list_reader.write_indexed_particle_list(
+                merged_file,
+                particle_list_reader.iterate_events(event.urqmd_file_path),
+                mode="a")
+        else:
+            if existing_indexed:
+                particle_list_reader.write_particle_list(
+                    merged_file,
+                    particle_list_reader.iterate_events(existing_list[0]))
+            else:
+                shutil.copy(existing_list[0], merged_file)
+            if not run_stage_executable('concatenate', merged_file,
+                                        event.urqmd_file_path,
+                                        engines=self.engines):
+                remove(merged_file)
+                return False
+        state_file = path.join(event.final_results_folder,
+                               analysis_state_name(event.event_id))
+        if path.isfile(state_file):
+            self.merge_analysis_state(event, existing_list[0], state_file,
+                                      state_file + ".merged.npz")
+        with open(marker_file, "w") as f:
+            f.write("{}\n".format(existing_list[0]))
+        self.commit_merge(event)
+        return True
+
+    def commit_merge(self, event):
+        """Replaces the new particle list and analysis state with the
+           merged ones
+        """
+        merged_file = event.urqmd_file_path + ".merged"
+        if path.isfile(merged_file):
+            shutil.move(merged_file, event.urqmd_file_path)
+        state_file = path.join(event.final_results_folder,
+                               analysis_state_name(event.event_id))
+        if path.isfile(state_file + ".merged.npz"):
+            shutil.move(state_file + ".merged.npz", state_file)
+
+    def merge_analysis_state(self, event, existing_file, state_file,
+                             merged_state_file):
+        """Adds the analysis state of the earlier particle list to the
+           state of the new events and saves it in merged_state_file. The
+           earlier state is read from spvn_state_{event_id}.npz next to the
+           earlier particle list, or accumulated from the list if it is not
+           there.
+        """
+        existing_state = path.join(path.dirname(existing_file),
+                                   analysis_state_name(event.event_id))
+        if not path.isfile(existing_state):
+            existing_state = state_file + ".existing.npz"
+            if not run_stage_executable(
+                    'spvn', "accumulate", existing_file, existing_state,
+                    "hadronic_afterburner_toolkit/parameters.dat",
+                    engines=self.engines):
+                remove(state_file)
+                return
+        try:
+            analysis = spvn_analysis.SpvnAnalysis.load_state(state_file)
+            analysis.merge(
+                spvn_analysis.SpvnAnalysis.load_state(existing_state))
+            analysis.save_state(merged_state_file)
+        except ValueError as error:
+            print("\U000026A0  {}, reanalyze the merged list".format(error),
+                  flush=True)
+            remove(state_file)
+        if existing_state == state_file + ".existing.npz":
+            remove(existing_state)
+
+
+class AnalysisStage(Stage):
+    """Runs the spvn analysis on the UrQMD particle list"""
+    name = "analysis"
+    phase = "afterburner"
+
+    def __init__(self, para_dict, engines=None):
+        super().__init__(para_dict, engines)
+        if (para_dict.get('analysis_backend', "toolkit") == "numpy"
+                and spvn_analysis.read_parameters(
+                    "hadronic_afterburner_toolkit/parameters.dat").get(
+                        'analyze_HBT', 0) == 1):
+            raise ValueError("the numpy analysis backend does not do the "
+                             "HBT analysis, run analyze_HBT = 1 with the "
+                             "toolkit backend")
+
+    def run(self, event):
+        return run_spvn_analysis(
+            event.urqmd_file_path, self.para_dict['num_threads'],
+            event.final_results_folder, event.event_id,
+            self.para_dict.get('analysis_backend', "toolkit"), self.engines)
+
+
+class PackerStage(Stage):
+    """Packs the final results into hdf5 and removes unwanted outputs"""
+    name = "packer"
+    phase = "afterburner"
+
+    def run(self, event):
+        # the initial condition of a design point is in the shared event
+        initial_event = event.shared_event or event
+        status = zip_spvn_results_into_hdf5(
+            event.final_results_folder, event.event_id, self.para_dict,
+            initial_event.final_results_folder, initial_event.event_id)
 
         # remove the unwanted outputs if event is finished properly
         if status:
-            remove_unwanted_outputs(final_results_folder, event_id,
-                                    para_dict_['save_ipglasma'],
-                                    para_dict_['save_kompost'],
-                                    para_dict_['save_hydro'],
-                                    para_dict_['save_urqmd'])
-
+            remove_unwanted_outputs(event.final_results_folder,
+                                    event.event_id,
+                                    self.para_dict['save_ipglasma'],
+                                    self.para_dict['save_kompost'],
+                                    self.para_dict['save_hydro'],
+                                    self.para_dict['save_urqmd'])
+        return status
+
+
+default_stage_list = [
+    InitialConditionStage, PreEquilibriumStage, HydroStage, SamplerStage,
+    AfterburnerStage, AnalysisStage, PackerStage
+]
+
+# stages of the afterburner-only runs over archived hydro surfaces
+afterburner_stage_list = [
+    ArchivedHydroStage, SamplerStage, AfterburnerStage, ParticleListMergeStage,
+    AnalysisStage, PackerStage
+]
+
+
+class Pipeline:
+    """This class runs the full simulation chain in an event folder
+
+       The para_dict has the same keys as the one assembled by the command
+       line interface. The stages are run in order for every hydro event
+       and an event is skipped as soon as one stage fails. The stage
+       executables are launched through the StageEngines of the pipeline,
+       by default a fresh copy of the module defaults.
+    """
 
-if __name__ == "__main__":
-    try:
-        INITIAL_CONDITION_TYPE = str(sys.argv[1])
-        INITIAL_CONDITION_DATABASE = str(sys.argv[2])
-        N_HYDRO_EVENTS = int(sys.argv[3])
-        HYDRO_EVENT_ID0 = int(sys.argv[4])
-        N_URQMD = int(sys.argv[5])
-        N_THREADS = int(sys.argv[6])
-        SAVE_IPGLASMA = (sys.argv[7].lower() == "true")
-        SAVE_KOMPOST = (sys.argv[8].lower() == "true")
-        SAVE_HYDRO = (sys.argv[9].lower() == "true")
-        SAVE_URQMD = (sys.argv[10].lower() == "true")
-        SEED_ADD = int(sys.argv[11])
-        TIME_STAMP = str(sys.argv[12])
-    except IndexError:
-        print_usage()
-        exit(0)
-
-    known_initial_types = [
-        "IPGlasma", "IPGlasma+KoMPoST", "3DMCGlauber_dynamical",
-        "3DMCGlauber_consttau"
-    ]
-    if INITIAL_CONDITION_TYPE not in known_initial_types:
-        print("\U0001F6AB  "
-              + "Do not recognize the initial condition type: {}".format(
-                  INITIAL_CONDITION_TYPE),
+    def __init__(self, para_dict, stage_list=None, engines=None):
+        self.para_dict = para_dict
+        self.engines = engines
+        if self.engines is None:
+            self.engines = StageEngines()
+        if para_dict.get('stage_engine', "real") == "fake":
+            self.engines.use_fake()
+        for stage_name, timeout in para_dict.get('stage_timeout', {}).items():
+            self.engines.configure(stage_name, timeout=timeout)
+        for stage_name in ('ipglasma', 'kompost', 'hydro', 'analysis'):
+            self.engines.configure(stage_name,
+                                   n_threads=para_dict['num_threads'])
+        if para_dict.get('startup_throttle') is not None:
+            throttle = startup_throttle.StartupThrottle(
+                *para_dict['startup_throttle'])
+            for stage_name in para_dict.get('throttled_stages',
+                                            default_throttled_stages):
+                if stage_name in self.engines.registry:
+                    self.engines.configure(
+                        stage_name, throttle=throttle,
+                        startup_ready=startup_ready_files.get(stage_name))
+        self.overlap = False
+        if para_dict.get('core_budget', 0) > 0:
+            self.split_cores()
+        policy = para_dict.get('cpu_placement', "none")
+        if policy != "none":
+            self.place_stage_processes(policy)
+        self.archived_event_ids = None
+        if para_dict.get('hydro_archive') is not None:
+            self.archived_event_ids = hydro_surface_archive.sorted_event_ids(
+                hydro_surface_archive.list_archived_surfaces(
+                    para_dict['hydro_archive']))
+            if stage_list is None:
+                stage_list = afterburner_stage_list
+        if stage_list is None:
+            stage_list = default_stage_list
+        self.stages = [stage_i(para_dict, self.engines)
+                       for stage_i in stage_list]
+        self.design_points = para_dict.get('design_points') or []
+        if self.design_points and self.archived_event_ids is not None:
+            raise ValueError("the design points can not be run over "
+                             "archived hydro surfaces")
+
+    def split_cores(self):
+        """Chooses the thread counts of the OpenMP stages and the number of
+           concurrent UrQMD workers from the scaling calibration
+        """
+        calibration_file = self.para_dict.get('stage_calibration')
+        plan = stage_scaling.plan_core_split(self.para_dict['core_budget'],
+                                             self.para_dict['n_urqmd'],
+                                             calibration_file)
+        for stage_name in stage_scaling.openmp_stage_list:
+            self.engines.configure(stage_name, n_threads=plan[stage_name],
+                                   calibration_file=calibration_file)
+        self.engines.configure('afterburner',
+                               n_workers=plan['urqmd_workers'])
+        self.overlap = plan['overlap']
+        print("\U0001F9EE  Core split for {} cores: ".format(
+            self.para_dict['core_budget'])
+              + "IPGlasma {}, KoMPoST {}, MUSIC {} threads, ".format(
+                  plan['ipglasma'], plan['kompost'], plan['hydro'])
+              + "{} UrQMD workers, overlap afterburner with hydro: {}".format(
+                  plan['urqmd_workers'], plan['overlap']),
               flush=True)
-        exit(1)
+        if plan['explored']:
+            print("\U0001F9EE  Exploring the scaling of {}".format(
+                ", ".join(plan['explored'])), flush=True)
+
+    def place_stage_processes(self, policy):
+        """Pins the OpenMP stages and the UrQMD workers to explicit cores"""
+        topology = cpu_placement.detect_cpu_topology()
+        n_hydro_threads = self.engines.settings['hydro']['n_threads']
+        plan = cpu_placement.plan_placement(n_hydro_threads,
+                                            self.para_dict['n_urqmd'],
+                                            topology, policy,
+                                            disjoint=self.overlap)
+        omp_env = cpu_placement.openmp_environment(plan['hydro'])
+        for stage_name in ('ipglasma', 'kompost', 'hydro'):
+            self.engines.configure(stage_name, cpu_list=plan['hydro'],
+                                   env=omp_env)
+        self.engines.configure('afterburner',
+                               worker_cpu_lists=plan['urqmd'])
+        print("\U0001F9ED  CPU placement ({}):".format(policy), flush=True)
+        for line in cpu_placement.format_placement(plan, topology):
+            print("\U0001F9ED    " + line, flush=True)
+
+    @classmethod
+    def from_parameter_dicts(cls, parameter_dict, n_hydro=1, hydro_id0=0,
+                             n_urqmd=1, num_threads=1, seed_add=0,
+                             stage_list=None):
+        """Creates a pipeline from the parameter dictionaries
+
+           parameter_dict is a module (or any object) carrying control_dict,
+           ipglasma_dict, mcglauber_dict, kompost_dict and music_dict as in
+           config/parameters_dict_master.py or a user parameter file.
+        """
+        return cls(driver_parameters_from_dicts(parameter_dict, n_hydro,
+                                                hydro_id0, n_urqmd,
+                                                num_threads, seed_add),
+                   stage_list)
+
+    def event_finished(self, event):
+        """Checks whether the event has been finished by a previous run"""
+        if not path.exists(event.final_results_folder):
+            return False
+        print("{} exists ...".format(event.final_results_folder), flush=True)
+        results_file = path.join(event.final_results_folder,
+                                 "spvn_results_{}.h5".format(event.event_id))
+        status = False
+        if path.exists(results_file):
+            status = True
+            spvnfolder = path.join(event.final_results_folder,
+                                   "spvn_results_{}".format(event.event_id))
+            if path.exists(spvnfolder):
+                status = check_an_event_is_good(spvnfolder)
+        return status
+
+    def prepare_event(self, iev, design_point=None):
+        """Sets up the results folder of one hydro event. It returns the
+           event and whether the stages still need to run.
+        """
+        event_id = None
+        if self.archived_event_ids is not None:
+            event_id = self.archived_event_ids[iev]
+        event = PipelineEvent(iev, self.para_dict, event_id, design_point)
+        if self.event_finished(event):
+            print("{} finished properly. No need to rerun.".format(
+                event.event_id),
+                  flush=True)
+            event.status = True
+            return (event, False)
+        if path.exists(event.final_results_folder):
+            print("Rerun {} ...".format(event.final_results_folder),
+                  flush=True)
+        else:
+            mkdir(event.final_results_folder)
+        return (event, True)
+
+    def run_stages(self, event, phase_list=("hydro", "afterburner"),
+                   shared=None):
+        """Runs the stages in the given phases and returns True if all of
+           them succeed. With shared = True (False), only the stages that
+           are (are not) shared between the design points run.
+        """
+        for stage_i in self.stages:
+            if stage_i.phase not in phase_list or not stage_i.enabled(event):
+                continue
+            if shared is not None and stage_i.shared != shared:
+                continue
+            time_start = time.time()
+            stage_status = stage_i.run(event)
+            event.stage_timing[stage_i.name] = time.time() - time_start
+            if not stage_status:
+                return False
+        return True
+
+    def run_event(self, iev):
+        """Runs all the stages for one hydro event and returns the event"""
+        event, need_run = self.prepare_event(iev)
+        if need_run:
+            event.status = self.run_stages(event)
+        return event
+
+    def run_design_points(self, iev):
+        """Runs the shared stages (initial condition, pre-equilibrium) once
+           and the other stages for every design point. It returns the
+           events of the design points.
+        """
+        point_list = [self.prepare_event(iev, ipoint)
+                      for ipoint in range(len(self.design_points))]
+        if not any([need_run for _, need_run in point_list]):
+            return [point_event for point_event, _ in point_list]
+        event, _ = self.prepare_event(iev)
+        shared_status = self.run_stages(event, shared=True)
+        n_run = sum([need_run for _, need_run in point_list])
+        for (point_event, need_run), design_point_folder in zip(
+                point_list, self.design_points):
+            if not need_run:
+                continue
+            # the shared stages are amortized over the design points
+            for stage_name, elapsed in event.stage_timing.items():
+                point_event.stage_timing[stage_name] = elapsed/n_run
+            if not shared_status:
+                continue
+            print("\U0001F3AF  Design point {} from {} ...".format(
+                point_event.design_point, design_point_folder), flush=True)
+            install_design_point(design_point_folder,
+                                 self.para_dict['n_urqmd'])
+            point_event.initial_file = event.initial_file
+            point_event.shared_event = event
+            point_event.status = self.run_stages(point_event, shared=False)
+        # the folder of the shared event only has the initial condition
+        # and the pre-equilibrium outputs
+        if not (self.para_dict['save_ipglasma']
+                or self.para_dict['save_kompost']):
+            shutil.rmtree(event.final_results_folder, ignore_errors=True)
+        return [point_event for point_event, _ in point_list]
+
+    def run(self):
+        """Runs all the hydro events assigned to this job"""
+        curr_time = time.asctime()
+        print("\U0001F3CE  [{}] Number of threads: {}".format(
+            curr_time, self.para_dict['num_threads']),
+              flush=True)
+
+        idx0 = self.para_dict['hydro_id0']
+        nev = self.para_dict['n_hydro']
+        if self.archived_event_ids is not None:
+            nev = max(0, min(nev, len(self.archived_event_ids) - idx0))
+        if self.design_points:
+            # the events of design point k have the event ids *_dp{k}
+            with open("design_points.dat", "w") as f:
+                for ipoint, design_point_folder in enumerate(
+                        self.design_points):
+                    f.write("{}  {}\n".format(ipoint, design_point_folder))
+            return [point_event
+                    for iev in range(idx0, idx0 + nev)
+                    for point_event in self.run_design_points(iev)]
+        if not self.overlap:
+            return [self.run_event(iev) for iev in range(idx0, idx0 + nev)]
+
+        # run the afterburner of every event in the background while the
+        # hydro of the next event is running
+        event_list = []
+        with ThreadPoolExecutor(max_workers=1) as afterburner_pool:
+            afterburner_list = []
+            for iev in range(idx0, idx0 + nev):
+                event, need_run = self.prepare_event(iev)
+                event_list.append(event)
+                if need_run and self.run_stages(event, ("hydro",)):
+                    afterburner_list.append(
+                        (event,
+                         afterburner_pool.submit(self.run_stages, event,
+                                                 ("afterburner",))))
+            for event, future in afterburner_list:
+                event.status = future.result()
+        return event_list
+
+
+def run_pipeline_event(working_folder, para_dict, iev):
+    """This function runs one hydro event inside the given event folder
+
+       It is the unit of work sent to the executors in EventRunner. The
+       stages use paths relative to the event folder, so the working
+       directory of the worker is changed here.
+    """
+    chdir(working_folder)
+    event = Pipeline(para_dict).run_event(iev)
+    return (event.event_id, event.status)
+
+
+class EventRunner:
+    """This class drives pipelines in several event folders with a pool
+
+       Every submitted event gets its own future. Events sharing an event
+       folder are chained so that they never run at the same time, while
+       different folders run concurrently on the executor. Because the
+       stages change the working directory, a thread pool should only be
+       used to drive a single event folder.
+    """
+
+    def __init__(self, max_workers=None, executor=None):
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+        self._folder_tail = {}
+
+    def submit(self, working_folder, para_dict, iev):
+        """Submits one hydro event and returns its future"""
+        working_folder = path.abspath(working_folder)
+        future = Future()
+        previous = self._folder_tail.get(working_folder)
+        self._folder_tail[working_folder] = future
+
+        def _launch(_previous=None):
+            try:
+                job = self.executor.submit(run_pipeline_event, working_folder,
+                                           para_dict, iev)
+            except RuntimeError as err:
+                future.set_exception(err)
+                return
+            job.add_done_callback(partial(_copy_future_state, future))
+
+        if previous is None:
+            _launch()
+        else:
+            previous.add_done_callback(_launch)
+        return future
+
+    def submit_job(self, working_folder, para_dict):
+        """Submits all the hydro events of a job and returns the futures"""
+        idx0 = para_dict['hydro_id0']
+        return [
+            self.submit(working_folder, para_dict, iev)
+            for iev in range(idx0, idx0 + para_dict['n_hydro'])
+        ]
+
+    def shutdown(self, wait=True):
+        """Shuts down the underlying executor"""
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+def _copy_future_state(target, source):
+    """Copies the outcome of the executor future to the event future"""
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def driver_parameters_from_dicts(parameter_dict, n_hydro=1, hydro_id0=0,
+                                 n_urqmd=1, num_threads=1, seed_add=0):
+    """This function assembles the driver parameters from the parameter
+       dictionaries in the same way generate_jobs.py sets up a job
+    """
+    control_dict = parameter_dict.control_dict
+    initial_type = control_dict['initial_state_type']
+    time_stamp = "0.4"
+    if initial_type in ("IPGlasma", "IPGlasma+KoMPoST"):
+        if parameter_dict.ipglasma_dict['type'] == "self":
+            initial_condition = "self"
+        else:
+            initial_condition = (
+                parameter_dict.ipglasma_dict['database_name_pattern'])
+        if initial_type == "IPGlasma":
+            time_stamp = str(parameter_dict.music_dict['Initial_time_tau_0'])
+        else:
+            time_stamp = str(
+                parameter_dict.kompost_dict['KoMPoSTInputs']['tIn'])
+    else:
+        initial_condition = parameter_dict.mcglauber_dict['database_name']
+
+    save_ipglasma = False
+    if (initial_type in ("IPGlasma", "IPGlasma+KoMPoST")
+            and initial_condition == "self"):
+        save_ipglasma = control_dict.get('save_ipglasma_results', False)
+    save_kompost = False
+    if initial_type == "IPGlasma+KoMPoST":
+        save_kompost = control_dict.get('save_kompost_results', False)
+    ic_preselection = None
+    if control_dict.get('ic_preselection_estimator', "none") != "none":
+        ic_preselection = (control_dict['ic_preselection_estimator'],
+                           control_dict['ic_preselection_window'][0],
+                           control_dict['ic_preselection_window'][1])
+
+    return {
+        'initial_condition': initial_condition,
+        'initial_type': initial_type,
+        'n_hydro': n_hydro,
+        'hydro_id0': hydro_id0,
+        'n_urqmd': n_urqmd,
+        'num_threads': num_threads,
+        'save_ipglasma': save_ipglasma,
+        'save_kompost': save_kompost,
+        'save_hydro': control_dict.get('save_hydro_surfaces', False),
+        'save_urqmd': control_dict.get('save_UrQMD_files', False),
+        'shared_sampling': control_dict.get('shared_iSS_sampling', False),
+        'analysis_backend': getattr(
+            parameter_dict, 'hadronic_afterburner_toolkit_dict',
+            {}).get('analysis_backend', "toolkit"),
+        'particle_list_format': control_dict.get('particle_list_format',
+                                                 "gz"),
+        'ic_preselection': ic_preselection,
+        'ic_preselection_attempts': control_dict.get(
+            'ic_preselection_max_attempts', 1),
+        'seed_add': seed_add,
+        'time_stamp_str': time_stamp,
+    }
+
+
+def parse_command_line(argv=None):
+    """This function converts the command line arguments to the para_dict"""
+    parser = argparse.ArgumentParser(
+        description="\U0001F3B6  drive hydro + hadronic cascade simulations")
+    parser.add_argument("initial_condition_type",
+                        choices=known_initial_types)
+    parser.add_argument("initial_condition_database")
+    parser.add_argument("n_hydro_events", type=int)
+    parser.add_argument("hydro_event_id", type=int)
+    parser.add_argument("n_UrQMD", type=int)
+    parser.add_argument("n_threads", type=int)
+    parser.add_argument("save_ipglasma_flag")
+    parser.add_argument("save_kompost_flag")
+    parser.add_argument("save_hydro_flag")
+    parser.add_argument("save_urqmd_flag")
+    parser.add_argument("seed_add", type=int)
+    parser.add_argument("tau0")
+    parser.add_argument("--stage_engine", choices=["real", "fake"],
+                        default="real",
+                        help="fake: use the stand-in executables in "
+                        + "fake_stage_engines.py")
+    parser.add_argument("--cpu_placement",
+                        choices=cpu_placement.known_placement_policies,
+                        default="none",
+                        help="pin the MUSIC team and the UrQMD workers to "
+                        + "explicit cores")
+    parser.add_argument("--core_budget", type=int, default=0,
+                        help="number of cores of the job; if set, the "
+                        + "thread counts of the stages are chosen from the "
+                        + "scaling calibration")
+    parser.add_argument("--stage_calibration", default=None,
+                        help="file with the measured stage scaling, new "
+                        + "measurements are appended to it")
+    parser.add_argument("--shared_sampling", action="store_true",
+                        help="run iSS once per hydro event for all the "
+                        + "oversampled UrQMD events")
+    parser.add_argument("--hydro_archive", default=None,
+                        help="run only the afterburner over the hydro "
+                        + "surfaces in this folder or hdf5 archive")
+    parser.add_argument("--append_results", default=None,
+                        help="folder with the particle lists of earlier "
+                        + "runs, the new UrQMD events are appended to them")
+    parser.add_argument("--analysis_backend", choices=["toolkit", "numpy"],
+                        default="toolkit",
+                        help="engine for the spvn analysis")
+    parser.add_argument("--particle_list_format", choices=["gz", "h5"],
+                        default="gz",
+                        help="h5: save the UrQMD events in an indexed hdf5 "
+                        + "container with random access to every event")
+    parser.add_argument("--ic_preselection", nargs=3, default=None,
+                        metavar=("ESTIMATOR", "MIN", "MAX"),
+                        help="run hydro only for the initial conditions "
+                        + "with MIN <= ESTIMATOR < MAX")
+    parser.add_argument("--ic_preselection_attempts", type=int, default=1,
+                        help="number of initial conditions sampled before "
+                        + "the event is discarded")
+    parser.add_argument("--glauber_batch_size", type=int, default=0,
+                        help="number of 3D MC-Glauber events generated in "
+                        + "one run (0: all the hydro events of the job)")
+    parser.add_argument("--startup_throttle", nargs=3, default=None,
+                        metavar=("LOCK_FOLDER", "N_SLOTS", "HOLD_TIME"),
+                        help="at most N_SLOTS jobs sharing LOCK_FOLDER start "
+                        + "a throttled stage within HOLD_TIME seconds, "
+                        + "IPGlasma gives its slot back once it has read "
+                        + "its tables")
+    parser.add_argument("--throttled_stages", nargs="+",
+                        default=default_throttled_stages,
+                        help="stages that wait for a start-up slot")
+    parser.add_argument("--ic_cache", nargs=2, default=None,
+                        metavar=("CACHE_FOLDER", "SIZE_GB"),
+                        help="copy the events of the initial condition "
+                        + "database into a node-local LRU cache")
+    parser.add_argument("--design_points", nargs="+", default=None,
+                        metavar="FOLDER",
+                        help="run hydro and the afterburner for every "
+                        + "design point (a folder with the layout of "
+                        + "model_parameters) on each initial condition")
+    parser.add_argument("--ic_seed", type=int, default=None,
+                        help="seed of the self-generated 3D MC-Glauber "
+                        + "events, the same event ids give the same events")
+    parser.add_argument("--result_cache", default=None,
+                        metavar="CACHE_FOLDER",
+                        help="reuse the hydro results and particle lists "
+                        + "of earlier runs with the same inputs")
+    parser.add_argument("--stage_timeout", action="append", default=[],
+                        metavar="STAGE=SECONDS",
+                        help="wall time limit for a stage executable "
+                        + "(can be repeated)")
+    args = parser.parse_args(argv)
+
+    stage_timeout = {}
+    for timeout_i in args.stage_timeout:
+        stage_name, seconds = timeout_i.split("=")
+        if stage_name not in stage_executable_registry:
+            parser.error("unknown stage in --stage_timeout: {}".format(
+                stage_name))
+        stage_timeout[stage_name] = float(seconds)
 
     para_dict = {
-        'initial_condition': INITIAL_CONDITION_DATABASE,
-        'initial_type': INITIAL_CONDITION_TYPE,
-        'n_hydro': N_HYDRO_EVENTS,
-        'hydro_id0': HYDRO_EVENT_ID0,
-        'n_urqmd': N_URQMD,
-        'num_threads': N_THREADS,
-        'save_ipglasma': SAVE_IPGLASMA,
-        'save_kompost': SAVE_KOMPOST,
-        'save_hydro': SAVE_HYDRO,
-        'save_urqmd': SAVE_URQMD,
-        'seed_add': SEED_ADD,
-        'time_stamp_str': TIME_STAMP,
+        'initial_condition': args.initial_condition_database,
+        'initial_type': args.initial_condition_type,
+        'n_hydro': args.n_hydro_events,
+        'hydro_id0': args.hydro_event_id,
+        'n_urqmd': args.n_UrQMD,
+        'num_threads': args.n_threads,
+        'save_ipglasma': (args.save_ipglasma_flag.lower() == "true"),
+        'save_kompost': (args.save_kompost_flag.lower() == "true"),
+        'save_hydro': (args.save_hydro_flag.lower() == "true"),
+        'save_urqmd': (args.save_urqmd_flag.lower() == "true"),
+        'seed_add': args.seed_add,
+        'time_stamp_str': args.tau0,
+        'stage_engine': args.stage_engine,
+        'stage_timeout': stage_timeout,
+        'cpu_placement': args.cpu_placement,
+        'core_budget': args.core_budget,
+        'stage_calibration': args.stage_calibration,
+        'shared_sampling': args.shared_sampling,
+        'hydro_archive': args.hydro_archive,
+        'append_results': args.append_results,
+        'analysis_backend': args.analysis_backend,
+        'particle_list_format': args.particle_list_format,
+        'ic_preselection': args.ic_preselection,
+        'ic_preselection_attempts': args.ic_preselection_attempts,
+        'glauber_batch_size': args.glauber_batch_size,
+        'startup_throttle': args.startup_throttle,
+        'throttled_stages': args.throttled_stages,
+        'ic_cache': args.ic_cache,
+        'result_cache': args.result_cache,
+        'ic_seed': args.ic_seed,
+        'design_points': args.design_points,
     }
+    return para_dict
+
 
-    main(para_dict)
+def main(para_dict_):
+    """This is the main function"""
+    return Pipeline(para_dict_).run()
+
+
+if __name__ == "__main__":
+    main(parse_command_line())
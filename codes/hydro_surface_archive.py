@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+    This module gives access to archived hydro freeze-out surfaces, so that
+    more hadronic afterburner statistics can be generated without rerunning
+    MUSIC. An archive is either a directory with hydro_results_{event_id}
+    folders (e.g. HYDRO_RESULTS from collect_events.sh, possibly split into
+    C{lo}-{hi} sub-folders by split_into_centralities.py), or an hdf5 file
+    with one hydro_results_{event_id} group per event.
+
+    Usage: hydro_surface_archive.py HYDRO_RESULTS_folder archive.h5
+    packs the surfaces in the folder into an hdf5 archive.
+"""
+
+from os import path, makedirs, symlink
+from glob import glob
+import shutil
+import sys
+import h5py
+import numpy as np
+
+hydro_folder_prefix = "hydro_results_"
+
+# files in a hydro results folder that are needed by the afterburner
+surface_file_patterns = ["surface*.dat", "music_input", "run.log"]
+
+
+def hydro_run_finished(run_log):
+    """This function checks the last line of the MUSIC log file"""
+    with open(run_log, "r") as f:
+        last_line = ""
+        for line in f:
+            if line.strip() != "":
+                last_line = line
+    return last_line.split()[-1:] == ["Finished."]
+
+
+def list_archived_surfaces(archive_path):
+    """This function returns a dictionary {event_id: location} for all the
+       hydro events in the archive with a surface file
+    """
+    event_dict = {}
+    if path.isfile(archive_path):
+        with h5py.File(archive_path, "r") as h5_f:
+            for group_name in h5_f.keys():
+                if not group_name.startswith(hydro_folder_prefix):
+                    continue
+                file_list = list(h5_f[group_name].keys())
+                if not [x for x in file_list if x.startswith("surface")]:
+                    continue
+                event_dict[group_name[len(hydro_folder_prefix):]] = group_name
+        return event_dict
+
+    folder_list = glob(path.join(archive_path, "**",
+                                 "{}*".format(hydro_folder_prefix)),
+                       recursive=True)
+    for folder_i in folder_list:
+        if not path.isdir(folder_i):
+            continue
+        if not glob(path.join(folder_i, "surface*.dat")):
+            continue
+        run_log = path.join(folder_i, "run.log")
+        if path.isfile(run_log) and not hydro_run_finished(run_log):
+            continue
+        event_id = path.basename(folder_i)[len(hydro_folder_prefix):]
+        event_dict[event_id] = folder_i
+    return event_dict
+
+
+def sorted_event_ids(event_dict):
+    """This function sorts the event ids numerically where possible"""
+    def sort_key(event_id):
+        event_number = event_id.split("_")[-1]
+        if event_number.isdigit():
+            return (event_id[:-len(event_number)], int(event_number))
+        return (event_id, -1)
+
+    return sorted(event_dict.keys(), key=sort_key)
+
+
+def fetch_archived_surface(archive_path, location, output_folder):
+    """This function puts the surface files of one archived hydro event
+       into output_folder. The surfaces in a directory archive are linked,
+       the ones in an hdf5 archive are extracted.
+    """
+    makedirs(output_folder, exist_ok=True)
+    if path.isfile(archive_path):
+        with h5py.File(archive_path, "r") as h5_f:
+            group = h5_f[location]
+            for file_name in group.keys():
+                with open(path.join(output_folder, file_name), "wb") as f:
+                    f.write(group[file_name][()].tobytes())
+        return
+
+    for pattern in surface_file_patterns:
+        for file_path in glob(path.join(location, pattern)):
+            output_file = path.join(output_folder, path.basename(file_path))
+            if path.lexists(output_file):
+                continue
+            if pattern.startswith("surface"):
+                symlink(path.abspath(file_path), output_file)
+            else:
+                shutil.copy(file_path, output_file)
+
+
+def pack_surfaces_into_hdf5(archive_folder, h5_filename):
+    """This function packs the surfaces in a directory archive into an hdf5
+       archive and returns the number of events
+    """
+    event_dict = list_archived_surfaces(archive_folder)
+    with h5py.File(h5_filename, "a") as h5_f:
+        for event_id in sorted_event_ids(event_dict):
+            group_name = "{}{}".format(hydro_folder_prefix, event_id)
+            if group_name in h5_f:
+                continue
+            group = h5_f.create_group(group_name)
+            for pattern in surface_file_patterns:
+                for file_path in glob(path.join(event_dict[event_id],
+                                                pattern)):
+                    with open(file_path, "rb") as f:
+                        data = np.frombuffer(f.read(), dtype=np.uint8)
+                    group.create_dataset(path.basename(file_path), data=data,
+                                         compression="gzip",
+                                         compression_opts=9)
+    return len(event_dict)
+
+
+if __name__ == "__main__":
+    try:
+        ARCHIVE_FOLDER = sys.argv[1]
+        H5_FILENAME = sys.argv[2]
+    except IndexError:
+        print("Usage: {} HYDRO_RESULTS_folder archive.h5".format(sys.argv[0]))
+        exit(1)
+    NEV = pack_surfaces_into_hdf5(ARCHIVE_FOLDER, H5_FILENAME)
+    print("packed {} hydro surfaces into {}".format(NEV, H5_FILENAME))
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+    This module keeps a node-local cache of the events fetched from the
+    initial condition databases on the shared filesystem (IPGlasma,
+    3D MC-Glauber in both layouts, and the consttau thickness functions).
+
+    The first job on a node that needs an event copies it into a small hdf5
+    file with the layout of the database,
+
+        {cache_folder}/{database key}/event_{id}.h5
+
+    and the fetchers read that file instead of the shared database. The
+    gzip chunks are copied as they are, without decompressing them. The
+    copy is made under a lock file, so two jobs do not copy the same event.
+    When the cache is larger than its size cap, the least recently used
+    events are removed.
+
+    Usage: ic_cache.py cache_folder size_GB database.h5 event_id ...
+    copies the events into the cache and prints the local files.
+"""
+
+from os import path, makedirs, remove, replace, getpid, stat, utime, walk
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import sys
+import time
+import h5py
+import numpy as np
+
+
+class InitialConditionCache:
+    """This class is a node-local LRU cache of initial condition events"""
+
+    def __init__(self, cache_folder, size_gb=20., min_age=300.):
+        self.cache_folder = cache_folder
+        self.size_cap = float(size_gb)*1024**3
+        # entries used within min_age seconds are not evicted, because a
+        # job may be about to read them
+        self.min_age = float(min_age)
+        makedirs(self.cache_folder, exist_ok=True)
+
+    @contextmanager
+    def _lock(self, lock_name):
+        """Holds an exclusive lock on the lock file"""
+        with open(path.join(self.cache_folder, lock_name), "a") as lock_f:
+            fcntl.flock(lock_f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_f, fcntl.LOCK_UN)
+
+    def database_key(self, database_path):
+        """Returns the cache folder name of a database, which changes when
+           the database is rewritten
+        """
+        database_path = path.realpath(database_path)
+        file_stat = stat(database_path)
+        key_text = "{}:{}:{}".format(database_path, file_stat.st_size,
+                                     int(file_stat.st_mtime))
+        return "{}_{}".format(
+            path.basename(database_path).split(".h5")[0],
+            hashlib.sha1(key_text.encode()).hexdigest()[:12])
+
+    def cached_event(self, database_path, event_id):
+        """Returns the path of the local hdf5 file with the event if it is
+           in the cache already, or None. It does not read the database.
+        """
+        entry = path.join(self.cache_folder, self.database_key(database_path),
+                          "event_{}.h5".format(event_id))
+        try:
+            utime(entry)
+        except OSError:
+            # not cached, or just evicted
+            return None
+        print("\U0001F4BE  cache hit {}".format(entry), flush=True)
+        return entry
+
+    def event_database(self, database_path, event_id):
+        """Returns the path of a local hdf5 file with the event, which the
+           fetchers can read instead of database_path
+        """
+        entry = self.cached_event(database_path, event_id)
+        if entry is not None:
+            return entry
+        entry_folder = path.join(self.cache_folder,
+                                 self.database_key(database_path))
+        entry = path.join(entry_folder, "event_{}.h5".format(event_id))
+        makedirs(entry_folder, exist_ok=True)
+        with self._lock(path.join(path.basename(entry_folder),
+                                  "event_{}.lock".format(event_id))):
+            if not path.isfile(entry):
+                print("\U0001F4BE  cache {} event {} in {}".format(
+                    database_path, event_id, entry), flush=True)
+                entry_tmp = "{}.{}.tmp".format(entry, getpid())
+                try:
+                    copy_event(database_path, event_id, entry_tmp)
+                except (KeyError, OSError):
+                    if path.isfile(entry_tmp):
+                        remove(entry_tmp)
+                    raise
+                replace(entry_tmp, entry)
+            else:
+                utime(entry)
+        self.evict(keep=entry)
+        return entry
+
+    def entries(self):
+        """Returns the list of (last use, size, file) of the cached events"""
+        entry_list = []
+        for dir_path, _, file_list in walk(self.cache_folder):
+            for file_name in file_list:
+                if not file_name.endswith(".h5"):
+                    continue
+                file_path = path.join(dir_path, file_name)
+                try:
+                    file_stat = stat(file_path)
+                except OSError:
+                    continue
+                entry_list.append((file_stat.st_mtime, file_stat.st_size,
+                                   file_path))
+        return sorted(entry_list)
+
+    def evict(self, keep=None):
+        """Removes the least recently used events until the cache is below
+           its size cap
+        """
+        with self._lock("cache.lock"):
+            entry_list = self.entries()
+            total_size = sum([size for _, size, _ in entry_list])
+            now = time.time()
+            for last_use, size, file_path in entry_list:
+                if total_size <= self.size_cap:
+                    break
+                if file_path == keep or now - last_use < self.min_age:
+                    continue
+                try:
+                    remove(file_path)
+                    total_size -= size
+                except OSError:
+                    pass
+
+
+def copy_event(database_path, event_id, output_file):
+    """This function copies one event of an initial condition database into
+       output_file, keeping the layout the fetchers expect
+    """
+    with h5py.File(database_path, "r") as h5_in, \
+            h5py.File(output_file, "w") as h5_out:
+        for key_name, value in h5_in.attrs.items():
+            h5_out.attrs.create(key_name, value)
+        group_name = "event-{}".format(event_id)
+        dataset_name = "strings_event_{}.dat".format(event_id)
+        if group_name in h5_in:
+            # IPGlasma events and consttau thickness functions
+            h5_in.copy(h5_in[group_name], h5_out, name=group_name)
+        elif dataset_name in h5_in:
+            # 3D MC-Glauber events, one dataset per event
+            h5_in.copy(h5_in[dataset_name], h5_out, name=dataset_name)
+        elif "event_offsets" in h5_in:
+            # 3D MC-Glauber events, ragged layout
+            event_ids = h5_in["event_ids"][()]
+            irow = int(np.searchsorted(event_ids, int(event_id)))
+            if irow >= len(event_ids) or event_ids[irow] != int(event_id):
+                raise KeyError("no event {} in {}".format(event_id,
+                                                          database_path))
+            start, end = h5_in["event_offsets"][irow:irow + 2]
+            h5_out.create_dataset("strings", data=h5_in["strings"][start:end])
+            h5_out.create_dataset("event_offsets",
+                                  data=np.array([0, end - start],
+                                                dtype=np.int64))
+            h5_out.create_dataset("event_ids", data=event_ids[irow:irow + 1])
+            h5_out.create_dataset("event_headers",
+                                  data=h5_in["event_headers"][irow:irow + 1])
+        else:
+            raise KeyError("no event {} in {}".format(event_id,
+                                                      database_path))
+
+
+if __name__ == "__main__":
+    try:
+        CACHE = InitialConditionCache(sys.argv[1], float(sys.argv[2]))
+        DATABASE = sys.argv[3]
+        EVENT_LIST = sys.argv[4:]
+        if not EVENT_LIST:
+            raise IndexError
+    except (IndexError, ValueError):
+        print("Usage: {} cache_folder size_GB database.h5 event_id ...".format(
+            sys.argv[0]))
+        exit(1)
+    for EVENT_ID in EVENT_LIST:
+        print(CACHE.event_database(DATABASE, EVENT_ID))
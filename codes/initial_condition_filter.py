@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+    This module evaluates cheap centrality estimators of an initial
+    condition, so that the events outside the wanted centrality window can
+    be discarded (or re-sampled) before MUSIC starts. The estimators are
+
+        3DMCGlauber_dynamical (strings_event_{id}.dat)
+            b, Npart, Ncoll     from the header of the string file
+            n_strings           number of strings
+            string_energy       total mass of the strings (GeV)
+        IPGlasma, IPGlasma+KoMPoST (ipglasma_results_{id})
+            Npart               number of lines in NpartList{id}.dat
+            Ncoll               number of lines in NcollList{id}.dat
+            Ngluon              first value in NgluonEstimators{id}.dat
+
+    Usage: initial_condition_filter.py strings_event_0.dat
+           initial_condition_filter.py ipglasma_results_folder event_id
+    prints the estimators of one initial condition.
+"""
+
+from os import path
+import re
+import sys
+import numpy as np
+
+known_estimators = {
+    "3DMCGlauber_dynamical": ["b", "Npart", "Ncoll", "n_strings",
+                              "string_energy"],
+    "IPGlasma": ["Npart", "Ncoll", "Ngluon"],
+    "IPGlasma+KoMPoST": ["Npart", "Ncoll", "Ngluon"],
+}
+
+# "key = value" pairs in the header of the 3D MC-Glauber string files
+header_value_pattern = re.compile(
+    r"([A-Za-z_]\w*)\s*=\s*([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)")
+
+
+def check_estimator(initial_type, estimator):
+    """This function raises a ValueError if the estimator is not available
+       for the initial condition type
+    """
+    if estimator not in known_estimators.get(initial_type, []):
+        raise ValueError(
+            "centrality estimator {} is not available for {}, use one of "
+            "{}".format(estimator, initial_type,
+                        known_estimators.get(initial_type, [])))
+
+
+def read_header_values(filename):
+    """This function returns the "key = value" pairs in the comment lines
+       at the top of the file
+    """
+    values = {}
+    with open(filename, "r") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            for key_name, value in header_value_pattern.findall(line):
+                values[key_name] = float(value)
+    return values
+
+
+def glauber_estimators(strings_file):
+    """This function returns the estimators of a 3D MC-Glauber event"""
+    estimators = read_header_values(strings_file)
+    data = np.loadtxt(strings_file, ndmin=2)
+    estimators['n_strings'] = data.shape[0]
+    estimators['string_energy'] = float(np.sum(data[:, 0])) if len(data) else 0.
+    return estimators
+
+
+def ipglasma_estimators(results_folder, event_id):
+    """This function returns the estimators of an IPGlasma event"""
+    estimators = {}
+    for key_name, file_name in [("Npart", "NpartList{}.dat"),
+                                ("Ncoll", "NcollList{}.dat")]:
+        file_path = path.join(results_folder, file_name.format(event_id))
+        if path.isfile(file_path):
+            with open(file_path, "r") as f:
+                estimators[key_name] = sum(
+                    1 for line in f
+                    if line.strip() != "" and not line.startswith("#")
+                    and "Q_s" not in line)
+    file_path = path.join(results_folder,
+                          "NgluonEstimators{}.dat".format(event_id))
+    if path.isfile(file_path):
+        with open(file_path, "r") as f:
+            # the raw IPGlasma outputs have a Q_s line without "#"
+            data = np.genfromtxt([line for line in f if "Q_s" not in line],
+                                 comments="#", missing_values="N/A",
+                                 filling_values=0.0).flatten()
+        if len(data) > 0:
+            estimators['Ngluon'] = float(data[0])
+    return estimators
+
+
+class InitialConditionFilter:
+    """This class accepts the initial conditions with
+       window_min <= estimator < window_max
+    """
+
+    def __init__(self, estimator, window_min, window_max):
+        self.estimator = estimator
+        self.window_min = float(window_min)
+        self.window_max = float(window_max)
+
+    def value(self, estimators):
+        """Returns the value of the selected estimator"""
+        if self.estimator not in estimators:
+            raise ValueError("the initial condition has no {}".format(
+                self.estimator))
+        return estimators[self.estimator]
+
+    def accept(self, estimators):
+        """Returns whether the initial condition is in the window"""
+        value = self.value(estimators)
+        return self.window_min <= value < self.window_max
+
+    def __str__(self):
+        return "{} <= {} < {}".format(self.window_min, self.estimator,
+                                      self.window_max)
+
+
+def reseed_input_file(input_file, seed):
+    """This function sets a new random seed in an IPGlasma input file"""
+    with open(input_file, "r") as f:
+        line_list = f.readlines()
+    with open(input_file, "w") as f:
+        for line in line_list:
+            key_name = line.split()[0] if line.split() else ""
+            if key_name == "seed":
+                line = "seed  {}\n".format(seed)
+            elif key_name == "useTimeForSeed":
+                line = "useTimeForSeed  0\n"
+            f.write(line)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        ESTIMATORS = glauber_estimators(sys.argv[1])
+    elif len(sys.argv) == 3:
+        ESTIMATORS = ipglasma_estimators(sys.argv[1], sys.argv[2])
+    else:
+        print("Usage: {0} strings_event_0.dat\n"
+              "       {0} ipglasma_results_folder event_id".format(
+                  sys.argv[0]))
+        exit(1)
+    for KEY_NAME, VALUE in ESTIMATORS.items():
+        print("{:>14s} = {}".format(KEY_NAME, VALUE))
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+    This module reads and writes the zipped binary particle lists
+    (particle_list.gz) produced by convert_to_binary.e of the hadronic
+    afterburner toolkit. For every event, the file stores the number of
+    particles as an int32, followed by one record per particle,
+
+        int32 pid, float32 mass, float32 t, x, y, z, float32 E, px, py, pz
+
+    in little endian. Files merged by concatenate_binary_files.e are
+    concatenated gzip streams, which are read as one file.
+
+    The events are read in chunks of a fixed number of events, as a single
+    structured array of particles with the event offsets, so that the
+    memory usage is bounded by the chunk size. The chunks can be passed
+    directly to a process pool,
+
+        with Pool(8) as pool:
+            results = pool.imap(observable, iterate_event_chunks(filename))
+
+    The particle lists can also be stored in an indexed hdf5 container
+    (particle_list.h5) with the datasets
+
+        particles       all the particles, chunked and compressed
+        event_offsets   the particles of event i are
+                        particles[event_offsets[i]:event_offsets[i + 1]]
+
+    so that any event can be read without decompressing the ones before
+    it, and the events can be split across processes,
+
+        n_events = count_events("particle_list.h5")[0]
+        chunks = iterate_event_chunks("particle_list.h5", 100,
+                                      event_range=(0, n_events//2))
+
+    All the readers below accept both formats.
+
+    Usage: particle_list_reader.py particle_list.{gz,h5}
+    prints a summary of the particle list.
+           particle_list_reader.py convert particle_list.gz particle_list.h5
+    writes the indexed container of a zipped binary particle list.
+"""
+
+import gzip
+import sys
+import h5py
+import numpy as np
+
+# one particle record: pid, mass, space-time x = (t, x, y, z), and
+# momentum p = (E, px, py, pz)
+particle_dtype = np.dtype([("pid", "<i4"), ("mass", "<f4"), ("x", "<f4", 4),
+                           ("p", "<f4", 4)])
+multiplicity_dtype = np.dtype("<i4")
+
+# number of particles per hdf5 chunk of the indexed container
+particles_per_h5_chunk = 32768
+
+
+class ParticleListFormatError(Exception):
+    """Raised when a particle list ends in the middle of an event"""
+
+
+def _read_exact(f, n_bytes):
+    """Reads exactly n_bytes from f, or returns b'' at the end of file"""
+    data = f.read(n_bytes)
+    if len(data) == n_bytes or len(data) == 0:
+        return data
+    raise ParticleListFormatError(
+        "truncated particle list: expected {} bytes, got {}".format(
+            n_bytes, len(data)))
+
+
+def is_indexed_particle_list(filename):
+    """This function checks whether the file is an indexed hdf5 container"""
+    return h5py.is_hdf5(filename)
+
+
+class IndexedParticleList:
+    """This class gives random access to the events of an indexed hdf5
+       particle list. Use mode="a" to append events.
+    """
+
+    def __init__(self, filename, mode="r"):
+        self.h5_f = h5py.File(filename, mode)
+        if "particles" not in self.h5_f:
+            if mode == "r":
+                self.h5_f.close()
+                raise ParticleListFormatError(
+                    "{} is not an indexed particle list".format(filename))
+            self.h5_f.create_dataset("particles", shape=(0,),
+                                     maxshape=(None,), dtype=particle_dtype,
+                                     chunks=(particles_per_h5_chunk,),
+                                     compression="gzip", compression_opts=9,
+                                     shuffle=True)
+            self.h5_f.create_dataset("event_offsets",
+                                     data=np.zeros(1, dtype=np.int64),
+                                     maxshape=(None,), chunks=True)
+        self.particles = self.h5_f["particles"]
+        self.event_offsets = self.h5_f["event_offsets"][()]
+
+    @property
+    def n_events(self):
+        """Returns the number of events in the container"""
+        return len(self.event_offsets) - 1
+
+    def read_events(self, start, stop):
+        """Returns the events [start, stop) as (particles, event_offsets)"""
+        stop = min(stop, self.n_events)
+        if stop <= start:
+            return concatenate_events([])
+        offsets = self.event_offsets[start:stop + 1]
+        particles = self.particles[offsets[0]:offsets[-1]]
+        return (particles, offsets - offsets[0])
+
+    def iterate_event_chunks(self, events_per_chunk=100, event_range=None):
+        """Yields the events in event_range = (start, stop) in chunks"""
+        start, stop = (0, self.n_events) if event_range is None else (
+            event_range)
+        stop = min(stop, self.n_events)
+        for ichunk in range(start, stop, events_per_chunk):
+            yield self.read_events(ichunk,
+                                   min(stop, ichunk + events_per_chunk))
+
+    def append_events(self, event_list):
+        """Appends the events (structured arrays with particle_dtype)"""
+        particles, offsets = concatenate_events(
+            [np.asarray(x, dtype=particle_dtype) for x in event_list])
+        if len(offsets) == 1:
+            return
+        n_old = self.event_offsets[-1]
+        self.particles.resize((n_old + len(particles),))
+        self.particles[n_old:] = particles
+        self.event_offsets = np.concatenate(
+            [self.event_offsets, n_old + offsets[1:]])
+        self.h5_f["event_offsets"].resize((len(self.event_offsets),))
+        self.h5_f["event_offsets"][:] = self.event_offsets
+
+    def close(self):
+        """Closes the hdf5 file"""
+        self.h5_f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iterate_events(filename):
+    """This function yields the particles of every event as a structured
+       array with the fields pid, mass, x, and p
+    """
+    if is_indexed_particle_list(filename):
+        with IndexedParticleList(filename) as particle_list:
+            for particles, offsets in particle_list.iterate_event_chunks():
+                for event_i in split_events(particles, offsets):
+                    yield event_i
+        return
+    with gzip.open(filename, "rb") as f:
+        while True:
+            header = _read_exact(f, multiplicity_dtype.itemsize)
+            if not header:
+                return
+            n_particles = int(np.frombuffer(header, multiplicity_dtype)[0])
+            data = _read_exact(f, n_particles*particle_dtype.itemsize)
+            if n_particles > 0 and not data:
+                raise ParticleListFormatError(
+                    "truncated particle list: missing {} particles".format(
+                        n_particles))
+            yield np.frombuffer(data, particle_dtype)
+
+
+def iterate_event_chunks(filename, events_per_chunk=100, event_range=None):
+    """This function yields chunks of events_per_chunk events. Each chunk
+       is a tuple (particles, event_offsets), where the particles of the
+       i-th event in the chunk are particles[event_offsets[i]:
+       event_offsets[i + 1]]. event_range = (start, stop) selects the
+       events; it is read directly from an indexed container and skipped
+       over in a zipped list.
+    """
+    if is_indexed_particle_list(filename):
+        with IndexedParticleList(filename) as particle_list:
+            for chunk in particle_list.iterate_event_chunks(
+                    events_per_chunk, event_range):
+                yield chunk
+        return
+    start, stop = (0, None) if event_range is None else event_range
+    event_list = []
+    for iev, particles in enumerate(iterate_events(filename)):
+        if iev < start:
+            continue
+        if stop is not None and iev >= stop:
+            break
+        event_list.append(particles)
+        if len(event_list) == events_per_chunk:
+            yield concatenate_events(event_list)
+            event_list = []
+    if event_list:
+        yield concatenate_events(event_list)
+
+
+def concatenate_events(event_list):
+    """This function combines a list of events into (particles,
+       event_offsets)
+    """
+    event_offsets = np.zeros(len(event_list) + 1, dtype=np.int64)
+    event_offsets[1:] = np.cumsum([len(event_i) for event_i in event_list])
+    if event_list:
+        particles = np.concatenate(event_list)
+    else:
+        particles = np.zeros(0, dtype=particle_dtype)
+    return (particles, event_offsets)
+
+
+def split_events(particles, event_offsets):
+    """This function returns the list of events in a chunk"""
+    return [
+        particles[event_offsets[i]:event_offsets[i + 1]]
+        for i in range(len(event_offsets) - 1)
+    ]
+
+
+def event_index(event_offsets):
+    """This function returns the index of the event in the chunk for every
+       particle, e.g. to use with np.bincount
+    """
+    return np.repeat(np.arange(len(event_offsets) - 1),
+                     np.diff(event_offsets))
+
+
+def count_events(filename):
+    """This function returns the number of events and particles in the file
+       without keeping the particles in memory
+    """
+    if is_indexed_particle_list(filename):
+        with IndexedParticleList(filename) as particle_list:
+            return (particle_list.n_events,
+                    int(particle_list.event_offsets[-1]))
+    n_events = 0
+    n_particles = 0
+    with gzip.open(filename, "rb") as f:
+        while True:
+            header = _read_exact(f, multiplicity_dtype.itemsize)
+            if not header:
+                break
+            n_i = int(np.frombuffer(header, multiplicity_dtype)[0])
+            _read_exact(f, n_i*particle_dtype.itemsize)
+            n_events += 1
+            n_particles += n_i
+    return (n_events, n_particles)
+
+
+def write_particle_list(filename, event_list, mode="wb"):
+    """This function writes the events (structured arrays with
+       particle_dtype) into a zipped binary particle list. Use mode="ab"
+       to append the events as a new gzip stream.
+    """
+    with gzip.open(filename, mode) as f:
+        for particles in event_list:
+            particles = np.asarray(particles, dtype=particle_dtype)
+            f.write(np.array(len(particles), dtype=multiplicity_dtype)
+                    .tobytes())
+            f.write(particles.tobytes())
+
+
+def write_indexed_particle_list(filename, event_list, mode="w",
+                                events_per_block=100):
+    """This function writes the events into an indexed hdf5 container.
+       Use mode="a" to append the events to an existing container.
+    """
+    with IndexedParticleList(filename, mode) as particle_list:
+        block = []
+        for particles in event_list:
+            block.append(particles)
+            if len(block) == events_per_block:
+                particle_list.append_events(block)
+                block = []
+        particle_list.append_events(block)
+
+
+def convert_to_indexed(filename, h5_filename, mode="w"):
+    """This function writes the events of a zipped binary particle list
+       into an indexed hdf5 container and returns the number of events
+    """
+    write_indexed_particle_list(h5_filename, iterate_events(filename), mode)
+    return count_events(h5_filename)[0]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        NEV = convert_to_indexed(sys.argv[2], sys.argv[3])
+        print("converted {} events into {}".format(NEV, sys.argv[3]))
+        exit(0)
+    try:
+        FILENAME = sys.argv[1]
+    except IndexError:
+        print("Usage: {0} particle_list.{{gz,h5}}\n"
+              "       {0} convert particle_list.gz particle_list.h5".format(
+                  sys.argv[0]))
+        exit(1)
+    NEV = 0
+    PID_COUNT = {}
+    for PARTICLES, OFFSETS in iterate_event_chunks(FILENAME):
+        NEV += len(OFFSETS) - 1
+        PIDS, COUNTS = np.unique(PARTICLES["pid"], return_counts=True)
+        for pid, count in zip(PIDS, COUNTS):
+            PID_COUNT[pid] = PID_COUNT.get(pid, 0) + count
+    print("{}: {} events, {} particles".format(
+        FILENAME, NEV, sum(PID_COUNT.values())))
+    for pid in sorted(PID_COUNT, key=lambda x: -PID_COUNT[x])[:10]:
+        print("    pid {:8d}: {:.2f} per event".format(
+            pid, PID_COUNT[pid]/max(1, NEV)))
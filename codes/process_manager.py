@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+    This module launches the stage executables of the iEBE-MUSIC driver
+    as managed child processes. The processes are started without a shell,
+    with optional time limits, OpenMP thread settings, and CPU affinity.
+    Their outputs are streamed line by line to the driver log (or to a log
+    file), and the return codes are reported back to the driver.
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+
+class ProcessResult:
+    """This class stores the outcome of a managed process"""
+
+    def __init__(self, command, returncode, elapsed, timed_out=False):
+        self.command = command
+        self.returncode = returncode
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    @property
+    def success(self):
+        """Returns True if the process finished with return code 0"""
+        return self.returncode == 0 and not self.timed_out
+
+    def __repr__(self):
+        return "ProcessResult({}, returncode={}, elapsed={:.2f}s{})".format(
+            " ".join(self.command), self.returncode, self.elapsed,
+            ", timed out" if self.timed_out else "")
+
+
+def process_environment(n_threads=None, env=None):
+    """This function returns the environment for a child process"""
+    child_env = dict(os.environ)
+    if env is not None:
+        child_env.update(env)
+    if n_threads is not None and n_threads > 0:
+        child_env['OMP_NUM_THREADS'] = str(n_threads)
+    return child_env
+
+
+def pinned_command(command, cpu_list):
+    """This function returns the command prefixed with taskset, which pins
+       the process to cpu_list before it starts any thread. It returns
+       None if taskset is not available.
+    """
+    taskset = shutil.which("taskset")
+    if taskset is None:
+        return None
+    return [taskset, "-c", ",".join([str(cpu) for cpu in cpu_list])
+            ] + command
+
+
+def _stream_output(pipe, log_stream, prefix):
+    """Copies the output of the child process line by line"""
+    for line in iter(pipe.readline, b''):
+        log_stream.write(prefix + line.decode(errors="replace"))
+        log_stream.flush()
+    pipe.close()
+
+
+def run_process(command, cwd=None, timeout=None, n_threads=None,
+                cpu_list=None, env=None, log_file=None, prefix=""):
+    """This function runs command (a list) and waits for it to finish
+
+       timeout: wall time limit in seconds, the whole process group is
+                killed if it is exceeded
+       n_threads: the OMP_NUM_THREADS setting for the process
+       cpu_list: the cores the process (and its children) are pinned to
+       log_file: file name to append the outputs to; by default the outputs
+                 are streamed to the stdout of the driver with prefix
+    """
+    command = [str(arg_i) for arg_i in command]
+    # the driver runs several threads, so the pinning is not done between
+    # fork and exec (preexec_fn), where the child could deadlock
+    launch_command = command
+    set_affinity = False
+    if cpu_list:
+        launch_command = pinned_command(command, sorted(cpu_list))
+        if launch_command is None:
+            launch_command = command
+            set_affinity = hasattr(os, "sched_setaffinity")
+
+    if log_file is not None:
+        log_stream = open(log_file, "a")
+    else:
+        log_stream = sys.stdout
+
+    time_start = time.time()
+    try:
+        proc = subprocess.Popen(launch_command, cwd=cwd,
+                                env=process_environment(n_threads, env),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                start_new_session=True)
+    except OSError as err:
+        log_stream.write("{}{}\n".format(prefix, err))
+        if log_file is not None:
+            log_stream.close()
+        return ProcessResult(command, 127, time.time() - time_start)
+
+    if set_affinity:
+        # without taskset, pin the process right after it started
+        try:
+            os.sched_setaffinity(proc.pid, sorted(cpu_list))
+        except OSError:
+            pass
+
+    reader = threading.Thread(target=_stream_output,
+                              args=(proc.stdout, log_stream, prefix))
+    reader.daemon = True
+    reader.start()
+
+    timed_out = False
+    try:
+        returncode = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        returncode = proc.wait()
+    reader.join()
+    if log_file is not None:
+        log_stream.close()
+    return ProcessResult(command, returncode, time.time() - time_start,
+                         timed_out)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+    This module is a content-addressed cache of the stage outputs (hydro
+    results with the freeze-out surface, particle lists). An output is
+    stored under the hash of its effective inputs,
+
+        {cache_folder}/{stage}/{key[:2]}/{key}/artifact
+        {cache_folder}/{stage}/{key[:2]}/{key}/inputs.json
+
+    where the inputs are the digests of the parameter files of the stage,
+    the hashes of the upstream outputs (initial condition, hydro key) and
+    the random seed. A later run with the same inputs, in the same or in
+    another campaign, copies the artifact instead of running the stage.
+    The parameter files are compared by their key-value pairs, so the
+    order of the lines and the comments do not matter.
+
+    The cache is not trimmed by the jobs, it grows with every new output.
+
+    Usage: result_cache.py cache_folder [size_GB]
+    lists the entries of the cache, or removes the least recently used
+    entries until the cache is smaller than size_GB.
+"""
+
+from os import path, makedirs, rename, getpid, utime, listdir, stat, walk
+import hashlib
+import json
+import shutil
+import sys
+import time
+
+# bytes read at a time when hashing a file
+hash_block_size = 1 << 20
+
+
+def file_digest(file_path):
+    """This function returns the sha256 of the content of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(hash_block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# digests of the folders hashed by this process, keyed by the state of
+# their files, so that the EOS tables are only read once per job
+folder_digests = {}
+
+
+def folder_digest(folder_path):
+    """This function returns the sha256 of the names and the contents of
+       all the files in a folder (following the symbolic links)
+    """
+    file_list = []
+    for dir_path, dir_list, file_names in walk(folder_path, followlinks=True):
+        dir_list.sort()
+        for file_name in sorted(file_names):
+            file_path = path.join(dir_path, file_name)
+            file_stat = stat(file_path)
+            file_list.append((path.relpath(file_path, folder_path),
+                              file_stat.st_size, file_stat.st_mtime))
+    state = (path.realpath(folder_path), tuple(file_list))
+    if state not in folder_digests:
+        digest = hashlib.sha256()
+        for file_name, _, _ in file_list:
+            digest.update(file_name.encode())
+            digest.update(file_digest(path.join(folder_path,
+                                                file_name)).encode())
+        folder_digests[state] = digest.hexdigest()
+    return folder_digests[state]
+
+
+def read_parameter_file(file_path):
+    """This function returns the sorted (key, value) pairs of a parameter
+       file written by parameters_dict_master.py ("key value" or
+       "key = value" lines, "[section]" headers)
+    """
+    parameter_list = []
+    section = ""
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line == "" or line in ("EndOfData", "EndOfFile"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1] + "."
+                continue
+            key_value = line.split("=", 1) if "=" in line else line.split(
+                None, 1)
+            value = key_value[1].strip() if len(key_value) > 1 else ""
+            parameter_list.append((section + key_value[0].strip(), value))
+    return sorted(parameter_list)
+
+
+def parameter_digest(file_path):
+    """This function returns the sha256 of the parameters in a file"""
+    return hashlib.sha256(json.dumps(
+        read_parameter_file(file_path)).encode()).hexdigest()
+
+
+def input_key(inputs):
+    """This function returns the cache key of a dictionary of inputs"""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()
+                          ).hexdigest()
+
+
+class ResultCache:
+    """This class stores and fetches the stage outputs by their key"""
+
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+        makedirs(self.cache_folder, exist_ok=True)
+
+    def entry_path(self, stage_name, key):
+        """Returns the folder of a cache entry"""
+        return path.join(self.cache_folder, stage_name, key[:2], key)
+
+    def contains(self, stage_name, key):
+        """Returns whether the cache has the output"""
+        return path.exists(path.join(self.entry_path(stage_name, key),
+                                     "artifact"))
+
+    def fetch(self, stage_name, key, destination):
+        """Copies the cached output to destination (a file or a folder).
+           It returns False if the output is not in the cache.
+        """
+        artifact = path.join(self.entry_path(stage_name, key), "artifact")
+        if not path.exists(artifact):
+            return False
+        print("\U0001F5C3  reuse the {} output {} from {}".format(
+            stage_name, key[:12], self.cache_folder), flush=True)
+        destination_tmp = "{}.{}.tmp".format(destination, getpid())
+        if path.isdir(artifact):
+            shutil.copytree(artifact, destination_tmp, symlinks=True)
+        else:
+            shutil.copy(artifact, destination_tmp)
+        rename(destination_tmp, destination)
+        utime(path.join(self.entry_path(stage_name, key), "inputs.json"))
+        return True
+
+    def store(self, stage_name, key, source, inputs):
+        """Copies the output source (a file or a folder) into the cache.
+           An entry is never changed once it is in the cache.
+        """
+        entry = self.entry_path(stage_name, key)
+        if path.exists(entry):
+            return
+        entry_tmp = "{}.{}.tmp".format(entry, getpid())
+        makedirs(entry_tmp)
+        if path.isdir(source):
+            shutil.copytree(source, path.join(entry_tmp, "artifact"),
+                            symlinks=True)
+        else:
+            shutil.copy(source, path.join(entry_tmp, "artifact"))
+        with open(path.join(entry_tmp, "inputs.json"), "w") as f:
+            json.dump({'stage': stage_name, 'key': key, 'inputs': inputs},
+                      f, indent=1, sort_keys=True)
+        try:
+            rename(entry_tmp, entry)
+        except OSError:
+            # another job stored the same output first
+            shutil.rmtree(entry_tmp, ignore_errors=True)
+            return
+        print("\U0001F5C3  stored the {} output {} in {}".format(
+            stage_name, key[:12], self.cache_folder), flush=True)
+
+    def entries(self):
+        """Returns the list of (stage, key) of the cache"""
+        entry_list = []
+        for stage_name in sorted(listdir(self.cache_folder)):
+            stage_folder = path.join(self.cache_folder, stage_name)
+            if not path.isdir(stage_folder):
+                continue
+            for prefix in sorted(listdir(stage_folder)):
+                for key in sorted(listdir(path.join(stage_folder, prefix))):
+                    if not key.endswith(".tmp"):
+                        entry_list.append((stage_name, key))
+        return entry_list
+
+    def entry_size(self, stage_name, key):
+        """Returns the size of a cache entry in bytes"""
+        size = 0
+        for dir_path, _, file_names in walk(self.entry_path(stage_name,
+                                                            key)):
+            for file_name in file_names:
+                size += stat(path.join(dir_path, file_name)).st_size
+        return size
+
+    def prune(self, size_gb, min_age=3600.):
+        """Removes the least recently used entries until the cache is
+           smaller than size_gb. The entries used within min_age seconds
+           are kept, because a job may be copying them. It returns the
+           number of removed entries.
+        """
+        entry_list = []
+        for stage_name, key in self.entries():
+            last_use = stat(path.join(self.entry_path(stage_name, key),
+                                      "inputs.json")).st_mtime
+            entry_list.append((last_use, self.entry_size(stage_name, key),
+                               stage_name, key))
+        entry_list.sort()
+        total_size = sum([size for _, size, _, _ in entry_list])
+        size_cap = float(size_gb)*1024**3
+        now = time.time()
+        n_removed = 0
+        for last_use, size, stage_name, key in entry_list:
+            if total_size <= size_cap:
+                break
+            if now - last_use < min_age:
+                continue
+            # rename first, so that no job fetches a half removed entry
+            entry = self.entry_path(stage_name, key)
+            entry_tmp = "{}.{}.tmp".format(entry, getpid())
+            try:
+                rename(entry, entry_tmp)
+            except OSError:
+                continue
+            shutil.rmtree(entry_tmp, ignore_errors=True)
+            total_size -= size
+            n_removed += 1
+        return n_removed
+
+
+if __name__ == "__main__":
+    try:
+        CACHE_FOLDER = sys.argv[1]
+        SIZE_GB = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    except (IndexError, ValueError):
+        print("Usage: {} cache_folder [size_GB]".format(sys.argv[0]))
+        exit(1)
+    CACHE = ResultCache(CACHE_FOLDER)
+    if SIZE_GB is not None:
+        print("removed {} entries".format(CACHE.prune(SIZE_GB)))
+    else:
+        for STAGE_NAME, KEY in CACHE.entries():
+            print(STAGE_NAME, KEY)
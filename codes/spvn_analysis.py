@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+    This script is a vectorized NumPy engine for the single particle
+    spectra and flow analysis (spvn) of the hadronic afterburner toolkit.
+    It reads the zipped binary particle list once, in chunks of events, and
+    fills all the species and rapidity windows in the same pass with
+    np.bincount. The outputs have the names and column layout of the
+    toolkit outputs,
+
+        particle_{pid}_vndata_diff_{y,eta}_{min}_{max}.dat
+            pT  pT_err  dN/(2pi dy pT dpT)  err  (vn_real  err  vn_imag  err)
+        particle_{pid}_vndata_{y,eta}_{min}_{max}.dat
+            n  vn_real  err  vn_imag  err   (the n = 0 row holds dN/dy)
+        particle_9999_dNdeta_pT_{min}_{max}.dat
+            eta  dN/deta  err  (vn_real  err  vn_imag  err)
+
+    where pid = 9999 stands for all charged hadrons. It is selected with
+    hadronic_afterburner_toolkit_dict['analysis_backend'] = "numpy".
+
+    The accumulated sums are additive, so the particle lists of the
+    oversampled UrQMD events can be analyzed separately and their analysis
+    states (.npz) merged in any order into the result of the combined list.
+
+    The events of an indexed particle list (particle_list.h5) are split
+    across n_workers processes.
+
+    Usage: spvn_analysis.py particle_list.{gz,h5} results_folder
+                            [parameters.dat [n_workers]]
+           spvn_analysis.py accumulate particle_list.gz state.npz
+                            [parameters.dat]
+           spvn_analysis.py merge results_folder state_1.npz [state_2.npz ...]
+"""
+
+from os import path, makedirs, replace
+from multiprocessing import Pool
+import sys
+import numpy as np
+
+from particle_list_reader import (iterate_event_chunks, count_events,
+                                  is_indexed_particle_list)
+
+# analysis parameters used when they are not in parameters.dat
+default_parameters = {
+    'order_max': 9,
+    'npT': 41,
+    'pT_min': 0.05,
+    'pT_max': 4.05,
+    'rap_min': -0.5,
+    'rap_max': 0.5,
+    'rap_type': 1,
+    'n_rap': 141,
+    'rapidity_dis_min': -7.0,
+    'rapidity_dis_max': 7.0,
+    'vn_rapidity_dis_pT_min': 0.20,
+    'vn_rapidity_dis_pT_max': 3.0,
+}
+
+# identified particles analyzed in the [rap_min, rap_max] window
+identified_particle_list = [
+    211, -211, 321, -321, 2212, -2212, 3122, -3122, 3312, -3312, 3334, -3334,
+    333
+]
+
+# Monte-Carlo numbers of the charged hadrons (and their anti-particles)
+charged_hadron_list = [211, 321, 2212, 3222, 3112, 3312, 3334]
+
+# pseudo-rapidity windows for the charged hadrons
+charged_hadron_window_list = [(-0.5, 0.5), (0.5, 2.0), (-2.0, 2.0)]
+
+events_per_chunk = 200
+
+
+def read_parameters(parameter_file=None):
+    """This function reads the toolkit parameters.dat (key = value)"""
+    parameters = dict(default_parameters)
+    if parameter_file is None or not path.isfile(parameter_file):
+        return parameters
+    with open(parameter_file, "r") as f:
+        for line in f:
+            key_value = line.split("#")[0].split("=")
+            if len(key_value) != 2:
+                continue
+            key_name = key_value[0].strip()
+            try:
+                value = float(key_value[1])
+            except ValueError:
+                continue
+            if value == int(value) and "." not in key_value[1]:
+                value = int(value)
+            parameters[key_name] = value
+    return parameters
+
+
+class FlowAccumulator:
+    """This class accumulates the particle number, the pT moments, and the
+       Qn vectors (with their squares for the errors) in n_groups x n_bins
+       bins
+    """
+
+    def __init__(self, n_groups, n_bins, order_max):
+        self.n_groups = n_groups
+        self.n_bins = n_bins
+        self.n_orders = order_max - 1
+        # N, sum pT, sum pT^2, then cos, sin, cos^2, sin^2 for each order
+        self.data = np.zeros((3 + 4*self.n_orders, n_groups*n_bins))
+
+    def fill(self, group_idx, bin_idx, pT, phi):
+        """Adds the particles to the bins (group_idx, bin_idx)"""
+        if len(pT) == 0:
+            return
+        idx = group_idx*self.n_bins + bin_idx
+        n_total = self.n_groups*self.n_bins
+        self.data[0] += np.bincount(idx, minlength=n_total)
+        self.data[1] += np.bincount(idx, pT, minlength=n_total)
+        self.data[2] += np.bincount(idx, pT*pT, minlength=n_total)
+        qn = np.cumprod(np.tile(np.exp(1j*phi), (self.n_orders, 1)), axis=0)
+        for iorder in range(self.n_orders):
+            offset = 3 + 4*iorder
+            cos_n = qn[iorder].real
+            sin_n = qn[iorder].imag
+            self.data[offset] += np.bincount(idx, cos_n, minlength=n_total)
+            self.data[offset + 1] += np.bincount(idx, sin_n,
+                                                 minlength=n_total)
+            self.data[offset + 2] += np.bincount(idx, cos_n*cos_n,
+                                                 minlength=n_total)
+            self.data[offset + 3] += np.bincount(idx, sin_n*sin_n,
+                                                 minlength=n_total)
+
+    def merge(self, other):
+        """Adds the data accumulated by another FlowAccumulator"""
+        if self.data.shape != other.data.shape:
+            raise ValueError(
+                "cannot merge accumulators with shapes {} and {}".format(
+                    self.data.shape, other.data.shape))
+        self.data += other.data
+        return self
+
+    def group(self, igroup):
+        """Returns the accumulated data of one group, [quantity, bin]"""
+        return self.data[:, igroup*self.n_bins:(igroup + 1)*self.n_bins]
+
+
+def _mean_and_error(sum_x, sum_x2, count):
+    """Returns the mean and its statistical error"""
+    mean = np.divide(sum_x, count, out=np.zeros_like(sum_x), where=count > 0)
+    mean_x2 = np.divide(sum_x2, count, out=np.zeros_like(sum_x2),
+                        where=count > 0)
+    error = np.divide(np.sqrt(np.maximum(mean_x2 - mean*mean, 0.)),
+                      np.sqrt(count), out=np.zeros_like(sum_x),
+                      where=count > 0)
+    return (mean, error)
+
+
+def _vn_columns(data):
+    """Returns the vn_real, err, vn_imag, err columns of the data"""
+    n_orders = (data.shape[0] - 3)//4
+    columns = []
+    for iorder in range(n_orders):
+        offset = 3 + 4*iorder
+        vn_real, vn_real_err = _mean_and_error(data[offset], data[offset + 2],
+                                               data[0])
+        vn_imag, vn_imag_err = _mean_and_error(data[offset + 1],
+                                               data[offset + 3], data[0])
+        columns += [vn_real, vn_real_err, vn_imag, vn_imag_err]
+    return columns
+
+
+def _format_range(rap_min, rap_max):
+    """Formats the window boundaries like the toolkit file names"""
+    return "{0:g}_{1:g}".format(rap_min, rap_max)
+
+
+class SpvnAnalysis:
+    """This class computes the spvn outputs from chunks of events"""
+
+    accumulator_names = ["identified", "charged", "charged_rapidity"]
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        order_max = int(parameters['order_max'])
+        self.npT = int(parameters['npT'])
+        self.dpT = (parameters['pT_max'] - parameters['pT_min'])/(self.npT - 1)
+        self.pT_low = parameters['pT_min'] - self.dpT/2.
+        self.n_rap = int(parameters['n_rap'])
+        self.drap = ((parameters['rapidity_dis_max']
+                      - parameters['rapidity_dis_min'])/(self.n_rap - 1))
+        self.rap_low = parameters['rapidity_dis_min'] - self.drap/2.
+        self.rap_type = "y" if int(parameters['rap_type']) == 1 else "eta"
+
+        self.species_array = np.array(sorted(identified_particle_list))
+        self.identified = FlowAccumulator(len(self.species_array), self.npT,
+                                          order_max)
+        self.charged = FlowAccumulator(len(charged_hadron_window_list),
+                                       self.npT, order_max)
+        self.charged_rapidity = FlowAccumulator(1, self.n_rap, order_max)
+        self.n_events = 0
+
+    def add_chunk(self, particles, event_offsets):
+        """Analyzes one chunk of events from the particle list reader"""
+        self.n_events += len(event_offsets) - 1
+        pid = particles["pid"]
+        momentum = particles["p"].astype(np.float64)
+        energy, px, py, pz = momentum.T
+        pT = np.sqrt(px*px + py*py)
+        phi = np.arctan2(py, px)
+        p_mag = np.sqrt(pT*pT + pz*pz)
+        eps = 1e-15
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # unphysical particles get nan and fail all the cuts
+            rapidity = 0.5*np.log((energy + pz + eps)/(energy - pz + eps))
+            eta = 0.5*np.log((p_mag + pz + eps)/(p_mag - pz + eps))
+
+        pT_idx = np.floor((pT - self.pT_low)/self.dpT).astype(np.int64)
+        pT_valid = (pT_idx >= 0) & (pT_idx < self.npT)
+
+        # identified particles
+        species_idx = np.searchsorted(self.species_array, pid)
+        species_idx[species_idx == len(self.species_array)] = 0
+        is_identified = self.species_array[species_idx] == pid
+        rap_i = rapidity if self.rap_type == "y" else eta
+        sel = (pT_valid & is_identified
+               & (rap_i > self.parameters['rap_min'])
+               & (rap_i < self.parameters['rap_max']))
+        self.identified.fill(species_idx[sel], pT_idx[sel], pT[sel], phi[sel])
+
+        # charged hadrons in the pseudo-rapidity windows
+        is_charged = np.isin(np.abs(pid), charged_hadron_list)
+        for iwin, (eta_min, eta_max) in enumerate(charged_hadron_window_list):
+            sel = pT_valid & is_charged & (eta > eta_min) & (eta < eta_max)
+            self.charged.fill(iwin, pT_idx[sel], pT[sel], phi[sel])
+
+        # charged hadron pseudo-rapidity distribution
+        rap_idx = np.floor((eta - self.rap_low)/self.drap).astype(np.int64)
+        sel = (is_charged & (rap_idx >= 0) & (rap_idx < self.n_rap)
+               & (pT > self.parameters['vn_rapidity_dis_pT_min'])
+               & (pT < self.parameters['vn_rapidity_dis_pT_max']))
+        self.charged_rapidity.fill(0, rap_idx[sel], pT[sel], phi[sel])
+
+    def merge(self, other):
+        """Adds the events analyzed by another SpvnAnalysis with the same
+           parameters
+        """
+        for key_name in default_parameters:
+            if (float(self.parameters[key_name])
+                    != float(other.parameters[key_name])):
+                raise ValueError(
+                    "cannot merge analyses with different {}: {} "
+                    "and {}".format(key_name, self.parameters[key_name],
+                                    other.parameters[key_name]))
+        for name in self.accumulator_names:
+            getattr(self, name).merge(getattr(other, name))
+        self.n_events += other.n_events
+        return self
+
+    def save_state(self, filename):
+        """Saves the accumulated sums and the parameters into an .npz file.
+           The file is replaced atomically, so a killed job leaves either
+           the old or the new state.
+        """
+        state = {name: getattr(self, name).data
+                 for name in self.accumulator_names}
+        state['n_events'] = np.array(self.n_events)
+        state['parameter_names'] = np.array(list(default_parameters))
+        state['parameter_values'] = np.array(
+            [float(self.parameters[x]) for x in default_parameters])
+        temp_file = filename + ".tmp.npz"
+        np.savez(temp_file, **state)
+        replace(temp_file, filename)
+
+    @classmethod
+    def load_state(cls, filename):
+        """Returns the SpvnAnalysis saved in an .npz file"""
+        with np.load(filename) as state:
+            parameters = dict(default_parameters)
+            for key_name, value in zip(state['parameter_names'],
+                                       state['parameter_values']):
+                key_name = str(key_name)
+                if isinstance(default_parameters.get(key_name), int):
+                    parameters[key_name] = int(value)
+                else:
+                    parameters[key_name] = float(value)
+            analysis = cls(parameters)
+            for name in cls.accumulator_names:
+                accumulator = getattr(analysis, name)
+                if accumulator.data.shape != state[name].shape:
+                    raise ValueError("{} has a corrupted {} state".format(
+                        filename, name))
+                accumulator.data[:] = state[name]
+            analysis.n_events = int(state['n_events'])
+        return analysis
+
+    def _write_differential(self, filename, data, rap_width):
+        """Writes the pT-differential spectra and vn"""
+        mean_pT, mean_pT_err = _mean_and_error(data[1], data[2], data[0])
+        norm = (max(1, self.n_events)*2.*np.pi*np.maximum(mean_pT, 1e-15)
+                *self.dpT*rap_width)
+        dN = data[0]/norm
+        dN_err = np.sqrt(data[0])/norm
+        header = "pT(GeV)  pT_err(GeV)  dN/dypTdpT  dN/dypTdpT_err"
+        header += "  vn_real  vn_real_err  vn_imag  vn_imag_err"
+        np.savetxt(filename,
+                   np.array([mean_pT, mean_pT_err, dN, dN_err]
+                            + _vn_columns(data)).transpose(),
+                   fmt="%.6e", delimiter="  ", header=header)
+
+    def _write_integrated(self, filename, data, rap_width):
+        """Writes the pT-integrated yield and vn"""
+        data = data.sum(axis=1, keepdims=True)
+        n_orders = (data.shape[0] - 3)//4
+        nev = max(1, self.n_events)
+        output = [[0, data[0, 0]/(nev*rap_width),
+                   np.sqrt(data[0, 0])/(nev*rap_width), 0., 0.]]
+        vn_list = _vn_columns(data)
+        for iorder in range(n_orders):
+            output.append([iorder + 1]
+                          + [x[0] for x in vn_list[4*iorder:4*iorder + 4]])
+        np.savetxt(filename, np.array(output), fmt="%d" + "  %.6e"*4,
+                   header="n  vn_real  vn_real_err  vn_imag  vn_imag_err")
+
+    def _write_rapidity(self, filename, data):
+        """Writes the charged hadron pseudo-rapidity distribution"""
+        rap_array = self.rap_low + (np.arange(self.n_rap) + 0.5)*self.drap
+        norm = max(1, self.n_events)*self.drap
+        header = "eta  dN/deta  dN/deta_err"
+        header += "  vn_real  vn_real_err  vn_imag  vn_imag_err"
+        np.savetxt(filename,
+                   np.array([rap_array, data[0]/norm, np.sqrt(data[0])/norm]
+                            + _vn_columns(data)).transpose(),
+                   fmt="%.6e", delimiter="  ", header=header)
+
+    def write_results(self, results_folder):
+        """Writes all the outputs into results_folder"""
+        makedirs(results_folder, exist_ok=True)
+        rap_window = _format_range(self.parameters['rap_min'],
+                                   self.parameters['rap_max'])
+        rap_width = self.parameters['rap_max'] - self.parameters['rap_min']
+        for ispecies, pid in enumerate(self.species_array):
+            data = self.identified.group(ispecies)
+            self._write_differential(
+                path.join(results_folder,
+                          "particle_{0}_vndata_diff_{1}_{2}.dat".format(
+                              pid, self.rap_type, rap_window)),
+                data, rap_width)
+            self._write_integrated(
+                path.join(results_folder,
+                          "particle_{0}_vndata_{1}_{2}.dat".format(
+                              pid, self.rap_type, rap_window)),
+                data, rap_width)
+        for iwin, (eta_min, eta_max) in enumerate(charged_hadron_window_list):
+            data = self.charged.group(iwin)
+            eta_window = _format_range(eta_min, eta_max)
+            self._write_differential(
+                path.join(results_folder,
+                          "particle_9999_vndata_diff_eta_{}.dat".format(
+                              eta_window)),
+                data, eta_max - eta_min)
+            self._write_integrated(
+                path.join(results_folder,
+                          "particle_9999_vndata_eta_{}.dat".format(
+                              eta_window)),
+                data, eta_max - eta_min)
+        self._write_rapidity(
+            path.join(results_folder,
+                      "particle_9999_dNdeta_pT_{}.dat".format(
+                          _format_range(
+                              self.parameters['vn_rapidity_dis_pT_min'],
+                              self.parameters['vn_rapidity_dis_pT_max']))),
+            self.charged_rapidity.group(0))
+
+
+def accumulate_particle_list(particle_list, parameters=None,
+                             chunk_size=events_per_chunk, event_range=None):
+    """This function analyzes the particle list, or the events in
+       event_range = (start, stop), and returns the SpvnAnalysis with the
+       accumulated sums
+    """
+    if parameters is None:
+        parameters = dict(default_parameters)
+    analysis = SpvnAnalysis(parameters)
+    for particles, event_offsets in iterate_event_chunks(
+            particle_list, chunk_size, event_range):
+        analysis.add_chunk(particles, event_offsets)
+    return analysis
+
+
+def _accumulate_particle_list_star(args):
+    return accumulate_particle_list(*args)
+
+
+def accumulate_in_parallel(particle_list, parameters=None, n_workers=1,
+                           chunk_size=events_per_chunk):
+    """This function splits the events of an indexed particle list into
+       n_workers ranges, analyzes them in a process pool, and returns the
+       merged SpvnAnalysis. A zipped list is analyzed serially.
+    """
+    if n_workers <= 1 or not is_indexed_particle_list(particle_list):
+        return accumulate_particle_list(particle_list, parameters,
+                                        chunk_size)
+    n_events = count_events(particle_list)[0]
+    n_workers = max(1, min(n_workers, n_events))
+    bounds = np.linspace(0, n_events, n_workers + 1).astype(int)
+    with Pool(processes=n_workers) as pool:
+        analysis_list = pool.map(
+            _accumulate_particle_list_star,
+            [(particle_list, parameters, chunk_size,
+              (bounds[i], bounds[i + 1])) for i in range(n_workers)])
+    analysis = analysis_list[0]
+    for analysis_i in analysis_list[1:]:
+        analysis.merge(analysis_i)
+    return analysis
+
+
+def merge_analysis_states(state_file_list):
+    """This function merges the saved analysis states and returns the
+       combined SpvnAnalysis
+    """
+    analysis = SpvnAnalysis.load_state(state_file_list[0])
+    for state_file in state_file_list[1:]:
+        analysis.merge(SpvnAnalysis.load_state(state_file))
+    return analysis
+
+
+def analyze_particle_list(particle_list, results_folder, parameters=None,
+                          chunk_size=events_per_chunk, n_workers=1):
+    """This function runs the spvn analysis over the particle list and
+       returns the number of analyzed events
+    """
+    analysis = accumulate_in_parallel(particle_list, parameters, n_workers,
+                                      chunk_size)
+    analysis.write_results(results_folder)
+    return analysis.n_events
+
+
+def print_usage():
+    """This function prints the command line usage"""
+    print("Usage: {0} particle_list.{{gz,h5}} results_folder "
+          "[parameters.dat [n_workers]]\n"
+          "       {0} accumulate particle_list.gz state.npz "
+          "[parameters.dat]\n"
+          "       {0} merge results_folder state_1.npz "
+          "[state_2.npz ...]".format(sys.argv[0]))
+
+
+if __name__ == "__main__":
+    MODE = sys.argv[1] if len(sys.argv) > 1 else ""
+    if MODE == "accumulate" and len(sys.argv) > 3:
+        PARAMETER_FILE = sys.argv[4] if len(sys.argv) > 4 else None
+        ANALYSIS = accumulate_particle_list(sys.argv[2],
+                                            read_parameters(PARAMETER_FILE))
+        ANALYSIS.save_state(sys.argv[3])
+        print("\U0001F3CD  accumulated {} events from {}".format(
+            ANALYSIS.n_events, sys.argv[2]),
+              flush=True)
+    elif MODE == "merge" and len(sys.argv) > 3:
+        ANALYSIS = merge_analysis_states(sys.argv[3:])
+        ANALYSIS.write_results(sys.argv[2])
+        print("\U0001F3CD  merged {} events from {} states".format(
+            ANALYSIS.n_events, len(sys.argv) - 3),
+              flush=True)
+    elif len(sys.argv) > 2 and MODE not in ["accumulate", "merge"]:
+        PARAMETER_FILE = sys.argv[3] if len(sys.argv) > 3 else None
+        N_WORKERS = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        NEV = analyze_particle_list(sys.argv[1], sys.argv[2],
+                                    read_parameters(PARAMETER_FILE),
+                                    n_workers=N_WORKERS)
+        print("\U0001F3CD  analyzed {} events from {}".format(
+            NEV, sys.argv[1]),
+              flush=True)
+    else:
+        print_usage()
+        exit(1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+    This module models the strong scaling of the OpenMP stages (IPGlasma,
+    KoMPoST, MUSIC) and splits the cores of a job between the MUSIC team
+    and the UrQMD workers.
+
+    The scaling is read from a calibration file with one measurement per
+    line,
+
+        # stage  n_threads  wall_time[s]
+        hydro    1          1200.
+        hydro    8          190.
+
+    and fitted with Amdahl's law, T(n) = T(1)*(f + (1 - f)/n), where f is
+    the serial fraction. The driver appends its own measurements to the
+    file, so the calibration improves with every job. The fit needs two
+    different thread counts, so a job runs a stage with a thread count
+    that is not in the file yet until there are two of them, and then
+    still explores another thread count once in a while.
+"""
+
+from os import path
+import random
+
+# serial fractions used before any measurement is available
+default_serial_fraction = {
+    'ipglasma': 0.05,
+    'kompost': 0.10,
+    'hydro': 0.08,
+}
+
+# OpenMP stages whose thread count is chosen from the scaling model
+openmp_stage_list = ['ipglasma', 'kompost', 'hydro']
+
+# probability to explore another thread count once the fit is possible
+default_exploration_rate = 0.1
+
+
+def read_calibration(calibration_file):
+    """This function reads the calibration file and returns a dictionary
+       {stage: [(n_threads, wall_time), ...]}
+    """
+    calibration = {}
+    if calibration_file is None or not path.isfile(calibration_file):
+        return calibration
+    with open(calibration_file, "r") as f:
+        for line in f:
+            line = line.split("#")[0].split()
+            if len(line) < 3:
+                continue
+            calibration.setdefault(line[0], []).append(
+                (int(line[1]), float(line[2])))
+    return calibration
+
+
+def record_stage_timing(calibration_file, stage_name, n_threads, wall_time):
+    """This function appends one measurement to the calibration file"""
+    new_file = not path.isfile(calibration_file)
+    with open(calibration_file, "a") as f:
+        if new_file:
+            f.write("# stage  n_threads  wall_time[s]\n")
+        f.write("{}  {:d}  {:.3f}\n".format(stage_name, n_threads, wall_time))
+
+
+def fit_serial_fraction(measurements, default=0.1):
+    """This function fits the serial fraction of Amdahl's law to the
+       measurements [(n_threads, wall_time), ...]
+    """
+    # T(n) = a + b/n is linear in (a, b); f = a/(a + b)
+    points = [(1./n, t) for n, t in measurements if n > 0 and t > 0]
+    if len(set([x for x, _ in points])) < 2:
+        return default
+    n_points = float(len(points))
+    x_mean = sum([x for x, _ in points])/n_points
+    t_mean = sum([t for _, t in points])/n_points
+    sxx = sum([(x - x_mean)**2 for x, _ in points])
+    sxt = sum([(x - x_mean)*(t - t_mean) for x, t in points])
+    b = sxt/sxx
+    a = t_mean - b*x_mean
+    if b <= 0.:
+        return 1.
+    return min(1., max(0., a/(a + b)))
+
+
+def parallel_efficiency(serial_fraction, n_threads):
+    """This function returns the Amdahl parallel efficiency"""
+    return 1./(n_threads*serial_fraction + (1. - serial_fraction))
+
+
+def choose_stage_threads(n_cores, serial_fraction, efficiency_min=0.6):
+    """This function returns the largest thread count up to n_cores that
+       keeps the parallel efficiency above efficiency_min
+    """
+    n_threads = 1
+    for n_i in range(1, n_cores + 1):
+        if parallel_efficiency(serial_fraction, n_i) >= efficiency_min:
+            n_threads = n_i
+    return n_threads
+
+
+def explore_stage_threads(n_threads, n_cores, measurements,
+                          exploration_rate=default_exploration_rate,
+                          rng=random):
+    """This function returns the thread count to run a stage with. It is
+       n_threads, unless the measurements have less than two different
+       thread counts (or with the probability exploration_rate), where it
+       is a thread count up to n_cores that is not measured yet.
+    """
+    n_measured = set([n for n, _ in measurements])
+    if len(n_measured) >= 2 and rng.random() >= exploration_rate:
+        return n_threads
+    candidate_list = [n_i for n_i in range(1, n_cores + 1)
+                      if n_i not in n_measured]
+    if not candidate_list or (n_threads in candidate_list
+                              and len(n_measured) < 2):
+        # the first measurement uses the model's thread count
+        return n_threads
+    return rng.choice(candidate_list)
+
+
+def plan_core_split(n_cores, n_urqmd, calibration_file=None,
+                    efficiency_min=0.6,
+                    exploration_rate=default_exploration_rate):
+    """This function splits n_cores between the stages of one job
+
+       It returns a dictionary with the thread counts of the OpenMP stages,
+       the number of concurrent UrQMD workers, and whether the afterburner
+       of one event should overlap with the hydro of the next event. The
+       overlap is used when the MUSIC team leaves idle cores behind. The
+       stages that run with a thread count other than the model's choice
+       to improve the calibration are listed in plan['explored'].
+    """
+    n_cores = max(1, n_cores)
+    calibration = read_calibration(calibration_file)
+    plan = {'explored': []}
+    for stage_name in openmp_stage_list:
+        measurements = calibration.get(stage_name, [])
+        serial_fraction = fit_serial_fraction(
+            measurements, default_serial_fraction[stage_name])
+        n_threads = choose_stage_threads(n_cores, serial_fraction,
+                                         efficiency_min)
+        plan[stage_name] = n_threads
+        if calibration_file is not None:
+            plan[stage_name] = explore_stage_threads(
+                n_threads, n_cores, measurements, exploration_rate)
+        if plan[stage_name] != n_threads:
+            plan['explored'].append(stage_name)
+    n_idle = n_cores - plan['hydro']
+    plan['overlap'] = n_idle > 0 and n_urqmd > 0
+    if plan['overlap']:
+        plan['urqmd_workers'] = max(1, min(n_urqmd, n_idle))
+    else:
+        plan['urqmd_workers'] = max(1, min(n_urqmd, n_cores))
+    return plan
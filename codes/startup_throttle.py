@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+    This module limits the number of processes that start up at the same
+    time, e.g. the IPGlasma or MUSIC instances of many jobs loading their
+    tables from a shared filesystem. It is a semaphore made of lock files
+    slot_{i}.lock in a folder that all the jobs can see. A process takes a
+    free slot (created atomically with O_EXCL), keeps it for hold_time
+    seconds, until it reports that its start-up is over, or until it
+    finishes, whichever is shorter, and removes it.
+    Slots older than stale_time are taken over, so a killed job does not
+    block the others. Every lock file holds the token of the process that
+    took the slot, and a process only removes its own lock file.
+
+        throttle = StartupThrottle("../startup_locks", n_slots=8,
+                                   hold_time=60.)
+        with throttle.slot():
+            run_process(["./ipglasma", "input"])
+
+    Usage: startup_throttle.py lock_folder n_slots hold_time command ...
+    runs the command after it gets a slot.
+           startup_throttle.py check [n_processes] [n_slots]
+    checks the throttle with dummy processes in a temporary folder.
+"""
+
+from os import path, makedirs, remove, getpid
+from contextlib import contextmanager
+from multiprocessing import Pool
+import errno
+import os
+import socket
+import subprocess
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+class StartupThrottle:
+    """This class is a lock-file semaphore with n_slots slots"""
+
+    def __init__(self, lock_folder, n_slots, hold_time=60., poll_interval=1.,
+                 stale_time=None):
+        self.lock_folder = lock_folder
+        self.n_slots = max(1, int(n_slots))
+        self.hold_time = float(hold_time)
+        self.poll_interval = float(poll_interval)
+        self.stale_time = stale_time
+        if self.stale_time is None:
+            self.stale_time = 2.*self.hold_time + 60.
+        makedirs(self.lock_folder, exist_ok=True)
+        # token of every slot held by this process
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+
+    def __getstate__(self):
+        # the slots held by this process stay with it
+        state = dict(self.__dict__)
+        state['tokens'] = {}
+        del state['tokens_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tokens_lock = threading.Lock()
+
+    def _lock_file(self, islot):
+        return path.join(self.lock_folder, "slot_{}.lock".format(islot))
+
+    def _try_slot(self, islot):
+        """Creates the lock file of the slot and returns True if it was
+           free
+        """
+        lock_file = self._lock_file(islot)
+        try:
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+            self._remove_if_stale(lock_file)
+            return False
+        token = "{} {} {} {}\n".format(socket.gethostname(), getpid(),
+                                       time.time(), uuid.uuid4().hex)
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        with self.tokens_lock:
+            self.tokens[islot] = token
+        return True
+
+    def _remove_if_stale(self, lock_file):
+        """Removes a lock file that was not released in time"""
+        try:
+            if time.time() - path.getmtime(lock_file) > self.stale_time:
+                remove(lock_file)
+        except OSError:
+            pass
+
+    def acquire(self, timeout=None):
+        """Waits for a free slot and returns its index, or None if the
+           timeout (seconds) is reached
+        """
+        time_start = time.time()
+        while True:
+            for islot in range(self.n_slots):
+                if self._try_slot(islot):
+                    return islot
+            if timeout is not None and time.time() - time_start > timeout:
+                return None
+            time.sleep(self.poll_interval)
+
+    def release(self, islot, token=None):
+        """Frees the slot taken with the given token (by default the
+           current one). Nothing happens if the slot was already released,
+           or taken over by another process after it became stale.
+        """
+        with self.tokens_lock:
+            if token is None:
+                token = self.tokens.get(islot)
+            if token is None or self.tokens.get(islot) != token:
+                return
+            del self.tokens[islot]
+        lock_file = self._lock_file(islot)
+        try:
+            with open(lock_file, "r") as f:
+                if f.read() != token:
+                    return
+            remove(lock_file)
+        except OSError:
+            pass
+
+    def _hold(self, islot, token, ready, done):
+        """Releases the slot after hold_time seconds, as soon as ready()
+           returns True, or when done is set
+        """
+        time_end = time.time() + self.hold_time
+        while not done.wait(min(self.poll_interval,
+                                max(0., time_end - time.time()))):
+            if time.time() >= time_end or (ready is not None and ready()):
+                break
+        self.release(islot, token)
+
+    @contextmanager
+    def slot(self, timeout=None, ready=None):
+        """Holds a slot for hold_time seconds, until ready() returns True
+           (e.g. the process has loaded its tables), or until the block
+           ends. The block runs without a slot if the timeout is reached.
+        """
+        time_start = time.time()
+        islot = self.acquire(timeout)
+        if islot is None:
+            print("\U000026A0  no start-up slot in {} after {:.0f} s, "
+                  "start anyway".format(self.lock_folder, timeout),
+                  flush=True)
+            yield None
+            return
+        token = self.tokens[islot]
+        done = threading.Event()
+        holder = threading.Thread(target=self._hold,
+                                  args=(islot, token, ready, done))
+        holder.daemon = True
+        holder.start()
+        try:
+            yield time.time() - time_start
+        finally:
+            done.set()
+            self.release(islot, token)
+
+
+def _check_worker(args):
+    """Holds a slot of the throttle and returns the time interval"""
+    lock_folder, n_slots, hold_time = args
+    throttle = StartupThrottle(lock_folder, n_slots, hold_time,
+                               poll_interval=0.01)
+    with throttle.slot():
+        time_start = time.time()
+        time.sleep(hold_time)
+        return (time_start, time.time())
+
+
+def check_throttle(n_processes=8, n_slots=2, hold_time=0.2):
+    """This function runs n_processes dummy processes through a throttle
+       with n_slots slots and returns the maximum number of processes that
+       held a slot at the same time
+    """
+    lock_folder = tempfile.mkdtemp(prefix="iebe_throttle_")
+    try:
+        with Pool(processes=n_processes) as pool:
+            interval_list = pool.map(
+                _check_worker,
+                [(lock_folder, n_slots, hold_time)]*n_processes)
+    finally:
+        shutil.rmtree(lock_folder, ignore_errors=True)
+    # a slot is released slightly before the next one is taken, so count
+    # the overlaps away from the interval edges
+    margin = 0.1*hold_time
+    return max([
+        sum([1 for start_j, end_j in interval_list
+             if start_j < start_i + margin < end_j])
+        for start_i, _ in interval_list
+    ])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        N_PROCESSES = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+        N_SLOTS = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+        N_MAX = check_throttle(N_PROCESSES, N_SLOTS)
+        print("{} processes, {} slots: at most {} at the same time".format(
+            N_PROCESSES, N_SLOTS, N_MAX))
+        exit(0 if N_MAX <= N_SLOTS else 1)
+    try:
+        LOCK_FOLDER = sys.argv[1]
+        N_SLOTS = int(sys.argv[2])
+        HOLD_TIME = float(sys.argv[3])
+        COMMAND = sys.argv[4:]
+        if not COMMAND:
+            raise IndexError
+    except (IndexError, ValueError):
+        print("Usage: {0} lock_folder n_slots hold_time command ...\n"
+              "       {0} check [n_processes] [n_slots]".format(sys.argv[0]))
+        exit(1)
+    with StartupThrottle(LOCK_FOLDER, N_SLOTS, HOLD_TIME).slot():
+        exit(subprocess.call(COMMAND))
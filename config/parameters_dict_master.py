@@ -17,6 +17,19 @@ control_dict = {
     'save_kompost_results': False,    # flag to save kompost results
     'save_hydro_surfaces': False,     # flag to save hydro surfaces
     'save_UrQMD_files': False,        # flag to save UrQMD files
+    'shared_iSS_sampling': False,     # run iSS once per hydro event for all
+                                      # the oversampled UrQMD events
+    'particle_list_format': "gz",     # gz: zipped binary particle list
+                                      # h5: indexed hdf5 container with
+                                      #     random access to every event
+    # centrality pre-selection before hydro (self-generated initial
+    # conditions are re-sampled, pre-generated ones are discarded)
+    'ic_preselection_estimator': "none",  # none; b, Npart, Ncoll, n_strings,
+                                          # string_energy (3DMCGlauber);
+                                          # Npart, Ncoll, Ngluon (IPGlasma)
+    'ic_preselection_window': [0., 1e10],  # keep min <= estimator < max
+    'ic_preselection_max_attempts': 20,    # initial conditions sampled per
+                                           # hydro event before it is skipped
 }
 
 
@@ -414,6 +427,9 @@ hadronic_afterburner_toolkit_dict = {
                         #    (without header lines)
                         # 4: reads outputs from UrQMD 3.3p2 outputs
                         # 10: reads outputf from gzip outputs
+    'analysis_backend': "toolkit",      # engine for the spvn analysis
+                                        # toolkit: hadronic_afterburner_tools.e
+                                        # numpy: codes/spvn_analysis.py
     'analyze_flow': 1,                  # 0/1: flag to perform flow analysis
     'analyze_HBT': 0,                   # 0/1: flag to perform HBT analysis
     'analyze_balance_function': 0,      # 0/1: flag to analyze Balance function
@@ -507,6 +523,12 @@ Parameters_list = [
     (hadronic_afterburner_toolkit_dict, "parameters.dat", 1)
 ]
 
+# parameters used by the driver only, they are not written to the files
+driver_parameter_list = ['analysis_backend']
+
+# dictionaries with the parameters that a design point (bayes file) changes
+design_parameter_dicts = ['mcglauber_dict', 'music_dict']
+
 path_list = [
     'model_parameters/IPGlasma/',
     'model_parameters/KoMPoST/',
@@ -584,16 +606,37 @@ def update_parameters_dict(par_dict_path, ran_seed):
     hadronic_afterburner_toolkit_dict['randomSeed'] = ran_seed
 
 
-def update_parameters_bayesian(bayes_file):
-    parfile = open(bayes_file, "r")
-    for line in parfile:
-        key, val = line.split()
+def update_parameters_design_point(design_parameters):
+    """This function sets the parameters of one design point, a dictionary
+       with the keys of the bayes file
+    """
+    for key, val in design_parameters.items():
         if key in mcglauber_dict.keys():
             mcglauber_dict[key] = float(val)
         if key in music_dict.keys():
             music_dict[key] = float(val)
 
 
+def check_design_point(design_parameters):
+    """This function checks that all the parameters of a design point are
+       in the dictionaries changed by update_parameters_design_point
+    """
+    for key in design_parameters:
+        if not any([key in globals()[dict_name]
+                    for dict_name in design_parameter_dicts]):
+            print("\U0001F6AB  Unknown design parameter: {}".format(key))
+            exit(1)
+
+
+def update_parameters_bayesian(bayes_file):
+    parfile = open(bayes_file, "r")
+    design_parameters = {}
+    for line in parfile:
+        key, val = line.split()
+        design_parameters[key] = val
+    update_parameters_design_point(design_parameters)
+
+
 def output_parameters_to_files(workfolder="."):
     """This function outputs parameters in dictionaries to files"""
     workfolder = path.abspath(workfolder)
@@ -605,6 +648,8 @@ def output_parameters_to_files(workfolder="."):
             makedirs(output_folder)
         f = open(path.join(output_folder, fname), "w")
         for key_name in parameters_dict:
+            if key_name in driver_parameter_list:
+                continue
             if itype in (0, 2):
                 f.write("{parameter_name}  {parameter_value}\n".format(
                     parameter_name=key_name,
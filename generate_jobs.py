@@ -3,6 +3,8 @@
 
 import sys
 from os import path, mkdir
+import copy
+import random
 import shutil
 import subprocess
 import argparse
@@ -21,6 +23,14 @@ known_initial_types = [
     "3DMCGlauber_consttau"
 ]
 
+# python scripts copied from codes/ into every event folder
+driver_script_list = ['hydro_plus_UrQMD_driver.py', 'process_manager.py',
+                      'cpu_placement.py', 'fake_stage_engines.py',
+                      'stage_scaling.py', 'hydro_surface_archive.py',
+                      'particle_list_reader.py', 'spvn_analysis.py',
+                      'initial_condition_filter.py', 'startup_throttle.py',
+                      'ic_cache.py', 'result_cache.py']
+
 support_cluster_list = [
     'nersc', 'nerscKNL', 'wsugrid', "OSG", "local", "guillimin", "McGill", "OSC"
 ]
@@ -175,7 +185,8 @@ wait
 
 def generate_full_job_script(cluster_name, folder_name, database, initial_type,
                              n_hydro, ev0_id, n_urqmd, n_threads, walltime, ipglasma_flag,
-                             kompost_flag, hydro_flag, urqmd_flag, time_stamp):
+                             kompost_flag, hydro_flag, urqmd_flag, time_stamp,
+                             driver_options=""):
     """This function generates full job script"""
     working_folder = folder_name
     event_id = working_folder.split('/')[-1]
@@ -187,19 +198,25 @@ def generate_full_job_script(cluster_name, folder_name, database, initial_type,
     script.write("\nseed_add=${1:-0}\n")
     if cluster_name != "OSG":
         script.write("""
-python3 hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6} {7} {8} {9} $seed_add {10:s} > run.log
+python3 hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6} {7} {8} {9} $seed_add {10:s}{11:s} > run.log
 """.format(initial_type, database, n_hydro, ev0_id, n_urqmd, n_threads,
-           ipglasma_flag, kompost_flag, hydro_flag, urqmd_flag, time_stamp))
+           ipglasma_flag, kompost_flag, hydro_flag, urqmd_flag, time_stamp,
+           driver_options))
     else:
         script.write("""
-python3 hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6} {7} {8} {9} $seed_add {10:s}
+python3 hydro_plus_UrQMD_driver.py {0:s} {1:s} {2:d} {3:d} {4:d} {5:d} {6} {7} {8} {9} $seed_add {10:s}{11:s}
 """.format(initial_type, database, n_hydro, ev0_id, n_urqmd, n_threads,
-           ipglasma_flag, kompost_flag, hydro_flag, urqmd_flag, time_stamp))
+           ipglasma_flag, kompost_flag, hydro_flag, urqmd_flag, time_stamp,
+           driver_options))
     script.close()
 
 
-def generate_script_ipglasma(folder_name, nthreads, cluster_name, event_id):
-    """This function generates script for IPGlasma simulation"""
+def generate_script_ipglasma(folder_name, nthreads, cluster_name, event_id,
+                             throttled=False):
+    """This function generates script for IPGlasma simulation. Without the
+       start-up throttle of the driver, the start of the jobs is staggered
+       by sleeping event_id seconds.
+    """
     working_folder = folder_name
 
     script = open(path.join(working_folder, "run_ipglasma.sh"), "w")
@@ -220,11 +237,12 @@ rm -fr $results_folder/*
 
     if nthreads > 0:
         script.write("""
-export OMP_NUM_THREADS={0:d}
+export OMP_NUM_THREADS=${{OMP_NUM_THREADS:-{0:d}}}
 """.format(nthreads))
 
     if cluster_name != "OSG":
-        script.write("sleep {}".format(event_id))
+        if not throttled:
+            script.write("sleep {}\n".format(event_id))
         script.write("""
 # IPGlasma evolution (run 1 event)
 ./ipglasma input 1> run.log 2> run.err
@@ -238,8 +256,16 @@ export OMP_NUM_THREADS={0:d}
 for ifile in *.dat
 do
     filename=$(echo ${ifile} | sed "s/0.dat/${evid}.dat/")
-    cat ${ifile} | sed 's$N/A$0.0$g' | sed 's/Q_s/#Q_s/' > $results_folder/${filename}
-    rm -fr ${ifile}
+    case ${ifile} in
+        epsilon-u-Hydro-t*|Tmunu-t*)
+            # MUSIC and KoMPoST read these files directly
+            sed -e 's$N/A$0.0$g' -e 's/Q_s/#Q_s/' ${ifile} > $results_folder/${filename}
+            rm -fr ${ifile}
+            ;;
+        *)
+            mv ${ifile} $results_folder/${filename}
+            ;;
+    esac
 done
 mv run.log $results_folder/
 mv run.err $results_folder/
@@ -269,7 +295,7 @@ rm -fr $results_folder/*
 
     if nthreads > 0:
         script.write("""
-export OMP_NUM_THREADS={0:d}
+export OMP_NUM_THREADS=${{OMP_NUM_THREADS:-{0:d}}}
 """.format(nthreads))
 
     if cluster_name != "OSG":
@@ -310,7 +336,7 @@ rm -fr $results_folder
 
     if nthreads > 0:
         script.write("""
-export OMP_NUM_THREADS={0:d}
+export OMP_NUM_THREADS=${{OMP_NUM_THREADS:-{0:d}}}
 """.format(nthreads))
 
     if cluster_name != "OSG":
@@ -351,19 +377,24 @@ cd UrQMDev_$SubEventId
 mkdir -p UrQMD_results
 rm -fr UrQMD_results/*
 
-for iev in `ls hydro_event | grep "surface"`
+for iev in `ls hydro_event | grep "surface\|OSCAR"`
 do
     cd iSS
     mkdir -p results
     rm -fr results/*
-    mv ../hydro_event/$iev results/surface.dat
-    mv ../hydro_event/music_input results/music_input
-    if [ $SubEventId = "0" ]; then
+    if [ -f ../hydro_event/OSCAR.DAT ]; then
+        # the samples are shared from a single iSS run by the driver
+        mv ../hydro_event/OSCAR.DAT OSCAR.DAT
+    else
+        mv ../hydro_event/$iev results/surface.dat
+        mv ../hydro_event/music_input results/music_input
+        if [ $SubEventId = "0" ]; then
     """)
-    script.write("    ./iSS.e {0}".format(logfile))
+    script.write("        ./iSS.e {0}".format(logfile))
     script.write("""
-    else
-        ./iSS.e > run.log
+        else
+            ./iSS.e > run.log
+        fi
     fi
     """)
 
@@ -457,21 +488,27 @@ def generate_event_folders(initial_condition_database, initial_condition_type,
                            cluster_name, event_id, event_id_offset,
                            n_hydro_per_job, n_urqmd_per_hydro, n_threads, walltime,
                            time_stamp, ipglasma_flag, kompost_flag, hydro_flag,
-                           urqmd_flag, GMC_flag, HBT_flag, NO_COLL_flag):
-    """This function creates the event folder structure"""
+                           urqmd_flag, GMC_flag, HBT_flag, NO_COLL_flag,
+                           driver_options="", shared_sampling=False,
+                           afterburner_only=False):
+    """This function creates the event folder structure. For the
+       afterburner-only runs over archived hydro surfaces, the initial
+       condition and hydro codes are not set up.
+    """
     event_folder = path.join(working_folder, 'event_%d' % event_id)
     param_folder = path.join(working_folder, 'model_parameters')
     mkdir(event_folder)
-    shutil.copy(path.join(code_path, 'hydro_plus_UrQMD_driver.py'),
-                event_folder)
-    shutil.copy(
-        path.join(package_root_path, 'IPGlasma_database',
-                  'fetch_IPGlasma_event_from_hdf5_database.py'), event_folder)
+    for script_i in driver_script_list:
+        shutil.copy(path.join(code_path, script_i), event_folder)
+    for script_i in ['fetch_IPGlasma_event_from_hdf5_database.py',
+                     'ipglasma_ingestion.py']:
+        shutil.copy(path.join(package_root_path, 'IPGlasma_database',
+                              script_i), event_folder)
     shutil.copy(
         path.join(package_root_path, '3DMCGlauber_database',
                   'fetch_3DMCGlauber_event_from_hdf5_database.py'),
         event_folder)
-    if initial_condition_database == "self":
+    if initial_condition_database == "self" and not afterburner_only:
         if initial_condition_type in ("3DMCGlauber_dynamical",
                                       "3DMCGlauber_consttau"):
             mkdir(path.join(event_folder, '3dMCGlauber'))
@@ -485,8 +522,9 @@ def generate_event_folders(initial_condition_database, initial_condition_type,
                     path.join(event_folder, "3dMCGlauber/{}".format(link_i))),
                                 shell=True)
         elif initial_condition_type in ("IPGlasma", "IPGlasma+KoMPoST"):
-            generate_script_ipglasma(event_folder, n_threads, cluster_name,
-                                     event_id)
+            generate_script_ipglasma(
+                event_folder, n_threads, cluster_name, event_id,
+                "--startup_throttle" in driver_options)
             mkdir(path.join(event_folder, 'ipglasma'))
             shutil.copyfile(path.join(param_folder, 'IPGlasma/input'),
                             path.join(event_folder, 'ipglasma/input'))
@@ -507,9 +545,10 @@ def generate_event_folders(initial_condition_database, initial_condition_type,
                              initial_condition_database, initial_condition_type,
                              n_hydro_per_job, event_id_offset,
                              n_urqmd_per_hydro, n_threads, walltime, ipglasma_flag,
-                             kompost_flag, hydro_flag, urqmd_flag, time_stamp)
+                             kompost_flag, hydro_flag, urqmd_flag, time_stamp,
+                             driver_options)
 
-    if initial_condition_type == "IPGlasma+KoMPoST":
+    if initial_condition_type == "IPGlasma+KoMPoST" and not afterburner_only:
         generate_script_kompost(event_folder, n_threads, cluster_name)
         mkdir(path.join(event_folder, 'kompost'))
         shutil.copyfile(path.join(param_folder, 'KoMPoST/setup.ini'),
@@ -521,22 +560,28 @@ def generate_event_folders(initial_condition_database, initial_condition_type,
                 path.join(event_folder, "kompost/{}".format(link_i))),
                             shell=True)
 
-    generate_script_hydro(event_folder, n_threads, cluster_name)
+    if not afterburner_only:
+        generate_script_hydro(event_folder, n_threads, cluster_name)
 
-    shutil.copytree(path.join(code_path, 'MUSIC'),
-                    path.join(event_folder, 'MUSIC'))
-    shutil.copyfile(path.join(param_folder, 'MUSIC/music_input_mode_2'),
-                    path.join(event_folder, 'MUSIC/music_input_mode_2'))
-    for link_i in ['EOS', 'MUSIChydro']:
-        subprocess.call("ln -s {0:s} {1:s}".format(
-            path.abspath(path.join(code_path, 'MUSIC_code/{}'.format(link_i))),
-            path.join(event_folder, "MUSIC/{}".format(link_i))),
-                        shell=True)
+        shutil.copytree(path.join(code_path, 'MUSIC'),
+                        path.join(event_folder, 'MUSIC'))
+        shutil.copyfile(path.join(param_folder, 'MUSIC/music_input_mode_2'),
+                        path.join(event_folder, 'MUSIC/music_input_mode_2'))
+        for link_i in ['EOS', 'MUSIChydro']:
+            subprocess.call("ln -s {0:s} {1:s}".format(
+                path.abspath(
+                    path.join(code_path, 'MUSIC_code/{}'.format(link_i))),
+                path.join(event_folder, "MUSIC/{}".format(link_i))),
+                            shell=True)
 
     generate_script_afterburner(event_folder, cluster_name, HBT_flag, GMC_flag, NO_COLL_flag)
 
     generate_script_analyze_spvn(event_folder, cluster_name, HBT_flag)
 
+    if shared_sampling:
+        generate_shared_iss_folder(event_folder, param_folder, code_path,
+                                   n_urqmd_per_hydro)
+
     for iev in range(n_urqmd_per_hydro):
         sub_event_folder = path.join(working_folder,
                                      'event_{0:d}'.format(event_id),
@@ -596,6 +641,143 @@ def generate_event_folders(initial_condition_database, initial_condition_type,
                         shell=True)
 
 
+def generate_shared_iss_folder(event_folder, param_folder, code_path,
+                               n_urqmd_per_hydro):
+    """This function sets up the iSS run that samples the particles for all
+       the oversampled UrQMD events of a hydro event at once
+    """
+    iss_folder = path.join(event_folder, 'iSS')
+    mkdir(iss_folder)
+    with open(path.join(param_folder, 'iSS/iSS_parameters.dat'), "r") as f:
+        parameter_lines = f.readlines()
+    with open(path.join(iss_folder, 'iSS_parameters.dat'), "w") as f:
+        for line in parameter_lines:
+            key_value = line.split("=")
+            if key_value[0].strip() == 'number_of_repeated_sampling':
+                line = "number_of_repeated_sampling = {}\n".format(
+                    int(key_value[1])*n_urqmd_per_hydro)
+            f.write(line)
+    for link_i in ['iSS_tables', 'iSS.e']:
+        subprocess.call("ln -s {0:s} {1:s}".format(
+            path.abspath(path.join(code_path, 'iSS_code/{}'.format(link_i))),
+            path.join(iss_folder, link_i)),
+                        shell=True)
+
+
+def generate_jobs_in_folder(working_folder_name, initial_condition_database,
+                            initial_condition_type, parameter_dict,
+                            code_package_path, code_path, cluster_name, n_jobs,
+                            n_hydro_per_job, n_urqmd_per_hydro, n_threads,
+                            walltime, IPGlasma_time_stamp, osg_job_id,
+                            driver_options, shared_sampling, afterburner_only):
+    """This function generates the event folders of all the jobs in the
+       working folder. The event ids only depend on the job index, so all
+       the design points of a campaign get the same initial condition
+       event ids.
+    """
+    cent_label = "XXX"
+    cent_label_pre = cent_label
+    toolbar_width = 40
+    sys.stdout.write("\U0001F375  Generating {} jobs [{}]".format(
+        n_jobs, " "*toolbar_width))
+    sys.stdout.flush()
+    sys.stdout.write("\b"*(toolbar_width + 1))
+    event_id_offset = 0
+    n_hydro_rescaled = n_hydro_per_job
+
+    for iev in range(n_jobs):
+        progress_i = (int(float(iev + 1)/n_jobs*toolbar_width)
+                      - int(float(iev)/n_jobs*toolbar_width))
+        for ii in range(progress_i):
+            sys.stdout.write("#")
+            sys.stdout.flush()
+        if (initial_condition_type in ('IPGlasma', 'IPGlasma+KoMPoST')
+                and parameter_dict.ipglasma_dict['type'] == 'minimumbias'
+                and not afterburner_only):
+            precent_local = float(iev)/float(n_jobs)
+            for cen_min, cen_max, cen_label, cen_precent in centrality_list:
+                if precent_local >= cen_min and precent_local < cen_max:
+                    cent_label = cen_label
+                    rescale_factor = cen_precent/(cen_max - cen_min)
+                    n_hydro_rescaled = (max(
+                        1, int(n_hydro_per_job*rescale_factor + 0.1)))
+                    if cent_label != cent_label_pre:
+                        cent_label_pre = cent_label
+                        event_id_offset = 0
+                    break
+        if cluster_name == "OSG":
+            event_id_offset = osg_job_id
+        GMC_flag = parameter_dict.iss_dict['global_momentum_conservation']
+        NO_COLL_flag = parameter_dict.urqmd_dict['run_collisionless']
+        ipglasma_flag = False
+        if (initial_condition_type in ("IPGlasma", "IPGlasma+KoMPoST")
+                and initial_condition_database == "self"):
+            ipglasma_flag = parameter_dict.control_dict['save_ipglasma_results']
+        kompost_flag = False
+        if initial_condition_type == "IPGlasma+KoMPoST":
+            kompost_flag = parameter_dict.control_dict['save_kompost_results']
+        hydro_flag = parameter_dict.control_dict['save_hydro_surfaces']
+        urqmd_flag = parameter_dict.control_dict['save_UrQMD_files']
+        HBT_flag = False
+        if "analyze_HBT" in parameter_dict.hadronic_afterburner_toolkit_dict:
+            if parameter_dict.hadronic_afterburner_toolkit_dict[
+                    'analyze_HBT'] == 1:
+                HBT_flag = True
+        generate_event_folders(initial_condition_database.format(cent_label),
+                               initial_condition_type, code_package_path,
+                               code_path, working_folder_name, cluster_name,
+                               iev, event_id_offset, n_hydro_rescaled,
+                               n_urqmd_per_hydro, n_threads, walltime,
+                               IPGlasma_time_stamp, ipglasma_flag, kompost_flag,
+                               hydro_flag, urqmd_flag, GMC_flag, HBT_flag, NO_COLL_flag,
+                               driver_options, shared_sampling,
+                               afterburner_only)
+        event_id_offset += n_hydro_rescaled
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def read_design_matrix(design_matrix_file):
+    """This function reads a design matrix. The first line holds the
+       parameter names (the keys of the bayes file), and every following
+       row is one design point. It returns the list of parameter
+       dictionaries.
+    """
+    with open(design_matrix_file, "r") as f:
+        line_list = [line.strip() for line in f if line.strip() != ""]
+    name_list = line_list[0].lstrip("#").split()
+    design_point_list = []
+    for line in line_list[1:]:
+        if line.startswith("#"):
+            continue
+        value_list = line.split()
+        if len(value_list) != len(name_list):
+            print("\U0001F6AB  "
+                  + "Design point {} has {} values for {} parameters".format(
+                      len(design_point_list), len(value_list),
+                      len(name_list)))
+            exit(1)
+        design_point_list.append(
+            dict(zip(name_list, [float(x) for x in value_list])))
+    return design_point_list
+
+
+def write_design_point_parameters(parameters_master, default_dicts,
+                                  design_parameters, point_folder):
+    """This function writes the model parameter files of one design point.
+       The parameter dictionaries of parameters_master are reset to
+       default_dicts before the design point is applied.
+    """
+    for dict_name, dict_i in default_dicts.items():
+        getattr(parameters_master, dict_name).clear()
+        getattr(parameters_master, dict_name).update(copy.deepcopy(dict_i))
+    parameters_master.update_parameters_design_point(design_parameters)
+    parameters_master.output_parameters_to_files(point_folder)
+    with open(path.join(point_folder, "design_point.dat"), "w") as f:
+        for key_name, value in design_parameters.items():
+            f.write("{}  {}\n".format(key_name, value))
+
+
 def create_a_working_folder(workfolder_path):
     try:
         mkdir(workfolder_path)
@@ -666,6 +848,21 @@ def main():
                         type=str,
                         default='',
                         help='parameters from bayesian analysis')
+    parser.add_argument('--design_matrix',
+                        metavar='',
+                        type=str,
+                        default='',
+                        help=('file with one design point per row (the '
+                              + 'first line holds the parameter names of '
+                              + 'the bayes file); all the design points '
+                              + 'share the code tree and the initial '
+                              + 'condition event ids'))
+    parser.add_argument('--co_schedule',
+                        metavar='',
+                        type=int,
+                        default=1,
+                        help=('number of design points that one job runs '
+                              + 'on the same initial conditions'))
     parser.add_argument('-id',
                         '--OSG_process_id',
                         metavar='',
@@ -678,6 +875,63 @@ def main():
                         type=int,
                         default='-1',
                         help='Random Seed (-1: according to system time)')
+    parser.add_argument('--cpu_placement',
+                        metavar='',
+                        type=str,
+                        choices=['none', 'compact', 'spread'],
+                        default='none',
+                        help=('pin the MUSIC threads and UrQMD workers to '
+                              + 'explicit cores (none, compact, spread)'))
+    parser.add_argument('--adaptive_threads',
+                        action='store_true',
+                        help=('let the driver split n_threads between the '
+                              + 'OpenMP stages and the UrQMD workers '
+                              + 'according to the measured stage scaling'))
+    parser.add_argument('--hydro_archive',
+                        metavar='',
+                        type=str,
+                        default='',
+                        help=('folder or hdf5 archive with saved hydro '
+                              + 'surfaces; only the afterburner is run over '
+                              + 'them, with n_urqmd_per_hydro new samples'))
+    parser.add_argument('--append_results',
+                        metavar='',
+                        type=str,
+                        default='',
+                        help=('folder with the particle lists of earlier '
+                              + 'runs (e.g. URQMD_RESULTS), the new UrQMD '
+                              + 'events are appended to them'))
+    parser.add_argument('--startup_slots',
+                        metavar='',
+                        type=int,
+                        default=0,
+                        help=('number of jobs that can start IPGlasma at '
+                              + 'the same time (0: no throttle)'))
+    parser.add_argument('--startup_hold',
+                        metavar='',
+                        type=float,
+                        default=60.,
+                        help=('seconds a job keeps its start-up slot'))
+    parser.add_argument('--ic_cache_folder',
+                        metavar='',
+                        type=str,
+                        default='',
+                        help=('node-local folder (e.g. /tmp/ic_cache) to '
+                              + 'cache the events of the initial condition '
+                              + 'database'))
+    parser.add_argument('--ic_cache_size',
+                        metavar='',
+                        type=float,
+                        default=20.,
+                        help=('size cap of the initial condition cache '
+                              + 'in GB'))
+    parser.add_argument('--result_cache',
+                        metavar='',
+                        type=str,
+                        default='',
+                        help=('folder of the content-addressed cache of '
+                              + 'the hydro results and particle lists, '
+                              + 'shared between campaigns'))
     parser.add_argument('--nocopy', action='store_true')
     parser.add_argument("--continueFlag", action="store_true")
     args = parser.parse_args()
@@ -705,7 +959,7 @@ def main():
 
     code_package_path = path.abspath(path.dirname(__file__))
 
-    if n_threads < n_urqmd_per_hydro:
+    if n_threads < n_urqmd_per_hydro and not args.adaptive_threads:
         print("\U000026A0  "
               + "Warning: n_threads = {} < n_urqmd_per_hydro = {}!".format(
                   n_threads, n_urqmd_per_hydro))
@@ -751,10 +1005,16 @@ def main():
     elif initial_condition_type == "3DMCGlauber_consttau":
         initial_condition_database = (
             parameter_dict.mcglauber_dict['database_name'])
-        filelist = glob(
-            path.join(initial_condition_database, 'nuclear_thickness_TA_*.dat'))
-        nev = max(1, len(filelist))
-        print("there are {} events found under the folder {}".format(
+        if path.isfile(initial_condition_database):
+            # made by combine_thickness_functions_into_hdf5.py
+            import h5py
+            with h5py.File(initial_condition_database, "r") as h5_f:
+                nev = max(1, int(h5_f.attrs["n_events"]))
+        else:
+            filelist = glob(path.join(initial_condition_database,
+                                      'nuclear_thickness_TA_*.dat'))
+            nev = max(1, len(filelist))
+        print("there are {} events found in {}".format(
             nev, initial_condition_database))
         n_jobs = min(nev, n_jobs)
         n_hydro_per_job = int(ceil(nev/n_jobs))
@@ -764,6 +1024,20 @@ def main():
         initial_condition_database = (
             parameter_dict.mcglauber_dict['database_name'])
 
+    afterburner_only = (args.hydro_archive != "")
+    if afterburner_only:
+        args.hydro_archive = path.abspath(args.hydro_archive)
+        sys.path.insert(0, path.join(code_package_path, "codes"))
+        import hydro_surface_archive
+        nev = max(1, len(hydro_surface_archive.list_archived_surfaces(
+            args.hydro_archive)))
+        print("there are {} hydro surfaces found in {}".format(
+            nev, args.hydro_archive))
+        n_jobs = min(nev, n_jobs)
+        n_hydro_per_job = int(ceil(nev/n_jobs))
+        print("n_jobs = {}, n_hydro_per_job = {}".format(
+            n_jobs, n_hydro_per_job))
+
     working_folder_name = path.abspath(working_folder_name)
 
     if path.exists(working_folder_name) and args.continueFlag:
@@ -777,7 +1051,35 @@ def main():
         code_path = path.join(working_folder_name, "codes")
         shutil.copytree("{}/codes".format(code_package_path), code_path)
 
-    if args.bayes_file != "":
+    if args.design_matrix != "":
+        # the parameter files of the design points are written in this
+        # process, with the same random seed for all of them, so that the
+        # same event ids give the same initial conditions
+        if seed == -1:
+            seed = random.randint(0, 2**31 - 1)
+        print("\U0001F3AF  Design points from {}, seed = {}".format(
+            args.design_matrix, seed))
+        shutil.copy(args.design_matrix, working_folder_name)
+        sys.path.insert(0, path.join(code_package_path, "config"))
+        import parameters_dict_master
+        parameters_dict_master.update_parameters_dict(
+            path.abspath(args.par_dict), seed)
+        default_dicts = {
+            dict_name: copy.deepcopy(getattr(parameters_dict_master,
+                                             dict_name))
+            for dict_name in parameters_dict_master.design_parameter_dicts
+        }
+        design_point_list = read_design_matrix(args.design_matrix)
+        for design_parameters in design_point_list:
+            parameters_dict_master.check_design_point(design_parameters)
+            if args.co_schedule > 1 and initial_condition_database == "self":
+                # the co-scheduled design points share the initial condition
+                for key_name in design_parameters:
+                    if key_name in parameters_dict_master.mcglauber_dict:
+                        print("\U0001F6AB  {} changes the initial condition, "
+                              "it can not be co-scheduled".format(key_name))
+                        exit(1)
+    elif args.bayes_file != "":
         args.bayes_file = path.join(path.abspath("."), args.bayes_file)
         subprocess.call("(cd {}/config; ".format(code_package_path)
                         + "python3 parameters_dict_master.py "
@@ -803,65 +1105,109 @@ def main():
               + "Pre-generated initial conditions from {} ...".format(
                   initial_condition_database.format(cent_label)))
 
-    toolbar_width = 40
-    sys.stdout.write("\U0001F375  Generating {} jobs [{}]".format(
-        n_jobs, " "*toolbar_width))
-    sys.stdout.flush()
-    sys.stdout.write("\b"*(toolbar_width + 1))
-    event_id_offset = 0
-    n_hydro_rescaled = n_hydro_per_job
-    
     walltime = '10:00:00'
     if "walltime" in parameter_dict.control_dict.keys():
         walltime = parameter_dict.control_dict["walltime"]
+
+    driver_options = ""
+    if args.cpu_placement != "none":
+        driver_options += " --cpu_placement {}".format(args.cpu_placement)
+    shared_sampling = parameter_dict.control_dict.get('shared_iSS_sampling',
+                                                      False)
+    if shared_sampling:
+        driver_options += " --shared_sampling"
+    particle_list_format = parameter_dict.control_dict.get(
+        'particle_list_format', "gz")
+    if particle_list_format != "gz":
+        driver_options += " --particle_list_format {}".format(
+            particle_list_format)
+    ic_estimator = parameter_dict.control_dict.get(
+        'ic_preselection_estimator', "none")
+    if ic_estimator != "none":
+        window_min, window_max = (
+            parameter_dict.control_dict['ic_preselection_window'])
+        driver_options += (" --ic_preselection {} {} {}".format(
+            ic_estimator, window_min, window_max)
+                           + " --ic_preselection_attempts {}".format(
+                               parameter_dict.control_dict.get(
+                                   'ic_preselection_max_attempts', 1)))
+    analysis_backend = parameter_dict.hadronic_afterburner_toolkit_dict.get(
+        'analysis_backend', "toolkit")
+    if analysis_backend != "toolkit":
+        if parameter_dict.hadronic_afterburner_toolkit_dict.get(
+                'analyze_HBT', 0) == 1:
+            print("\U0001F6AB  analyze_HBT = 1 needs the toolkit analysis "
+                  "backend, the {} backend only does the spvn analysis".format(
+                      analysis_backend))
+            exit(1)
+        driver_options += " --analysis_backend {}".format(analysis_backend)
+    if afterburner_only:
+        driver_options += " --hydro_archive {}".format(args.hydro_archive)
+        if args.append_results != "":
+            driver_options += " --append_results {}".format(
+                path.abspath(args.append_results))
+    if args.adaptive_threads:
+        driver_options += " --core_budget {} --stage_calibration {}".format(
+            n_threads, path.join(working_folder_name, "stage_scaling.dat"))
+    if cluster_name != "OSG" and args.startup_slots > 0:
+        # the jobs share the lock files in the working folder
+        driver_options += " --startup_throttle {} {} {}".format(
+            path.join(working_folder_name, "startup_locks"),
+            args.startup_slots, args.startup_hold)
+    if args.ic_cache_folder != "":
+        driver_options += " --ic_cache {} {}".format(args.ic_cache_folder,
+                                                    args.ic_cache_size)
+    if args.result_cache != "":
+        driver_options += " --result_cache {}".format(
+            path.abspath(args.result_cache))
+    if args.design_matrix != "":
+        driver_options += " --ic_seed {}".format(seed)
         
-    for iev in range(n_jobs):
-        progress_i = (int(float(iev + 1)/n_jobs*toolbar_width)
-                      - int(float(iev)/n_jobs*toolbar_width))
-        for ii in range(progress_i):
-            sys.stdout.write("#")
-            sys.stdout.flush()
-        if (initial_condition_type in ('IPGlasma', 'IPGlasma+KoMPoST')
-                and parameter_dict.ipglasma_dict['type'] == 'minimumbias'):
-            precent_local = float(iev)/float(n_jobs)
-            for cen_min, cen_max, cen_label, cen_precent in centrality_list:
-                if precent_local >= cen_min and precent_local < cen_max:
-                    cent_label = cen_label
-                    rescale_factor = cen_precent/(cen_max - cen_min)
-                    n_hydro_rescaled = (max(
-                        1, int(n_hydro_per_job*rescale_factor + 0.1)))
-                    if cent_label != cent_label_pre:
-                        cent_label_pre = cent_label
-                        event_id_offset = 0
-                    break
-        if cluster_name == "OSG":
-            event_id_offset = osg_job_id
-        GMC_flag = parameter_dict.iss_dict['global_momentum_conservation']
-        NO_COLL_flag = parameter_dict.urqmd_dict['run_collisionless']
-        ipglasma_flag = False
-        if (initial_condition_type in ("IPGlasma", "IPGlasma+KoMPoST")
-                and initial_condition_database == "self"):
-            ipglasma_flag = parameter_dict.control_dict['save_ipglasma_results']
-        kompost_flag = False
-        if initial_condition_type == "IPGlasma+KoMPoST":
-            kompost_flag = parameter_dict.control_dict['save_kompost_results']
-        hydro_flag = parameter_dict.control_dict['save_hydro_surfaces']
-        urqmd_flag = parameter_dict.control_dict['save_UrQMD_files']
-        HBT_flag = False
-        if "analyze_HBT" in parameter_dict.hadronic_afterburner_toolkit_dict:
-            if parameter_dict.hadronic_afterburner_toolkit_dict[
-                    'analyze_HBT'] == 1:
-                HBT_flag = True
-        generate_event_folders(initial_condition_database.format(cent_label),
-                               initial_condition_type, code_package_path,
-                               code_path, working_folder_name, cluster_name,
-                               iev, event_id_offset, n_hydro_rescaled,
-                               n_urqmd_per_hydro, n_threads, walltime,
-                               IPGlasma_time_stamp, ipglasma_flag, kompost_flag,
-                               hydro_flag, urqmd_flag, GMC_flag, HBT_flag, NO_COLL_flag)
-        event_id_offset += n_hydro_rescaled
-    sys.stdout.write("\n")
-    sys.stdout.flush()
+    job_folder_list = [(working_folder_name, driver_options)]
+    if args.design_matrix != "":
+        point_folder_list = []
+        for ipoint, design_parameters in enumerate(design_point_list):
+            point_folder = path.join(working_folder_name,
+                                     "design_point_{}".format(ipoint))
+            mkdir(point_folder)
+            write_design_point_parameters(parameters_dict_master,
+                                          default_dicts, design_parameters,
+                                          point_folder)
+            print("\U0001F3AF  {}: {}".format(
+                point_folder.split("/")[-1],
+                ", ".join(["{} = {}".format(key_name, value)
+                           for key_name, value in design_parameters.items()])))
+            point_folder_list.append(point_folder)
+        job_folder_list = [(point_folder, driver_options)
+                           for point_folder in point_folder_list]
+        if args.co_schedule > 1:
+            # every job of a design group runs all the design points of
+            # the group on its initial conditions
+            job_folder_list = []
+            for igroup in range(0, len(point_folder_list), args.co_schedule):
+                group_points = point_folder_list[igroup:
+                                                 igroup + args.co_schedule]
+                group_folder = path.join(
+                    working_folder_name,
+                    "design_group_{}".format(igroup//args.co_schedule))
+                mkdir(group_folder)
+                shutil.copytree(path.join(group_points[0], "model_parameters"),
+                                path.join(group_folder, "model_parameters"))
+                print("\U0001F3AF  {}: {}".format(
+                    group_folder.split("/")[-1],
+                    ", ".join([point_folder.split("/")[-1]
+                               for point_folder in group_points])))
+                job_folder_list.append((
+                    group_folder, driver_options + " --design_points {}".format(
+                        " ".join([path.join(point_folder, "model_parameters")
+                                  for point_folder in group_points]))))
+    for job_folder, job_driver_options in job_folder_list:
+        generate_jobs_in_folder(
+            job_folder, initial_condition_database, initial_condition_type,
+            parameter_dict, code_package_path, code_path, cluster_name, n_jobs,
+            n_hydro_per_job, n_urqmd_per_hydro, n_threads, walltime,
+            IPGlasma_time_stamp, osg_job_id, job_driver_options,
+            shared_sampling, afterburner_only)
 
     # copy script to collect final results
     pwd = path.abspath(".")
@@ -874,24 +1220,27 @@ def main():
     shutil.copy(path.join(script_path, 'average_event_spvn_h5.py'), pwd)
 
 
-    if cluster_name == "nersc":
-        shutil.copy(
-            path.join(code_package_path,
-                      'Cluster_supports/NERSC/job_MPI_wrapper.py'),
-            working_folder_name)
-        n_nodes = max(1, int(n_jobs*n_threads/64))
-        generate_nersc_mpi_job_script(working_folder_name, n_nodes, n_threads,
-                                      int(n_jobs/n_nodes), walltime)
-
-    if cluster_name == "nerscKNL":
-        shutil.copy(
-            path.join(code_package_path,
-                      'Cluster_supports/NERSC/job_MPI_wrapper.py'),
-            working_folder_name)
-        n_nodes = max(1, int(n_jobs*n_threads/272))
-        generate_nerscKNL_mpi_job_script(working_folder_name, n_nodes,
-                                         n_threads, int(n_jobs/n_nodes),
-                                         walltime)
+    # the MPI job scripts run the event_{i} folders of every job folder
+    # (the design points or design groups of a design matrix)
+    for job_folder, _ in job_folder_list:
+        if cluster_name == "nersc":
+            shutil.copy(
+                path.join(code_package_path,
+                          'Cluster_supports/NERSC/job_MPI_wrapper.py'),
+                job_folder)
+            n_nodes = max(1, int(n_jobs*n_threads/64))
+            generate_nersc_mpi_job_script(job_folder, n_nodes, n_threads,
+                                          int(n_jobs/n_nodes), walltime)
+
+        if cluster_name == "nerscKNL":
+            shutil.copy(
+                path.join(code_package_path,
+                          'Cluster_supports/NERSC/job_MPI_wrapper.py'),
+                job_folder)
+            n_nodes = max(1, int(n_jobs*n_threads/272))
+            generate_nerscKNL_mpi_job_script(job_folder, n_nodes,
+                                             n_threads, int(n_jobs/n_nodes),
+                                             walltime)
 
     if cluster_name == "wsugrid":
         shutil.copy(
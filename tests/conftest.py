@@ -0,0 +1,9 @@
+import sys
+from os import path
+
+# the driver modules are scripts copied into the event folders, so they
+# import each other by name
+PACKAGE_PATH = path.dirname(path.dirname(path.abspath(__file__)))
+for folder in ("", "codes", "3DMCGlauber_database", "IPGlasma_database",
+               "utilities"):
+    sys.path.insert(0, path.join(PACKAGE_PATH, folder))
@@ -0,0 +1,150 @@
+from os import path
+
+import pytest
+
+import benchmark_orchestration
+import hydro_plus_UrQMD_driver as driver
+
+
+def driver_parameters(**kwargs):
+    para_dict = {
+        'initial_condition': "self",
+        'initial_type': "3DMCGlauber_dynamical",
+        'n_hydro': 1,
+        'hydro_id0': 0,
+        'n_urqmd': 2,
+        'num_threads': 1,
+        'save_ipglasma': False,
+        'save_kompost': False,
+        'save_hydro': False,
+        'save_urqmd': False,
+        'seed_add': 0,
+        'time_stamp_str': "0.4",
+    }
+    para_dict.update(kwargs)
+    return para_dict
+
+
+def test_pipelines_do_not_share_stage_engines():
+    default_hydro = list(driver.stage_executable_registry['hydro'])
+    fake_pipeline = driver.Pipeline(driver_parameters(
+        stage_engine="fake", stage_timeout={'hydro': 10.}, num_threads=4))
+    assert fake_pipeline.engines.registry['hydro'] != default_hydro
+    assert fake_pipeline.engines.settings['hydro']['timeout'] == 10.
+
+    pipeline = driver.Pipeline(driver_parameters())
+    assert pipeline.engines.registry['hydro'] == default_hydro
+    assert 'timeout' not in pipeline.engines.settings['hydro']
+    assert pipeline.engines.settings['hydro']['n_threads'] == 1
+    assert driver.stage_executable_registry['hydro'] == default_hydro
+    assert driver.stage_process_settings == {}
+    assert all([stage_i.engines is pipeline.engines
+                for stage_i in pipeline.stages])
+
+
+def test_preselection_retry_seeds_follow_ic_seed():
+    stage = driver.InitialConditionStage(driver_parameters(ic_seed=1234))
+    event = driver.PipelineEvent(3, stage.para_dict)
+    seed_list = [stage.retry_seed(event, iattempt)
+                 for iattempt in range(1, 4)]
+    assert len(set(seed_list)) == 3
+    assert seed_list == [stage.retry_seed(event, iattempt)
+                         for iattempt in range(1, 4)]
+    other_event = driver.PipelineEvent(4, stage.para_dict)
+    assert stage.retry_seed(other_event, 1) != seed_list[0]
+
+
+def test_fake_engine_events_finish(tmp_path, monkeypatch):
+    _, event_folder, time_stamp = benchmark_orchestration.setup_benchmark_job(
+        str(tmp_path), "3DMCGlauber_dynamical", 2, 2)
+    monkeypatch.chdir(event_folder)
+    para_dict = driver_parameters(n_hydro=2, time_stamp_str=time_stamp)
+    engines = driver.StageEngines()
+    engines.use_fake(size_scale=0.01)
+    event_list = driver.Pipeline(para_dict, engines=engines).run()
+    assert [event.event_id for event in event_list] == ["0", "1"]
+    assert all([event.status for event in event_list])
+    for event in event_list:
+        assert path.isfile(path.join(
+            event.final_results_folder,
+            "spvn_results_{}.h5".format(event.event_id)))
+    stage_names = set([stage_name for stage_name, _ in engines.timing])
+    assert {'3dMCGlauber', 'hydro', 'afterburner'} <= stage_names
+
+    # the finished events are not run again
+    engines = driver.StageEngines()
+    engines.use_fake(size_scale=0.01)
+    event_list = driver.Pipeline(para_dict, engines=engines).run()
+    assert all([event.status for event in event_list])
+    assert engines.timing == []
+
+
+def test_refilled_glauber_pool_gets_a_new_seed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path/"3dMCGlauber").mkdir()
+    (tmp_path/"MUSIC"/"initial").mkdir(parents=True)
+    (tmp_path/"EVENT_RESULTS").mkdir()
+    engines = driver.StageEngines()
+    engines.use_fake(path.join(path.dirname(driver.__file__),
+                               "fake_stage_engines.py"), size_scale=0.01)
+    seed_list = []
+    fill_glauber_event_pool = driver.fill_glauber_event_pool
+
+    def record_seed(n_events, seed, **kwargs):
+        seed_list.append(seed)
+        return fill_glauber_event_pool(n_events, seed, **kwargs)
+
+    monkeypatch.setattr(driver, "fill_glauber_event_pool", record_seed)
+    for ic_seed in (None, 1234):
+        seed_list.clear()
+        event_list = []
+        for iev in range(4):
+            file_name = driver.get_initial_condition(
+                "self", "3DMCGlauber_dynamical", iev, 5, "EVENT_RESULTS",
+                glauber_batch_size=2, ic_seed=ic_seed, engines=engines)
+            event_list.append((tmp_path/file_name).read_text())
+            (tmp_path/file_name).unlink()
+        assert len(seed_list) == 2 and seed_list[0] != seed_list[1]
+        assert len(set(event_list)) == 4
+        (tmp_path/driver.glauber_pool_file).unlink()
+    assert driver.glauber_pool_seed(5, 2, 1234) == 1241
+
+
+def test_numpy_backend_rejects_the_hbt_analysis(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path/"hadronic_afterburner_toolkit").mkdir()
+    (tmp_path/"hadronic_afterburner_toolkit"/"parameters.dat").write_text(
+        "analyze_flow = 1\nanalyze_HBT = 1\n")
+    driver.AnalysisStage(driver_parameters())
+    with pytest.raises(ValueError):
+        driver.AnalysisStage(driver_parameters(analysis_backend="numpy"))
+
+
+def test_split_oscar_events_keeps_every_event_once(tmp_path):
+    header = ["OSC1999A\n", "final_id_p_x\n", "iSS  (197,79)+(197,79)\n"]
+    particle_list = []
+    with open(str(tmp_path/"OSCAR.DAT"), "w") as f:
+        f.writelines(header)
+        for iev in range(7):
+            f.write("  {}  {}  0  0\n".format(iev + 1, iev % 3))
+            for ipart in range(iev % 3):
+                particle_list.append("{} {} 211 0.1 0.2\n".format(iev,
+                                                                  ipart))
+                f.write(particle_list[-1])
+            f.write("\n")
+    output_file_list = [str(tmp_path/"OSCAR_{}.DAT".format(i))
+                        for i in range(3)]
+    assert driver.split_oscar_events(str(tmp_path/"OSCAR.DAT"),
+                                     output_file_list) == [3, 2, 2]
+
+    split_particle_list = []
+    for output_file, n_events in zip(output_file_list, [3, 2, 2]):
+        with open(output_file, "r") as f:
+            assert [f.readline() for _ in range(3)] == header
+            for iev in range(n_events):
+                event_header = f.readline().split()
+                assert event_header[0] == str(iev + 1)
+                split_particle_list += [
+                    f.readline() for _ in range(int(event_header[1]))]
+            assert f.read() == ""
+    assert split_particle_list == particle_list
@@ -0,0 +1,42 @@
+import benchmark_orchestration
+import generate_jobs
+import parameters_dict_master
+
+
+def read_ipglasma_script(tmp_path, cluster_name, throttled):
+    generate_jobs.generate_script_ipglasma(str(tmp_path), 4, cluster_name, 7,
+                                           throttled)
+    return (tmp_path/"run_ipglasma.sh").read_text()
+
+
+def test_ipglasma_start_is_staggered_without_the_throttle(tmp_path):
+    script = read_ipglasma_script(tmp_path, "local", False)
+    assert "sleep 7\n" in script
+    assert script.index("sleep 7") < script.index("./ipglasma input")
+
+
+def test_throttled_ipglasma_start_does_not_sleep(tmp_path):
+    assert "sleep" not in read_ipglasma_script(tmp_path, "local", True)
+    assert "sleep" not in read_ipglasma_script(tmp_path, "OSG", False)
+
+
+def generate_ipglasma_job(working_folder, driver_options):
+    code_path = str(working_folder/"codes")
+    benchmark_orchestration.prepare_fake_code_tree(code_path)
+    parameters_dict_master.control_dict['initial_state_type'] = "IPGlasma"
+    parameters_dict_master.output_parameters_to_files(str(working_folder))
+    generate_jobs.generate_event_folders(
+        "self", "IPGlasma", benchmark_orchestration.package_root_path,
+        code_path, str(working_folder), "local", 3, 0, 1, 1, 1, "10:00:00",
+        "0.4", False, False, False, False, 0, False, 0, driver_options)
+    return (working_folder/"event_3"/"run_ipglasma.sh").read_text()
+
+
+def test_default_ipglasma_jobs_are_staggered(tmp_path):
+    assert "sleep 3\n" in generate_ipglasma_job(tmp_path, "")
+
+
+def test_throttled_ipglasma_jobs_are_not_staggered(tmp_path):
+    script = generate_ipglasma_job(
+        tmp_path, " --startup_throttle {} 4 60".format(tmp_path/"locks"))
+    assert "sleep" not in script
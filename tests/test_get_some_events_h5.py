@@ -0,0 +1,98 @@
+import random
+
+import h5py
+import numpy as np
+
+import get_some_events_h5
+
+
+def make_database(database_path, n_events=6):
+    rng = np.random.default_rng(5)
+    with h5py.File(database_path, "w") as hf:
+        for iev in range(n_events):
+            gtemp = hf.create_group("event-{}".format(iev))
+            gtemp.attrs.create("0", np.bytes_("seed {}".format(iev)))
+            gtemp.create_dataset("NpartList{}.dat".format(iev),
+                                 data=rng.random((10 + iev, 4)),
+                                 compression="gzip", compression_opts=9)
+            dset = gtemp.create_dataset(
+                "epsilon-u-Hydro-t0.4-{}.dat".format(iev),
+                data=rng.random((3000, 15)), chunks=(1000, 15),
+                compression="gzip", compression_opts=4, shuffle=True)
+            dset.attrs.create("header", np.bytes_("xmax= 50 dx= 0.04"))
+            dset.attrs.create("dx", 0.04)
+            dset = gtemp.create_dataset(
+                "level-2/epsilon-u-Hydro-t0.4-{}.dat".format(iev),
+                data=rng.random((750, 15)),
+                compression="gzip", compression_opts=9)
+            dset.attrs.create("dx", 0.08)
+            gtemp.create_dataset("NpartdNdy-t0.4-{}.dat".format(iev),
+                                 data=rng.random(3))
+
+
+def test_subset_is_a_chunk_copy_of_the_events(tmp_path):
+    database = str(tmp_path/"database.h5")
+    make_database(database)
+    random.seed(1)
+    get_some_events_h5.fetch_IPGlasma_events(
+        database, str(tmp_path/"subset"), 4, n_readers=2)
+    with h5py.File(database, "r") as in_data, \
+            h5py.File(str(tmp_path/"subset.h5"), "r") as out_data:
+        assert sorted(out_data.keys()) == ["event-{}".format(i)
+                                           for i in range(4)]
+        old_id_list = []
+        for iev in range(4):
+            out_group = out_data["event-{}".format(iev)]
+            old_id = out_group.attrs["0"].decode("UTF-8").split()[1]
+            old_id_list.append(old_id)
+            in_group = in_data["event-{}".format(old_id)]
+            name_list = []
+            out_group.visit(name_list.append)
+            assert name_list == [
+                "NpartList{}.dat".format(iev),
+                "NpartdNdy-t0.4-{}.dat".format(iev),
+                "epsilon-u-Hydro-t0.4-{}.dat".format(iev),
+                "level-2",
+                "level-2/epsilon-u-Hydro-t0.4-{}.dat".format(iev),
+            ]
+            for name in name_list:
+                if name == "level-2":
+                    continue
+                out_dset = out_group[name]
+                in_dset = in_group[get_some_events_h5.rename_dataset(
+                    name, str(iev), old_id)]
+                assert np.all(out_dset[()] == in_dset[()])
+                assert dict(out_dset.attrs) == dict(in_dset.attrs)
+                assert out_dset.chunks == in_dset.chunks
+                assert out_dset.compression_opts == in_dset.compression_opts
+                assert out_dset.shuffle == in_dset.shuffle
+                if in_dset.chunks is not None:
+                    assert (out_dset.id.read_direct_chunk((0,)*out_dset.ndim)
+                            == in_dset.id.read_direct_chunk(
+                                (0,)*in_dset.ndim))
+        assert len(set(old_id_list)) == 4
+
+
+def test_select_events_never_draws_an_event_twice():
+    event_list = ["event-{}".format(i) for i in range(23)]
+    estimator_list = [(7*i) % 5 for i in range(23)]
+    for seed in range(20):
+        random.seed(seed)
+        for n_bins in [1, 3, 4, 10]:
+            for nev in [1, 5, 22, 23]:
+                selected = get_some_events_h5.select_events(
+                    event_list, nev, estimator_list, n_bins)
+                assert len(selected) == nev
+                assert len(set(selected)) == nev
+                assert set(selected) <= set(event_list)
+
+
+def test_stratified_events_cover_the_bins():
+    event_list = ["event-{}".format(i) for i in range(40)]
+    estimator_list = list(range(40))
+    random.seed(3)
+    selected = get_some_events_h5.select_events(event_list, 8,
+                                                estimator_list, 4)
+    n_per_bin = np.bincount([int(x.split("-")[1])//10 for x in selected],
+                            minlength=4)
+    assert list(n_per_bin) == [2, 2, 2, 2]
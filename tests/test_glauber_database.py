@@ -0,0 +1,59 @@
+import h5py
+import numpy as np
+import pytest
+
+import fetch_3DMCGlauber_event_from_hdf5_database as glauber_fetch
+import glauber_ragged_database
+
+
+def make_old_layout_database(database_path, event_id_list):
+    rng = np.random.default_rng(7)
+    with h5py.File(database_path, "w") as hf:
+        for event_id in event_id_list:
+            dset = hf.create_dataset(
+                "strings_event_{}.dat".format(event_id),
+                data=rng.random((event_id % 4, 21)),
+                compression="gzip", compression_opts=9)
+            dset.attrs.create("header", np.bytes_(
+                "# b = {} fm".format(event_id)))
+        hf.create_dataset("events_summary.dat",
+                          data=rng.random((max(event_id_list) + 1, 3)))
+
+
+def test_ragged_events_with_missing_ids(tmp_path):
+    old_database = str(tmp_path/"old.h5")
+    new_database = str(tmp_path/"new.h5")
+    # the ids are neither contiguous nor in order, and event 4 is empty
+    event_id_list = [9, 0, 3, 4, 1, 10]
+    make_old_layout_database(old_database, event_id_list)
+    glauber_ragged_database.convert_to_ragged_layout(old_database,
+                                                     new_database)
+    with h5py.File(old_database, "r") as h5_old, \
+            h5py.File(new_database, "r") as h5_new:
+        assert list(h5_new["event_ids"][()]) == sorted(event_id_list)
+        for event_id in event_id_list:
+            strings, header = glauber_fetch.read_ragged_event(h5_new,
+                                                              event_id)
+            dset = h5_old["strings_event_{}.dat".format(event_id)]
+            assert np.all(strings == dset[()])
+            assert header == "# b = {} fm".format(event_id)
+        assert np.all(h5_new["event_summary"][()]
+                      == h5_old["events_summary.dat"][()][
+                          sorted(event_id_list)])
+        for event_id in [2, 5, 11]:
+            with pytest.raises(KeyError):
+                glauber_fetch.read_ragged_event(h5_new, event_id)
+
+
+def test_both_layouts_give_the_same_event_file(tmp_path, monkeypatch):
+    make_old_layout_database(str(tmp_path/"old.h5"), [2, 3, 7])
+    glauber_ragged_database.convert_to_ragged_layout(str(tmp_path/"old.h5"),
+                                                     str(tmp_path/"new.h5"))
+    event_files = []
+    for database in ["old", "new"]:
+        (tmp_path/database).mkdir()
+        monkeypatch.chdir(tmp_path/database)
+        file_name = glauber_fetch.fecth_an_3DMCGlauber_event(
+            str(tmp_path/"{}.h5".format(database)), 7)
+        event_files.append((tmp_path/database/file_name).read_bytes())
+    assert event_files[0] == event_files[1]
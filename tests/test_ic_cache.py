@@ -0,0 +1,88 @@
+import threading
+import time
+from os import path, utime
+
+import h5py
+import numpy as np
+
+import ic_cache
+
+
+def make_database(database_path, n_events=4):
+    with h5py.File(database_path, "w") as h5_f:
+        for iev in range(n_events):
+            h5_f.create_dataset("event-{}/TA".format(iev),
+                                data=np.full(1000, float(iev)),
+                                compression="gzip", compression_opts=9)
+    return database_path
+
+
+def test_miss_copies_the_event_and_hit_reads_the_copy(tmp_path,
+                                                      monkeypatch):
+    database = make_database(str(tmp_path/"database.h5"))
+    cache = ic_cache.InitialConditionCache(str(tmp_path/"cache"), 1.)
+    assert cache.cached_event(database, 2) is None
+
+    entry = cache.event_database(database, 2)
+    with h5py.File(entry, "r") as h5_f:
+        assert list(h5_f.keys()) == ["event-2"]
+        assert np.all(h5_f["event-2/TA"][()] == 2.)
+
+    def fail_copy(*args):
+        raise AssertionError("a cache hit read the database")
+
+    monkeypatch.setattr(ic_cache, "copy_event", fail_copy)
+    assert cache.cached_event(database, 2) == entry
+    assert cache.event_database(database, 2) == entry
+
+
+def test_concurrent_misses_copy_the_event_once(tmp_path, monkeypatch):
+    database = make_database(str(tmp_path/"database.h5"))
+    cache = ic_cache.InitialConditionCache(str(tmp_path/"cache"), 1.)
+    copy_list = []
+    copy_event = ic_cache.copy_event
+
+    def slow_copy(*args):
+        copy_list.append(args)
+        time.sleep(0.2)
+        copy_event(*args)
+
+    monkeypatch.setattr(ic_cache, "copy_event", slow_copy)
+    entry_list = []
+    thread_list = [
+        threading.Thread(
+            target=lambda: entry_list.append(cache.event_database(database,
+                                                                  1)))
+        for _ in range(3)
+    ]
+    for thread_i in thread_list:
+        thread_i.start()
+    for thread_i in thread_list:
+        thread_i.join()
+    assert len(copy_list) == 1
+    assert len(set(entry_list)) == 1 and len(entry_list) == 3
+
+
+def test_eviction_removes_the_least_recently_used_events(tmp_path):
+    database = make_database(str(tmp_path/"database.h5"))
+    cache = ic_cache.InitialConditionCache(str(tmp_path/"cache"), 1.,
+                                           min_age=60.)
+    now = time.time()
+    entry_list = []
+    for iev in range(3):
+        entry = cache.event_database(database, iev)
+        utime(entry, (now - 1000. + iev, now - 1000. + iev))
+        entry_list.append(entry)
+    entry_size = max([size for _, size, _ in cache.entries()])
+    # room for three events
+    cache.size_cap = 3.5*entry_size
+
+    entry_list.append(cache.event_database(database, 3))
+    assert [path.isfile(entry) for entry in entry_list] == [
+        False, True, True, True]
+
+    # the events used within min_age are kept over the size cap
+    cache.size_cap = 0.
+    cache.evict()
+    assert [path.isfile(entry) for entry in entry_list] == [
+        False, False, False, True]
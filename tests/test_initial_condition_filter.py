@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import hydro_plus_UrQMD_driver as driver
+import initial_condition_filter as ic_filter
+
+
+def test_window_edges():
+    window = ic_filter.InitialConditionFilter("Npart", 100, 200)
+    assert not window.accept({"Npart": 99.999})
+    assert window.accept({"Npart": 100})
+    assert window.accept({"Npart": 199.999})
+    assert not window.accept({"Npart": 200})
+    with pytest.raises(ValueError):
+        window.accept({"Ncoll": 150})
+
+
+def test_estimators_of_the_initial_conditions(tmp_path):
+    strings_file = str(tmp_path/"strings_event_0.dat")
+    np.savetxt(strings_file, [[1.5, 0., 0.], [2.5, 1., 1.]],
+               header="b = 3.2500 fm, Npart = 57")
+    estimators = ic_filter.glauber_estimators(strings_file)
+    assert estimators["b"] == 3.25 and estimators["Npart"] == 57
+    assert estimators["n_strings"] == 2
+    assert estimators["string_energy"] == 4.
+
+    (tmp_path/"NpartList3.dat").write_text(
+        "# x y\n0.1 0.2\n0.3 0.4\n\n0.5 0.6\n")
+    (tmp_path/"NgluonEstimators3.dat").write_text(
+        "Q_s = 1.2\n# Ngluon dNdy\n512.5  N/A\n")
+    estimators = ic_filter.ipglasma_estimators(str(tmp_path), 3)
+    assert estimators == {"Npart": 3, "Ngluon": 512.5}
+
+
+def test_retry_seeds_are_reproducible_for_an_ic_seed():
+    para_dict = {
+        'initial_condition': "self",
+        'initial_type': "3DMCGlauber_dynamical",
+        'ic_seed': 42,
+    }
+    seed_list = []
+    for _ in range(2):
+        stage = driver.InitialConditionStage(dict(para_dict))
+        event = driver.PipelineEvent(5, stage.para_dict)
+        seed_list.append([stage.retry_seed(event, iattempt)
+                          for iattempt in range(1, 5)])
+    assert seed_list[0] == seed_list[1]
+    stage = driver.InitialConditionStage(dict(para_dict, ic_seed=43))
+    assert stage.retry_seed(driver.PipelineEvent(5, stage.para_dict),
+                            1) != seed_list[0][0]
@@ -0,0 +1,102 @@
+import h5py
+import numpy as np
+
+import ipglasma_ingestion
+from fetch_IPGlasma_event_from_hdf5_database import select_grid_level
+
+
+def write_ipglasma_event(results_folder, event_id, nx=5, ny=7, dx=0.04):
+    rng = np.random.default_rng(int(event_id))
+    header = ("tau_in_fm 0.4 etamax= 1 xmax= {0} ymax= {1} deta= 0 "
+              "dx= {2} dy= {2}").format(nx, ny, dx)
+    ix, iy = np.meshgrid(np.arange(nx), np.arange(ny), indexing="ij")
+    data = np.zeros([nx*ny, 18])
+    data[:, 1] = -nx*dx/2. + ix.flatten()*dx
+    data[:, 2] = -ny*dx/2. + iy.flatten()*dx
+    data[:, 3] = rng.random(nx*ny)
+    data[:, 4] = 1.
+    np.savetxt(str(results_folder/"epsilon-u-Hydro-t0.4-{}.dat".format(
+        event_id)), data, fmt=("%i" + "  %.6e"*17), header=header)
+    data = np.zeros([nx*ny, 12])
+    data[:, 0] = iy.transpose().flatten()
+    data[:, 1] = ix.transpose().flatten()
+    data[:, 2:] = rng.random((nx*ny, 10))
+    np.savetxt(str(results_folder/"Tmunu-t0.4-{}.dat".format(event_id)),
+               data, fmt=("%i  %i" + "  %.6e"*10), header=header)
+    (results_folder/"NpartList{}.dat".format(event_id)).write_text(
+        "0.5 -0.5 N/A 1\n1.5 2.5 3 N/A\n")
+    (results_folder/"NcollList{}.dat".format(event_id)).write_text(
+        "0.5 1.5\n")
+    # the raw outputs have a Q_s line without "#"
+    (results_folder/"NpartdNdy-t0.4-{}.dat".format(event_id)).write_text(
+        "Q_s = 1.25 GeV\n57 N/A 123.5\n")
+    (results_folder/"usedParameters{}.dat".format(event_id)).write_text(
+        "size 5\nseed {}\n".format(event_id))
+
+
+def test_ingest_raw_ipglasma_outputs(tmp_path):
+    write_ipglasma_event(tmp_path, "3")
+    write_ipglasma_event(tmp_path, "8")
+    for n_workers in [1, 2]:
+        database = str(tmp_path/"database_{}.h5".format(n_workers))
+        ipglasma_ingestion.ingest_ipglasma_results(str(tmp_path), database,
+                                                   n_workers=n_workers)
+        with h5py.File(database, "r") as hf:
+            assert sorted(hf.keys()) == ["event-3", "event-8"]
+            gtemp = hf["event-3"]
+            assert gtemp.attrs["1"] == b"seed 3"
+            assert np.all(gtemp["NpartList3.dat"][()] == [
+                [0.5, -0.5, 0., 1.], [1.5, 2.5, 3., 0.]])
+            assert np.all(gtemp["NcollList3.dat"][()] == [[0.5, 1.5]])
+            assert np.all(gtemp["NpartdNdy-t0.4-3.dat"][()]
+                          == [57., 0., 123.5])
+            dset = gtemp["epsilon-u-Hydro-t0.4-3.dat"]
+            raw = np.loadtxt(str(tmp_path/"epsilon-u-Hydro-t0.4-3.dat"))
+            assert np.all(dset[()] == raw[:, 3:])
+            assert (dset.attrs["nx"], dset.attrs["ny"]) == (5, 7)
+            assert dset.attrs["dx"] == 0.04
+            assert np.isclose(dset.attrs["x_size"], 0.2)
+            raw = np.loadtxt(str(tmp_path/"Tmunu-t0.4-3.dat"))
+            assert np.all(gtemp["Tmunu-t0.4-3.dat"][()] == raw[:, 2:])
+
+
+def test_coarse_levels_conserve_the_energy(tmp_path):
+    write_ipglasma_event(tmp_path, "0")
+    _, dataset_list = ipglasma_ingestion.parse_ipglasma_event(
+        str(tmp_path), "0", levels=(2, 4))
+    dataset_dict = {dataset['name']: dataset for dataset in dataset_list}
+    for name in ["epsilon-u-Hydro-t0.4-0.dat", "Tmunu-t0.4-0.dat"]:
+        fine = dataset_dict[name]['data']
+        for factor in (2, 4):
+            coarse = dataset_dict["level-{}/{}".format(factor, name)]
+            attrs = dict(coarse['attrs'])
+            assert (attrs['nx'], attrs['ny']) == (-(-5//factor),
+                                                  -(-7//factor))
+            assert np.isclose(attrs['dx'], 0.04*factor)
+            assert coarse['data'].shape == (attrs['nx']*attrs['ny'],
+                                            fine.shape[1])
+            # the zero-padded edges keep the sum over the grid
+            assert np.isclose(np.sum(coarse['data'][:, 0])*factor**2,
+                              np.sum(fine[:, 0]))
+            if name.startswith("Tmunu"):
+                assert np.allclose(np.sum(coarse['data'], axis=0)*factor**2,
+                                   np.sum(fine, axis=0))
+            else:
+                positive = coarse['data'][:, 0] > 0.
+                assert np.allclose(coarse['data'][positive, 1], 1.)
+
+
+def test_select_grid_level_picks_the_coarsest_allowed_grid(tmp_path):
+    write_ipglasma_event(tmp_path, "0")
+    database = str(tmp_path/"database.h5")
+    ipglasma_ingestion.ingest_ipglasma_results(str(tmp_path), database,
+                                               levels=(2, 4))
+    file_name = "epsilon-u-Hydro-t0.4-0.dat"
+    with h5py.File(database, "r") as hf:
+        gtemp = hf["event-0"]
+        for grid_spacing, dx in [(None, 0.04), (0.03, 0.04), (0.04, 0.04),
+                                 (0.079, 0.04), (0.08, 0.08), (0.15, 0.08),
+                                 (0.16, 0.16), (1.0, 0.16)]:
+            dset = select_grid_level(gtemp, file_name, grid_spacing)
+            assert np.isclose(dset.attrs["dx"], dx)
+        assert select_grid_level(gtemp, "Tmunu-t1.0-0.dat", 0.16) is None
@@ -0,0 +1,77 @@
+import gzip
+
+import numpy as np
+import pytest
+
+import particle_list_reader as reader
+
+
+def make_events(n_events, seed=1):
+    rng = np.random.default_rng(seed)
+    event_list = []
+    for _ in range(n_events):
+        particles = np.zeros(rng.integers(0, 20), dtype=reader.particle_dtype)
+        particles["pid"] = rng.choice([211, -211, 321, 2212], len(particles))
+        particles["mass"] = 0.14
+        particles["x"] = rng.normal(size=(len(particles), 4))
+        particles["p"] = rng.normal(size=(len(particles), 4))
+        event_list.append(particles)
+    return event_list
+
+
+def assert_same_events(event_list, reference_list):
+    assert len(event_list) == len(reference_list)
+    for event_i, reference_i in zip(event_list, reference_list):
+        assert event_i.tobytes() == reference_i.tobytes()
+
+
+def test_zipped_list_round_trips_through_the_indexed_container(tmp_path):
+    event_list = make_events(7)
+    gz_file = str(tmp_path/"particle_list.gz")
+    h5_file = str(tmp_path/"particle_list.h5")
+    # merged lists are concatenated gzip streams
+    reader.write_particle_list(gz_file, event_list[:4])
+    reader.write_particle_list(gz_file, event_list[4:], mode="ab")
+    assert_same_events(list(reader.iterate_events(gz_file)), event_list)
+
+    reader.write_indexed_particle_list(h5_file,
+                                       reader.iterate_events(gz_file),
+                                       events_per_block=3)
+    assert reader.count_events(h5_file) == reader.count_events(gz_file)
+    assert_same_events(list(reader.iterate_events(h5_file)), event_list)
+    for filename in [gz_file, h5_file]:
+        chunk_list = list(reader.iterate_event_chunks(filename, 2,
+                                                      event_range=(1, 6)))
+        assert [len(offsets) - 1 for _, offsets in chunk_list] == [2, 2, 1]
+        assert_same_events(
+            sum([reader.split_events(*chunk) for chunk in chunk_list], []),
+            event_list[1:6])
+
+
+def test_truncated_list_raises(tmp_path):
+    gz_file = str(tmp_path/"particle_list.gz")
+    reader.write_particle_list(gz_file, make_events(3))
+    with gzip.open(gz_file, "rb") as f:
+        data = f.read()
+    with gzip.open(gz_file, "wb") as f:
+        f.write(data[:-10])
+    with pytest.raises(reader.ParticleListFormatError):
+        list(reader.iterate_events(gz_file))
+    with pytest.raises(reader.ParticleListFormatError):
+        reader.count_events(gz_file)
+
+
+def test_append_events_keeps_the_event_offsets(tmp_path):
+    event_list = make_events(9, seed=2)
+    event_list[3] = event_list[3][:0]
+    h5_file = str(tmp_path/"particle_list.h5")
+    for start, stop in [(0, 2), (2, 2), (2, 5), (5, 9)]:
+        with reader.IndexedParticleList(h5_file, "a") as particle_list:
+            particle_list.append_events(event_list[start:stop])
+    with reader.IndexedParticleList(h5_file) as particle_list:
+        assert particle_list.n_events == 9
+        assert list(particle_list.event_offsets) == [0] + list(
+            np.cumsum([len(x) for x in event_list]))
+        assert_same_events(
+            reader.split_events(*particle_list.read_events(2, 6)),
+            event_list[2:6])
@@ -0,0 +1,21 @@
+import sys
+
+import process_manager
+
+
+def test_process_is_pinned_to_the_cpu_list(tmp_path):
+    log_file = str(tmp_path/"run.log")
+    result = process_manager.run_process(
+        [sys.executable, "-c",
+         "import os; print(sorted(os.sched_getaffinity(0)))"],
+        cpu_list=[0], log_file=log_file)
+    assert result.success
+    with open(log_file, "r") as f:
+        assert f.read().strip() == "[0]"
+
+
+def test_missing_executable_fails(tmp_path):
+    result = process_manager.run_process(
+        [str(tmp_path/"no_such_stage.e")], cpu_list=[0],
+        log_file=str(tmp_path/"run.log"))
+    assert not result.success
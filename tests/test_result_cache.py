@@ -0,0 +1,43 @@
+import time
+from os import path, utime
+
+import result_cache
+
+
+def store_entry(cache, tmp_path, name, size, last_use):
+    source = tmp_path/name
+    source.write_bytes(b"x"*size)
+    key = result_cache.input_key({'name': name})
+    cache.store("hydro", key, str(source), {'name': name})
+    utime(path.join(cache.entry_path("hydro", key), "inputs.json"),
+          (last_use, last_use))
+    return key
+
+
+def test_folder_digest_follows_the_file_contents(tmp_path):
+    eos_folder = tmp_path/"EOS"
+    (eos_folder/"hotQCD").mkdir(parents=True)
+    (eos_folder/"hotQCD"/"hrg_eos.dat").write_text("1 2 3\n")
+    digest = result_cache.folder_digest(str(eos_folder))
+    assert result_cache.folder_digest(str(eos_folder)) == digest
+
+    (eos_folder/"hotQCD"/"hrg_eos.dat").write_text("1 2 4\n")
+    assert result_cache.folder_digest(str(eos_folder)) != digest
+
+
+def test_prune_removes_the_least_recently_used_entries(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path/"cache"))
+    now = time.time()
+    key_list = [store_entry(cache, tmp_path, "event_{}".format(i), 1000,
+                            now - 10000. + i)
+                for i in range(3)]
+    key_list.append(store_entry(cache, tmp_path, "event_3", 1000, now))
+
+    assert cache.prune(2500./1024**3) == 2
+    assert [cache.contains("hydro", key) for key in key_list] == [
+        False, False, True, True]
+
+    # the entries used within min_age are kept over the size cap
+    assert cache.prune(0.) == 1
+    assert [cache.contains("hydro", key) for key in key_list] == [
+        False, False, False, True]
@@ -0,0 +1,70 @@
+import numpy as np
+
+import particle_list_reader as reader
+import spvn_analysis
+
+
+def make_pion_event(phi_list, pT=1.02):
+    particles = np.zeros(len(phi_list), dtype=reader.particle_dtype)
+    particles["pid"] = 211
+    particles["mass"] = 0.13957
+    particles["p"][:, 0] = np.sqrt(0.13957**2 + pT**2)
+    particles["p"][:, 1] = pT*np.cos(phi_list)
+    particles["p"][:, 2] = pT*np.sin(phi_list)
+    return particles
+
+
+def test_spvn_of_a_hand_computed_event(tmp_path):
+    gz_file = str(tmp_path/"particle_list.gz")
+    # cos(phi) = 1, 1, 0, -1, sin(phi) = 0, 0, 1, 0, and
+    # cos(2 phi) = 1, 1, -1, 1, sin(2 phi) = 0
+    reader.write_particle_list(
+        gz_file, [make_pion_event([0., 0., np.pi/2., np.pi])])
+    assert spvn_analysis.analyze_particle_list(gz_file, str(tmp_path)) == 1
+
+    integrated = np.loadtxt(
+        str(tmp_path/"particle_211_vndata_y_-0.5_0.5.dat"))
+    assert np.allclose(integrated[0, 1], 4.)
+    assert np.allclose(integrated[1:3, 1], [0.25, 0.5], atol=1e-6)
+    assert np.allclose(integrated[1:3, 3], [0.25, 0.], atol=1e-6)
+    assert np.all(np.loadtxt(
+        str(tmp_path/"particle_-211_vndata_y_-0.5_0.5.dat"))[:, 1] == 0.)
+
+    differential = np.loadtxt(
+        str(tmp_path/"particle_211_vndata_diff_y_-0.5_0.5.dat"))
+    # the pT bins are 0.1 GeV wide and centered at 0.05, 0.15, ...
+    assert np.all(differential[:, 2][np.arange(41) != 10] == 0.)
+    assert np.allclose(differential[10, 0], 1.02, rtol=1e-6)
+    assert np.allclose(differential[10, 2], 4./(2.*np.pi*1.02*0.1),
+                       rtol=1e-5)
+    assert np.allclose(differential[10, [4, 8]], [0.25, 0.5], atol=1e-6)
+
+    charged = np.loadtxt(
+        str(tmp_path/"particle_9999_vndata_eta_-0.5_0.5.dat"))
+    assert np.allclose(charged[:3, 1], [4., 0.25, 0.5], atol=1e-6)
+
+
+def test_merged_states_match_one_accumulation(tmp_path):
+    rng = np.random.default_rng(3)
+    event_list = [make_pion_event(rng.uniform(-np.pi, np.pi, 50),
+                                  pT=rng.uniform(0.2, 2.))
+                  for _ in range(6)]
+    for event_i in event_list:
+        event_i["p"][:, 3] = rng.normal(size=len(event_i))
+        event_i["pid"] = rng.choice([211, -211, 321, 2212], len(event_i))
+    state_list = []
+    for i, events in enumerate([event_list[:2], event_list[2:]]):
+        gz_file = str(tmp_path/"particle_list_{}.gz".format(i))
+        reader.write_particle_list(gz_file, events)
+        state_list.append(str(tmp_path/"state_{}.npz".format(i)))
+        spvn_analysis.accumulate_particle_list(gz_file).save_state(
+            state_list[-1])
+    gz_file = str(tmp_path/"particle_list.gz")
+    reader.write_particle_list(gz_file, event_list)
+
+    merged = spvn_analysis.merge_analysis_states(state_list)
+    combined = spvn_analysis.accumulate_particle_list(gz_file)
+    assert merged.n_events == combined.n_events == 6
+    for name in spvn_analysis.SpvnAnalysis.accumulator_names:
+        assert np.allclose(getattr(merged, name).data,
+                           getattr(combined, name).data)
@@ -0,0 +1,30 @@
+import random
+
+import stage_scaling
+
+
+def test_exploration_adds_a_second_thread_count(tmp_path):
+    calibration_file = str(tmp_path/"stage_scaling.dat")
+    plan = stage_scaling.plan_core_split(8, 4, calibration_file)
+    assert plan['explored'] == []
+    stage_scaling.record_stage_timing(calibration_file, "hydro",
+                                      plan['hydro'], 100./plan['hydro'])
+
+    plan = stage_scaling.plan_core_split(8, 4, calibration_file)
+    assert 'hydro' in plan['explored']
+    stage_scaling.record_stage_timing(calibration_file, "hydro",
+                                      plan['hydro'], 100./plan['hydro'])
+    measurements = stage_scaling.read_calibration(calibration_file)['hydro']
+    assert len(set([n for n, _ in measurements])) == 2
+    assert stage_scaling.fit_serial_fraction(measurements) < 0.1
+
+
+def test_exploration_rate_after_the_fit():
+    measurements = [(1, 100.), (8, 20.)]
+    rng = random.Random(1)
+    n_list = [stage_scaling.explore_stage_threads(4, 8, measurements, 0.2,
+                                                  rng)
+              for _ in range(200)]
+    n_explored = len([n for n in n_list if n != 4])
+    assert 10 < n_explored < 70
+    assert all([n not in (1, 8) for n in n_list])
@@ -0,0 +1,61 @@
+import time
+from os import listdir, path
+
+import startup_throttle
+
+
+def test_slots_limit_concurrent_processes():
+    assert startup_throttle.check_throttle(n_processes=6, n_slots=2,
+                                           hold_time=0.2) <= 2
+
+
+def test_slot_is_released_when_the_block_ends(tmp_path):
+    throttle = startup_throttle.StartupThrottle(str(tmp_path), 1, 60.)
+    with throttle.slot():
+        assert listdir(str(tmp_path)) == ["slot_0.lock"]
+    assert listdir(str(tmp_path)) == []
+
+
+def test_expired_slot_does_not_release_the_next_holder(tmp_path):
+    lock_folder = str(tmp_path)
+    throttle_a = startup_throttle.StartupThrottle(lock_folder, 1, 0.1,
+                                                  poll_interval=0.01)
+    throttle_b = startup_throttle.StartupThrottle(lock_folder, 1, 60.,
+                                                  poll_interval=0.01)
+    throttle_c = startup_throttle.StartupThrottle(lock_folder, 1, 60.,
+                                                  poll_interval=0.01)
+    with throttle_a.slot():
+        # the hold time of A runs out and B takes the slot
+        assert throttle_b.acquire(timeout=5.) == 0
+        # A leaves its block while B holds the slot
+    assert path.isfile(path.join(lock_folder, "slot_0.lock"))
+    assert throttle_c.acquire(timeout=0.2) is None
+    throttle_b.release(0)
+    assert throttle_c.acquire(timeout=1.) == 0
+
+
+def test_stale_slot_is_taken_over(tmp_path):
+    lock_folder = str(tmp_path)
+    throttle_a = startup_throttle.StartupThrottle(lock_folder, 1, 60.,
+                                                  stale_time=0.1)
+    throttle_b = startup_throttle.StartupThrottle(lock_folder, 1, 60.,
+                                                  poll_interval=0.01,
+                                                  stale_time=0.1)
+    assert throttle_a.acquire() == 0
+    time.sleep(0.2)
+    assert throttle_b.acquire(timeout=1.) == 0
+    # A releases late, after its slot was taken over
+    throttle_a.release(0)
+    assert listdir(lock_folder) == ["slot_0.lock"]
+
+
+def test_slot_is_released_when_the_start_up_is_over(tmp_path):
+    lock_folder = str(tmp_path/"locks")
+    ready_file = tmp_path/"NcollList0.dat"
+    throttle = startup_throttle.StartupThrottle(lock_folder, 1, 60.,
+                                                poll_interval=0.01)
+    with throttle.slot(ready=ready_file.exists):
+        assert listdir(lock_folder) == ["slot_0.lock"]
+        ready_file.write_text("")
+        time.sleep(0.2)
+        assert listdir(lock_folder) == []
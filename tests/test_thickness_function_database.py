@@ -0,0 +1,37 @@
+import h5py
+
+import combine_thickness_functions_into_hdf5 as thickness_database
+import fetch_3DMCGlauber_event_from_hdf5_database as glauber_fetch
+
+
+def test_thickness_function_pairs_are_written_back_exactly(tmp_path,
+                                                           monkeypatch):
+    folder = tmp_path/"thickness"
+    folder.mkdir()
+    content = {}
+    for label in ["b", "a", "c"]:
+        for nucleus in ["TA", "TB"]:
+            file_name = "nuclear_thickness_{}_{}.dat".format(nucleus, label)
+            # arbitrary bytes, without a final newline
+            content[file_name] = (
+                "# {}\n1.0e-3 \t2\r\n".format(label).encode()
+                + bytes(range(256)) + label.encode())
+            (folder/file_name).write_bytes(content[file_name])
+    (folder/"nuclear_thickness_TA_d.dat").write_bytes(b"no TB\n")
+    database = str(tmp_path/"thickness.h5")
+    thickness_database.pack_thickness_functions(str(folder), database)
+
+    monkeypatch.setattr(glauber_fetch, "thickness_function_databases", {})
+    for iev, label in enumerate(["a", "b", "c"]):
+        ta_file = glauber_fetch.fecth_a_thickness_function_pair(
+            database, iev, str(tmp_path))
+        assert ta_file == "nuclear_thickness_TA_{}.dat".format(label)
+        for nucleus in ["TA", "TB"]:
+            assert ((tmp_path/"initial_{}.dat".format(nucleus)).read_bytes()
+                    == content["nuclear_thickness_{}_{}.dat".format(
+                        nucleus, label)])
+    for hf in glauber_fetch.thickness_function_databases.values():
+        hf.close()
+    with h5py.File(database, "r") as hf:
+        assert hf.attrs["n_events"] == 3
+        assert "event-3" not in hf
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+    This script measures the orchestration overhead of the iEBE-MUSIC driver
+    per event. It sets up a job with generate_jobs.py in a temporary folder,
+    replaces all the stage executables with the stand-ins from
+    codes/fake_stage_engines.py, and runs the hydro events through the
+    driver Pipeline. For every stage, the time spent outside the stage
+    executables (folder preparation, moves, merges, hdf5 packing) is
+    reported.
+"""
+
+from os import path, mkdir, makedirs, chdir, getcwd
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+package_root_path = path.abspath(path.join(path.dirname(__file__), ".."))
+sys.path.insert(0, package_root_path)
+sys.path.insert(0, path.join(package_root_path, "config"))
+
+import generate_jobs
+import parameters_dict_master
+
+# map the stage executables to the driver stages that launch them
+executable_stage_map = {
+    '3dMCGlauber': "initial_condition",
+    'ipglasma': "initial_condition",
+    'kompost': "pre_equilibrium",
+    'hydro': "hydro",
+    'sampler': "sampler",
+    'afterburner': "afterburner",
+    'concatenate': "afterburner",
+    'analysis': "analysis",
+    'spvn': "analysis",
+}
+
+
+def prepare_fake_code_tree(code_path):
+    """This function creates the parts of the codes folder that
+       generate_event_folders copies into every event folder
+    """
+    mkdir(code_path)
+    for script_i in generate_jobs.driver_script_list:
+        shutil.copy(path.join(package_root_path, "codes", script_i), code_path)
+    for folder_i in ("MUSIC/initial", "osc2u", "urqmd",
+                     "hadronic_afterburner_toolkit"):
+        makedirs(path.join(code_path, folder_i))
+
+
+def setup_benchmark_job(working_folder, initial_type, n_hydro, n_urqmd,
+                        shared_sampling=False):
+    """This function generates one event folder with generate_jobs.py
+       and returns the time used and the path of the event folder
+    """
+    code_path = path.join(working_folder, "codes")
+    prepare_fake_code_tree(code_path)
+    parameters_dict_master.control_dict['initial_state_type'] = initial_type
+    parameters_dict_master.output_parameters_to_files(working_folder)
+
+    time_stamp = "0.4"
+    if initial_type == "IPGlasma+KoMPoST":
+        time_stamp = "0.1"
+    time_start = time.time()
+    generate_jobs.generate_event_folders(
+        "self", initial_type, package_root_path, code_path, working_folder,
+        "local", 0, 0, n_hydro, n_urqmd, 1, "10:00:00", time_stamp, False,
+        False, False, False, 0, False, 0, shared_sampling=shared_sampling)
+    return (time.time() - time_start, path.join(working_folder, "event_0"),
+            time_stamp)
+
+
+def run_benchmark(initial_type, n_hydro, n_urqmd, size_scale, core_budget=0,
+                  shared_sampling=False, analysis_backend="toolkit",
+                  particle_list_format="gz"):
+    """This function runs the fake events and prints the timing summary"""
+    cwd = getcwd()
+    working_folder = tempfile.mkdtemp(prefix="iebe_benchmark_")
+    try:
+        prep_time, event_folder, time_stamp = setup_benchmark_job(
+            working_folder, initial_type, n_hydro, n_urqmd, shared_sampling)
+        chdir(event_folder)
+        sys.path.insert(0, event_folder)
+        import hydro_plus_UrQMD_driver as driver
+
+        engines = driver.StageEngines()
+        engines.use_fake(size_scale=size_scale)
+        para_dict = {
+            'initial_condition': "self",
+            'initial_type': initial_type,
+            'n_hydro': n_hydro,
+            'hydro_id0': 0,
+            'n_urqmd': n_urqmd,
+            'num_threads': n_urqmd,
+            'save_ipglasma': False,
+            'save_kompost': False,
+            'save_hydro': False,
+            'save_urqmd': False,
+            'seed_add': 0,
+            'time_stamp_str': time_stamp,
+            'core_budget': core_budget,
+            'shared_sampling': shared_sampling,
+            'analysis_backend': analysis_backend,
+            'particle_list_format': particle_list_format,
+        }
+        event_list = driver.Pipeline(para_dict, engines=engines).run()
+
+        executable_time = {}
+        for stage_name, elapsed in engines.timing:
+            stage_i = executable_stage_map[stage_name]
+            executable_time[stage_i] = (executable_time.get(stage_i, 0.)
+                                        + elapsed)
+    finally:
+        chdir(cwd)
+        shutil.rmtree(working_folder, ignore_errors=True)
+
+    n_good = sum([event_i.status for event_i in event_list])
+    print("{} events finished ({} good), n_urqmd = {}, size_scale = {}".format(
+        len(event_list), n_good, n_urqmd, size_scale))
+    print("folder preparation: {:.3f} s per job".format(prep_time))
+    print("{:>20s}  {:>10s}  {:>10s}  {:>10s}".format(
+        "stage", "total [s]", "exec [s]", "overhead"))
+    for stage_i in driver.default_stage_list:
+        stage_name = stage_i.name
+        total = sum([event_i.stage_timing.get(stage_name, 0.)
+                     for event_i in event_list])/len(event_list)
+        exec_time = executable_time.get(stage_name, 0.)/len(event_list)
+        print("{:>20s}  {:10.3f}  {:10.3f}  {:10.3f}".format(
+            stage_name, total, exec_time, total - exec_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmark the orchestration overhead per event",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--initial_type", type=str,
+                        default="3DMCGlauber_dynamical",
+                        choices=["IPGlasma", "IPGlasma+KoMPoST",
+                                 "3DMCGlauber_dynamical"],
+                        help="initial condition type (generated on the fly)")
+    parser.add_argument("-n_hydro", "--n_hydro", type=int, default=2,
+                        help="number of hydro events")
+    parser.add_argument("-n_urqmd", "--n_urqmd", type=int, default=4,
+                        help="number of oversampled UrQMD runs per hydro")
+    parser.add_argument("--size_scale", type=float, default=0.1,
+                        help="rescaling factor for the fake output sizes")
+    parser.add_argument("--core_budget", type=int, default=0,
+                        help="split this number of cores between the stages "
+                        + "(0: use n_urqmd threads everywhere)")
+    parser.add_argument("--shared_sampling", action="store_true",
+                        help="run iSS once per hydro event for all the "
+                        + "oversampled UrQMD events")
+    parser.add_argument("--analysis_backend", choices=["toolkit", "numpy"],
+                        default="toolkit",
+                        help="engine for the spvn analysis")
+    parser.add_argument("--particle_list_format", choices=["gz", "h5"],
+                        default="gz",
+                        help="format of the merged UrQMD particle lists")
+    args = parser.parse_args()
+    run_benchmark(args.initial_type, args.n_hydro, args.n_urqmd,
+                  args.size_scale, args.core_budget, args.shared_sampling,
+                  args.analysis_backend, args.particle_list_format)
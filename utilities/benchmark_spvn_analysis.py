@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+    This script compares the vectorized NumPy spvn engine
+    (codes/spvn_analysis.py) with the hadronic afterburner toolkit on the
+    same synthetic particle list. The particles are sampled with a thermal
+    pT spectrum and an elliptic flow modulation. The wall times, the
+    particle throughput, and (when the toolkit is available) the charged
+    hadron dN/deta and v2 from both engines are reported.
+"""
+
+from os import path, mkdir, symlink
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+package_root_path = path.abspath(path.join(path.dirname(__file__), ".."))
+sys.path.insert(0, path.join(package_root_path, "codes"))
+sys.path.insert(0, path.join(package_root_path, "config"))
+
+import parameters_dict_master
+import particle_list_reader
+import spvn_analysis
+from process_manager import run_process
+
+# (pid, mass, fraction of the particles)
+species_list = [
+    (211, 0.13957, 0.27), (-211, 0.13957, 0.27), (111, 0.13498, 0.2),
+    (321, 0.49368, 0.05), (-321, 0.49368, 0.05), (2212, 0.93827, 0.03),
+    (-2212, 0.93827, 0.03), (3122, 1.11568, 0.02), (-3122, 1.11568, 0.02),
+    (3312, 1.32171, 0.01), (-3312, 1.32171, 0.01), (333, 1.01946, 0.04)
+]
+
+
+def sample_events(n_events, n_particles, v2, rng):
+    """This function yields events with a thermal spectrum and v2"""
+    pid_array = np.array([x[0] for x in species_list])
+    mass_array = np.array([x[1] for x in species_list])
+    prob_array = np.array([x[2] for x in species_list])
+    prob_array /= prob_array.sum()
+    # the oversampled events of one hydro event share the event plane
+    psi_2 = rng.uniform(0, np.pi)
+    for _ in range(n_events):
+        particles = np.zeros(n_particles,
+                             dtype=particle_list_reader.particle_dtype)
+        species_idx = rng.choice(len(pid_array), n_particles, p=prob_array)
+        mass = mass_array[species_idx]
+        pT = rng.gamma(2., 0.25, n_particles)
+        phi = rng.uniform(-np.pi, np.pi, 2*n_particles)
+        accept = (rng.uniform(0, 1 + 2*v2, 2*n_particles)
+                  < 1 + 2*v2*np.cos(2*(phi - psi_2)))
+        phi = np.resize(phi[accept], n_particles)
+        rapidity = rng.uniform(-5., 5., n_particles)
+        mT = np.sqrt(pT**2 + mass**2)
+        particles["pid"] = pid_array[species_idx]
+        particles["mass"] = mass
+        particles["p"] = np.array([mT*np.cosh(rapidity), pT*np.cos(phi),
+                                   pT*np.sin(phi),
+                                   mT*np.sinh(rapidity)]).transpose()
+        particles["x"][:, 0] = 10.
+        yield particles
+
+
+def run_numpy_engine(particle_list, results_folder, parameters):
+    """This function runs the NumPy engine and returns the wall time"""
+    time_start = time.time()
+    spvn_analysis.analyze_particle_list(particle_list, results_folder,
+                                        parameters)
+    return time.time() - time_start
+
+
+def run_toolkit(particle_list, work_folder, toolkit_code_path):
+    """This function runs hadronic_afterburner_tools.e on the particle list
+       and returns the wall time and the results folder
+    """
+    toolkit_folder = path.join(work_folder, "toolkit")
+    mkdir(toolkit_folder)
+    analysis_dict = parameters_dict_master.hadronic_afterburner_toolkit_dict
+    with open(path.join(toolkit_folder, "parameters.dat"), "w") as f:
+        for key_name, value in analysis_dict.items():
+            if key_name in parameters_dict_master.driver_parameter_list:
+                continue
+            f.write("{} = {}\n".format(key_name, value))
+    for link_i in ['hadronic_afterburner_tools.e', 'EOS']:
+        symlink(path.abspath(path.join(toolkit_code_path, link_i)),
+                path.join(toolkit_folder, link_i))
+    results_folder = path.join(toolkit_folder, "results")
+    mkdir(results_folder)
+    symlink(path.abspath(particle_list),
+            path.join(results_folder, "particle_list.dat"))
+    result = run_process(["./hadronic_afterburner_tools.e", "analyze_HBT=0"],
+                         cwd=toolkit_folder,
+                         log_file=path.join(work_folder, "toolkit.log"))
+    if not result.success:
+        print("\U000026D4  toolkit failed: {}".format(result))
+    return (result.elapsed, results_folder)
+
+
+def charged_hadron_summary(results_folder):
+    """This function returns the charged hadron dN/deta and v2{|eta|<0.5}"""
+    data = np.loadtxt(path.join(results_folder,
+                                "particle_9999_vndata_eta_-0.5_0.5.dat"))
+    return (data[0, 1], np.sqrt(data[2, 1]**2 + data[2, 3]**2))
+
+
+def run_benchmark(n_events, n_particles, v2, toolkit_code_path=None):
+    """This function runs the benchmark and prints the summary"""
+    work_folder = tempfile.mkdtemp(prefix="iebe_spvn_benchmark_")
+    try:
+        particle_list = path.join(work_folder, "particle_list.gz")
+        particle_list_reader.write_particle_list(
+            particle_list,
+            sample_events(n_events, n_particles, v2,
+                          np.random.default_rng(1)))
+        n_total = n_events*n_particles
+        print("{} events x {} particles, v2 = {}".format(
+            n_events, n_particles, v2))
+
+        parameters = dict(spvn_analysis.default_parameters)
+        for key_name in parameters:
+            parameters[key_name] = (
+                parameters_dict_master.hadronic_afterburner_toolkit_dict.get(
+                    key_name, parameters[key_name]))
+        numpy_folder = path.join(work_folder, "numpy")
+        numpy_time = run_numpy_engine(particle_list, numpy_folder, parameters)
+        dNdeta, v2_numpy = charged_hadron_summary(numpy_folder)
+        print("{:>8s}: {:8.3f} s, {:6.2f} M particles/s, ".format(
+            "numpy", numpy_time, n_total/numpy_time/1e6)
+              + "dN/deta = {:.2f}, v2 = {:.4f}".format(dNdeta, v2_numpy))
+
+        if toolkit_code_path is not None:
+            toolkit_time, toolkit_folder = run_toolkit(
+                particle_list, work_folder, toolkit_code_path)
+            dNdeta, v2_toolkit = charged_hadron_summary(toolkit_folder)
+            print("{:>8s}: {:8.3f} s, {:6.2f} M particles/s, ".format(
+                "toolkit", toolkit_time, n_total/toolkit_time/1e6)
+                  + "dN/deta = {:.2f}, v2 = {:.4f}".format(dNdeta, v2_toolkit))
+            print("speed up: {:.1f}".format(toolkit_time/numpy_time))
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmark the NumPy spvn engine against the toolkit",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-nev", "--n_events", type=int, default=200,
+                        help="number of events in the particle list")
+    parser.add_argument("-npart", "--n_particles", type=int, default=5000,
+                        help="number of particles per event")
+    parser.add_argument("--v2", type=float, default=0.1,
+                        help="input elliptic flow")
+    parser.add_argument("--toolkit_path", type=str, default=None,
+                        help="folder with hadronic_afterburner_tools.e and "
+                        + "EOS (codes/hadronic_afterburner_toolkit_code)")
+    args = parser.parse_args()
+    run_benchmark(args.n_events, args.n_particles, args.v2,
+                  args.toolkit_path)
@@ -22,16 +22,28 @@ toFolder=${toFolder%"/"}
 echo "collecting events from " $fromFolder " to " $toFolder
 
 folderName=`echo $fromFolder | rev | cut -d "/" -f 1 | rev`
-target_folder=${toFolder}/${folderName}
-mkdir -p ${target_folder}
-cp ${fromFolder}/parameters_dict_*.py ${target_folder}/
-cp -r ${fromFolder}/model_parameters ${target_folder}/
-target_hydro_folder=${target_folder}/HYDRO_RESULTS
-mkdir -p ${target_hydro_folder}
-target_urqmd_folder=${target_folder}/URQMD_RESULTS
-mkdir -p ${target_urqmd_folder}
-target_spvn_folder=${target_folder}/SPVN_RESULTS
-mkdir -p ${target_spvn_folder}
+target_list=""
+
+set_target_folder() {
+    # sets the target folders of the results of $1 (a job folder or a
+    # design point), its model parameters are in $2
+    target_folder=${toFolder}/$1
+    target_hydro_folder=${target_folder}/HYDRO_RESULTS
+    target_urqmd_folder=${target_folder}/URQMD_RESULTS
+    target_spvn_folder=${target_folder}/SPVN_RESULTS
+    if [ ! -d ${target_spvn_folder} ]; then
+        mkdir -p ${target_folder}
+        cp ${fromFolder}/parameters_dict_*.py ${target_folder}/
+        cp -r $2 ${target_folder}/model_parameters
+        mkdir -p ${target_hydro_folder}
+        mkdir -p ${target_urqmd_folder}
+        mkdir -p ${target_spvn_folder}
+        target_list="${target_list} $1"
+    fi
+}
+
+set_target_folder ${folderName} ${fromFolder}/model_parameters
+target_ipglasma_folder=${target_folder}/IPGLASMA_RESULTS
 
 event_folder_name="EVENT_RESULTS_"
 hydro_folder_name="hydro_results_"
@@ -43,12 +55,38 @@ collected_eventNum=0
 for ijob in `ls --color=none $fromFolder | grep "event" `;
 do
     eventsPath=${fromFolder}/${ijob}
+    if [ -e ${eventsPath}/ipglasma_events.h5 ]; then
+        # per-job database of the saved IPGlasma events
+        mkdir -p ${target_ipglasma_folder}
+        mv ${eventsPath}/ipglasma_events.h5 ${target_ipglasma_folder}/ipglasma_events_${ijob}.h5
+    fi
     for iev in `ls --color=none $eventsPath | grep $event_folder_name`
     do
         echo $iev
         event_id=`echo $iev | rev | cut -f 1 -d "_" | rev`
+        if [[ $event_id != dp* && -f ${eventsPath}/design_points.dat ]]; then
+            # the initial condition shared by the design points, it is
+            # already saved with the events of the design points
+            continue
+        elif [[ $event_id == dp* && -f ${eventsPath}/design_points.dat ]]; then
+            # design point k of a co-scheduled job, it is collected with
+            # the other events of the same design point
+            point_path=`awk -v k=${event_id#dp} '$1 == k {print $2}' ${eventsPath}/design_points.dat`
+            point_path=${point_path%"/"}
+            point_name=`echo ${point_path} | rev | cut -d "/" -f 1 | rev`
+            if [ "$point_name" == "model_parameters" ]; then
+                point_name=`echo ${point_path} | rev | cut -d "/" -f 2 | rev`
+            fi
+            set_target_folder ${point_name} ${point_path}
+        else
+            set_target_folder ${folderName} ${fromFolder}/model_parameters
+        fi
         hydro_folder="${eventsPath}/${iev}/${hydro_folder_name}*${event_id}/"
         urqmd_file="${eventsPath}/${iev}/${UrQMD_file_name}*${event_id}.gz"
+        if [ ! -e $urqmd_file ]; then
+            # indexed hdf5 particle list
+            urqmd_file="${eventsPath}/${iev}/${UrQMD_file_name}*${event_id}.h5"
+        fi
         hydrostatus=false
         urqmdstatus=false
         if [ -d $hydro_folder ]; then
@@ -66,7 +104,11 @@ do
                 mv ${eventsPath}/${iev}/${hydro_folder_name}*${event_id} $target_hydro_folder
             fi
             if [ "$urqmdstatus" = true ]; then
-                mv ${eventsPath}/${iev}/${UrQMD_file_name}*${event_id}.gz $target_urqmd_folder
+                mv $urqmd_file $target_urqmd_folder
+                # the spvn analysis state goes with the particle list
+                if [ -e ${eventsPath}/${iev}/spvn_state_*${event_id}.npz ]; then
+                    mv ${eventsPath}/${iev}/spvn_state_*${event_id}.npz $target_urqmd_folder
+                fi
             fi
             cp ${eventsPath}/${iev}/${spvn_folder_name}*${event_id}.h5 $target_spvn_folder
             ((collected_eventNum++))
@@ -77,9 +119,18 @@ done
 
 echo "Collected events number: " $collected_eventNum " out of " $total_eventNum
 
-if [ -f ${target_folder}/${folderName}.h5 ]; then
-    mv ${target_folder}/${folderName}.h5 ${target_spvn_folder}
-fi
-./combine_multiple_hdf5.py ${target_spvn_folder}
-mv SPVN_RESULTS.h5 ${target_folder}/${folderName}.h5
-rm -fr $target_spvn_folder
+for target_name in ${target_list}
+do
+    set_target_folder ${target_name}
+    if [ -z "`ls ${target_spvn_folder}`" ]; then
+        # no event of this job folder, e.g. a design group
+        rm -fr $target_spvn_folder
+        continue
+    fi
+    if [ -f ${target_folder}/${target_name}.h5 ]; then
+        mv ${target_folder}/${target_name}.h5 ${target_spvn_folder}
+    fi
+    ./combine_multiple_hdf5.py ${target_spvn_folder}
+    mv SPVN_RESULTS.h5 ${target_folder}/${target_name}.h5
+    rm -fr $target_spvn_folder
+done
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+    This script reruns the spvn analysis of the hadronic afterburner toolkit
+    over archived UrQMD particle lists (particle_list_{event_id}.gz or the
+    indexed particle_list_{event_id}.h5, e.g. in
+    URQMD_RESULTS or its C{lo}-{hi} sub-folders) with a new analysis
+    parameter set. The events are analyzed in parallel by a process pool,
+    and the results are written directly into one merged hdf5 database with
+    a spvn_results_{event_id} group per event, the same layout as the
+    databases from collect_events.sh. Hydro and UrQMD are not touched.
+"""
+
+from os import path, mkdir, symlink
+from glob import glob
+from multiprocessing import Pool
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import h5py
+import numpy as np
+
+package_root_path = path.abspath(path.join(path.dirname(__file__), ".."))
+sys.path.insert(0, path.join(package_root_path, "config"))
+sys.path.insert(0, path.join(package_root_path, "codes"))
+
+import parameters_dict_master
+import particle_list_reader
+from process_manager import run_process
+
+toolkit_name = "hadronic_afterburner_toolkit"
+particle_list_prefix = "particle_list_"
+
+
+def find_particle_lists(urqmd_folder):
+    """This function returns a dictionary {event_id: particle list path}"""
+    event_dict = {}
+    for file_path in sorted(glob(path.join(
+            urqmd_folder, "**", "{}*.[gh][z5]".format(particle_list_prefix)),
+                                 recursive=True)):
+        event_id = path.basename(file_path)[len(particle_list_prefix):-3]
+        if event_id in event_dict:
+            print("\U000026A0  duplicated event {}, keep {}".format(
+                event_id, event_dict[event_id]))
+            continue
+        event_dict[event_id] = file_path
+    return event_dict
+
+
+def write_analysis_parameters(par_dict_path, output_file):
+    """This function writes the parameters.dat of the toolkit from the
+       default parameters updated with the user's parameter dictionary.
+       It returns the parameter dictionary.
+    """
+    analysis_dict = dict(
+        parameters_dict_master.hadronic_afterburner_toolkit_dict)
+    if par_dict_path != "":
+        par_diretory = path.dirname(path.abspath(par_dict_path))
+        sys.path.insert(0, par_diretory)
+        parameters_dict = __import__(
+            par_dict_path.split('.py')[0].split("/")[-1])
+        analysis_dict.update(parameters_dict.hadronic_afterburner_toolkit_dict)
+    with open(output_file, "w") as f:
+        for key_name in analysis_dict:
+            if key_name in parameters_dict_master.driver_parameter_list:
+                continue
+            f.write("{parameter_name} = {parameter_value}\n".format(
+                parameter_name=key_name,
+                parameter_value=analysis_dict[key_name]))
+    return analysis_dict
+
+
+def check_an_event_is_good(event_folder):
+    """This function checks the given event contains all required files"""
+    required_files_list = [
+        'particle_9999_dNdeta_*.dat',
+    ]
+    for pattern in required_files_list:
+        if not glob(path.join(event_folder, pattern)):
+            print("Event {} is bad, missing {} ...".format(
+                event_folder, pattern),
+                  flush=True)
+            return False
+    return True
+
+
+def setup_analysis_folder(work_folder, event_id, code_path, parameter_file):
+    """This function prepares a private toolkit folder for one event"""
+    event_folder = path.join(work_folder, "event_{}".format(event_id))
+    toolkit_folder = path.join(event_folder, toolkit_name)
+    mkdir(event_folder)
+    shutil.copytree(path.join(code_path, toolkit_name), toolkit_folder)
+    shutil.copy(parameter_file, path.join(toolkit_folder, "parameters.dat"))
+    for link_i in ['hadronic_afterburner_tools.e', 'EOS']:
+        symlink(path.abspath(path.join(code_path,
+                                       "{}_code".format(toolkit_name),
+                                       link_i)),
+                path.join(toolkit_folder, link_i))
+    mkdir(path.join(toolkit_folder, "results"))
+    return event_folder
+
+
+def analysis_commands(HBT_flag, stage_engine, analysis_backend="toolkit"):
+    """This function returns the list of (command, working folder) to run
+       the analysis of one event, relative to the event folder
+    """
+    if analysis_backend == "numpy":
+        return [([sys.executable,
+                  path.join(package_root_path, "codes", "spvn_analysis.py"),
+                  "results/particle_list.dat", "results", "parameters.dat"],
+                 toolkit_name)]
+    if stage_engine == "fake":
+        return [([sys.executable,
+                  path.join(package_root_path, "codes",
+                            "fake_stage_engines.py"), "analysis"], ".")]
+    command_list = [(["./hadronic_afterburner_tools.e", "analyze_HBT=0"],
+                     toolkit_name)]
+    if HBT_flag:
+        command_list.append(([
+            "./hadronic_afterburner_tools.e", "analyze_flow=0",
+            "analyze_HBT=1", "particle_monval=211", "distinguish_isospin=1",
+            "event_buffer_size=500000"
+        ], toolkit_name))
+        command_list.append(([
+            sys.executable, "./average_event_HBT_correlation_function.py",
+            "..", "results"
+        ], toolkit_name))
+    return command_list
+
+
+def analyze_one_event(event_id, particle_list, work_folder, code_path,
+                      parameter_file, command_list, timeout=None,
+                      analysis_backend="toolkit"):
+    """This function analyzes one particle list and returns the event id
+       and the results {file_name: (data, header)}, or None if it fails
+    """
+    event_folder = setup_analysis_folder(work_folder, event_id, code_path,
+                                         parameter_file)
+    results_folder = path.join(event_folder, toolkit_name, "results")
+    if (analysis_backend != "numpy" and
+            particle_list_reader.is_indexed_particle_list(particle_list)):
+        # the toolkit only reads the zipped binary format
+        particle_list_reader.write_particle_list(
+            path.join(results_folder, "particle_list.dat"),
+            particle_list_reader.iterate_events(particle_list))
+    else:
+        symlink(path.abspath(particle_list),
+                path.join(results_folder, "particle_list.dat"))
+    try:
+        for command, cwd in command_list:
+            result = run_process(command, cwd=path.join(event_folder, cwd),
+                                 timeout=timeout, n_threads=1,
+                                 log_file=path.join(event_folder, "run.log"))
+            if not result.success:
+                print("\U000026D4  analysis of event {} failed: {}".format(
+                    event_id, result),
+                      flush=True)
+                return (event_id, None)
+        if not check_an_event_is_good(results_folder):
+            return (event_id, None)
+        results = {}
+        for file_path in glob(path.join(results_folder, "*.dat")):
+            file_name = path.basename(file_path)
+            if file_name == "particle_list.dat":
+                continue
+            with open(file_path, "r") as f:
+                header_text = str(f.readline())
+            if not header_text.startswith("#"):
+                header_text = None
+            results[file_name] = (np.loadtxt(file_path), header_text)
+        return (event_id, results)
+    finally:
+        shutil.rmtree(event_folder, ignore_errors=True)
+
+
+def reanalyze_particle_lists(urqmd_folder, output_file, code_path,
+                             par_dict_path="", n_workers=1, timeout=None,
+                             stage_engine="real"):
+    """This function runs the analysis over all the particle lists in
+       urqmd_folder and writes the results into output_file. The events
+       already in output_file are skipped. It returns the number of
+       analyzed events.
+    """
+    event_dict = find_particle_lists(urqmd_folder)
+    work_folder = tempfile.mkdtemp(prefix="iebe_reanalysis_",
+                                   dir=path.dirname(path.abspath(output_file)))
+    try:
+        parameter_file = path.join(work_folder, "parameters.dat")
+        analysis_dict = write_analysis_parameters(par_dict_path,
+                                                  parameter_file)
+        HBT_flag = (analysis_dict.get('analyze_HBT', 0) == 1)
+        analysis_backend = analysis_dict.get('analysis_backend', "toolkit")
+        command_list = analysis_commands(HBT_flag, stage_engine,
+                                         analysis_backend)
+
+        n_analyzed = 0
+        with h5py.File(output_file, "a") as h5_f:
+            job_list = [
+                (event_id, event_dict[event_id], work_folder, code_path,
+                 parameter_file, command_list, timeout, analysis_backend)
+                for event_id in event_dict
+                if "spvn_results_{}".format(event_id) not in h5_f
+            ]
+            print("\U0001F3CD  [{}] Reanalyzing {} of {} events with {} "
+                  "workers ...".format(time.asctime(), len(job_list),
+                                      len(event_dict), n_workers),
+                  flush=True)
+            with Pool(processes=n_workers) as pool:
+                for event_id, results in pool.imap_unordered(
+                        _analyze_one_event_star, job_list):
+                    if results is None:
+                        continue
+                    gtemp = h5_f.create_group(
+                        "spvn_results_{}".format(event_id))
+                    for file_name, (data, header_text) in results.items():
+                        h5data = gtemp.create_dataset(file_name, data=data,
+                                                      compression="gzip",
+                                                      compression_opts=9)
+                        if header_text is not None:
+                            h5data.attrs.create("header",
+                                                np.bytes_(header_text))
+                    h5_f.flush()
+                    n_analyzed += 1
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+    print("\U0001F3CD  [{}] {} events analyzed into {}".format(
+        time.asctime(), n_analyzed, output_file),
+          flush=True)
+    return n_analyzed
+
+
+def _analyze_one_event_star(args):
+    return analyze_one_event(*args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="rerun the spvn analysis over archived UrQMD outputs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("urqmd_folder",
+                        help="folder with particle_list_{event_id}.gz files")
+    parser.add_argument("output_file", help="merged hdf5 database")
+    parser.add_argument("-par", "--par_dict", type=str, default="",
+                        help="parameter dictionary file with the new "
+                        + "hadronic_afterburner_toolkit_dict")
+    parser.add_argument("-code", "--code_path", type=str,
+                        default=path.join(package_root_path, "codes"),
+                        help="path of the codes folder")
+    parser.add_argument("-n", "--n_workers", type=int, default=1,
+                        help="number of concurrent analysis processes")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="wall time limit per event in seconds")
+    parser.add_argument("--stage_engine", choices=["real", "fake"],
+                        default="real",
+                        help="use the stand-in analysis for testing")
+    args = parser.parse_args()
+    reanalyze_particle_lists(args.urqmd_folder, args.output_file,
+                             args.code_path, args.par_dict, args.n_workers,
+                             args.timeout, args.stage_engine)